@@ -0,0 +1,243 @@
+import json
+from datetime import datetime
+import pyarrow as pa
+import pyarrow.parquet as pq
+from bson import ObjectId
+from s3_sink import S3MultipartSink, MB
+from inventory import schema_hash
+
+
+# Errores que pyarrow lanza cuando no puede inferir el tipo de una columna
+ARROW_CONVERSION_ERRORS = (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, TypeError, ValueError, OverflowError)
+
+
+def flatten_document(doc, parent_key="", sep=".", out=None):
+    # Mismas columnas que pd.json_normalize: los dicts anidados se aplanan con "." y las listas se dejan tal cual
+    if out is None:
+        out = {}
+    for k, v in doc.items():
+        key = f"{parent_key}{sep}{k}" if parent_key else str(k)
+        if isinstance(v, dict):
+            flatten_document(v, key, sep, out)
+        else:
+            out[key] = v
+    return out
+
+
+def _pandas_value(value):
+    # Mismos valores que _convert_types del camino de pandas: ObjectId → str y fechas → texto ISO 8601,
+    # así una colección da las mismas columnas y tipos con parquet_writer pandas o arrow
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {k: _pandas_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_pandas_value(v) for v in value]
+    return value
+
+
+def _plain_value(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, dict):
+        return {k: _plain_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_plain_value(v) for v in value]
+    if isinstance(value, (str, int, float, bool, bytes)) or value is None:
+        return value
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _to_string(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return str(value)
+
+
+def _to_number(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ArrowParquetWriter:
+    # Escribe un día completo como un solo Parquet con un row group por batch.
+    # Si un batch trae columnas o tipos incompatibles con el archivo abierto se cierra y se abre data_part<N+1>.
+    # Con schema_registry los batches salen con los tipos del registro y no se infieren columna por columna.
+    # Las fechas se escriben como texto ISO 8601, igual que el writer de pandas.
+    def __init__(self, s3, bucket_name, key_prefix, type_config=None, compression="snappy", part_size=8 * MB, max_in_flight=4,
+                 schema_registry=None):
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.key_prefix = key_prefix
+        type_config = type_config or {}
+        self.force_string = set(type_config.get("force_string", []))
+        self.force_number = set(type_config.get("force_number", []))
+        self.compression = compression
+        self.part_size = part_size
+        self.max_in_flight = max_in_flight
+        self.schema_registry = schema_registry
+        self.file_index = 0
+        self.uploaded_keys = []
+        self.files = []  # {"key", "rows", "bytes", "schema_hash"} por archivo completado
+        self.rows_written = 0
+        self._file_rows = 0
+        self._writer = None
+        self._schema = None
+        self._sink = None
+
+    # ---------- construcción de columnas ----------
+
+    def _build_array(self, name, values):
+        if name in self.force_string:
+            return pa.array([_to_string(v) for v in values], type=pa.string())
+        if name in self.force_number:
+            numbers = [_to_number(v) for v in values]
+            try:
+                return pa.array(numbers)
+            except ARROW_CONVERSION_ERRORS:
+                return pa.array([None if v is None else float(v) for v in numbers], type=pa.float64())
+
+        try:
+            return pa.array(values)
+        except ARROW_CONVERSION_ERRORS:
+            pass
+
+        # ObjectId, Decimal128, etc. → tipos nativos en una sola pasada por columna
+        values = [_plain_value(v) for v in values]
+        try:
+            return pa.array(values)
+        except ARROW_CONVERSION_ERRORS:
+            # Tipos mezclados (ej. int y str en la misma columna): se guarda como texto
+            return pa.array([_to_string(v) for v in values], type=pa.string())
+
+    def to_record_batch(self, docs):
+        rows = [flatten_document(_pandas_value(doc)) for doc in docs]
+        if self.schema_registry is not None:
+            return self.schema_registry.record_batch(rows, self.key_prefix)
+        names = {}
+        for row in rows:
+            for k in row:
+                if k not in names:
+                    names[k] = None
+
+        arrays = []
+        for name in names:
+            arrays.append(self._build_array(name, [row.get(name) for row in rows]))
+        return pa.RecordBatch.from_arrays(arrays, names=list(names))
+
+    # ---------- manejo de esquema entre batches ----------
+
+    def _align(self, batch):
+        # Devuelve el batch con el esquema del archivo abierto, o None si no es compatible
+        batch_names = set(batch.schema.names)
+        for field in batch.schema:
+            if field.name not in self._schema.names and field.type != pa.null():
+                return None
+
+        arrays = []
+        for field in self._schema:
+            if field.name not in batch_names:
+                arrays.append(pa.nulls(batch.num_rows, type=field.type))
+                continue
+            column = batch.column(field.name)
+            if column.type == field.type:
+                arrays.append(column)
+                continue
+            if column.type == pa.null():
+                arrays.append(pa.nulls(batch.num_rows, type=field.type))
+                continue
+            try:
+                arrays.append(column.cast(field.type))
+            except ARROW_CONVERSION_ERRORS:
+                return None
+        return pa.RecordBatch.from_arrays(arrays, schema=self._schema)
+
+    def _merged_schema(self, batch_schema):
+        # Esquema del siguiente archivo: columnas previas + nuevas, con el tipo del batch en caso de conflicto
+        fields = []
+        for field in self._schema:
+            if field.name in batch_schema.names:
+                new_type = batch_schema.field(field.name).type
+                fields.append(pa.field(field.name, field.type if new_type == pa.null() else new_type))
+            else:
+                fields.append(field)
+        for field in batch_schema:
+            if field.name not in self._schema.names:
+                fields.append(field)
+        return pa.schema(fields)
+
+    # ---------- escritura ----------
+
+    def _open(self, schema):
+        self.file_index += 1
+        self._schema = schema
+        self._file_rows = 0
+        key = f"{self.key_prefix}_part{self.file_index}.parquet"
+        # El Parquet se va subiendo por partes mientras se escriben los row groups
+        self._sink = S3MultipartSink(self.s3, self.bucket_name, key, part_size=self.part_size, max_in_flight=self.max_in_flight)
+        self._writer = pq.ParquetWriter(self._sink, schema, compression=self.compression)
+
+    def _finish_file(self):
+        self._writer.close()
+        self._writer = None
+        self._sink.complete()
+        self.uploaded_keys.append(self._sink.key)
+        self.files.append({"key": self._sink.key, "rows": self._file_rows, "bytes": self._sink.bytes_written,
+                           "schema_hash": schema_hash(self._schema)})
+        print(f"📤 Uploaded {self._sink.key} ({self._sink.bytes_written / MB:.2f} MB)")
+        self._sink = None
+
+    def write_batch(self, batch):
+        if batch.num_rows == 0:
+            return
+        if self._writer is None:
+            schema = batch.schema if self._schema is None else self._merged_schema(batch.schema)
+            self._open(schema)
+
+        aligned = self._align(batch)
+        if aligned is None:
+            new_schema = self._merged_schema(batch.schema)
+            self._finish_file()
+            self._open(new_schema)
+            # El esquema combinado usa los tipos del batch, así que siempre alinea
+            aligned = self._align(batch)
+
+        self._writer.write_batch(aligned)
+        self.rows_written += batch.num_rows
+        self._file_rows += batch.num_rows
+
+    @property
+    def bytes_written(self):
+        # Bytes del archivo abierto ya entregados al multipart (crece a medida que se escriben row groups)
+        return self._sink.bytes_written if self._sink is not None else 0
+
+    def write_documents(self, docs):
+        self.write_batch(self.to_record_batch(docs))
+
+    def close(self):
+        if self._writer is not None:
+            self._finish_file()
+        return self.uploaded_keys
+
+    def abort(self):
+        # Se aborta el multipart antes de soltar el writer para que nunca se complete un archivo a medias
+        if self._sink is not None:
+            self._sink.abort()
+            self._sink = None
+        if self._writer is not None:
+            # Se cierra acá y no en el GC: el footer va al sink ya abortado y ese error se descarta
+            try:
+                self._writer.close()
+            except (ValueError, OSError):
+                pass
+            self._writer = None
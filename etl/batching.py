@@ -0,0 +1,81 @@
+import threading
+
+import bson
+from bson.raw_bson import RawBSONDocument
+
+from s3_sink import MB
+
+
+class ByteBudgetBatcher:
+    # Decide cuándo cerrar un batch por bytes en lugar de por cantidad fija de documentos:
+    #   - target_part_bytes: tamaño buscado del archivo subido (BSON del batch × razón salida/entrada)
+    #   - max_batch_bytes: tope de BSON en memoria por batch, sin importar cuánto comprima
+    # La razón salida/entrada se ajusta con cada parte subida (promedio móvil), así los archivos convergen al objetivo.
+    # El tamaño sale gratis de RawBSONDocument (raw_bson); con documentos decodificados se codifica solo el primero
+    # y el resto se estima con ese tamaño, para no volver a codificar cada documento.
+    # Los defaults son conservadores: varios workers de subida tienen batches en memoria a la vez.
+    def __init__(self, target_part_bytes=4 * MB, max_batch_bytes=16 * MB, max_docs=100000, min_docs=100,
+                 initial_ratio=0.3, smoothing=0.5):
+        self.target_part_bytes = target_part_bytes
+        self.max_batch_bytes = max_batch_bytes
+        self.max_docs = max_docs
+        self.min_docs = min_docs
+        self.ratio = initial_ratio
+        self.smoothing = smoothing
+        self._estimated_doc_bytes = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            target_part_bytes=int(config.get("target_part_mb", 4) * MB),
+            max_batch_bytes=int(config.get("max_batch_mb", 16) * MB),
+            max_docs=int(config.get("max_docs", 100000)),
+            min_docs=int(config.get("min_docs", 100)),
+            initial_ratio=float(config.get("initial_ratio", 0.3)),
+        )
+
+    def doc_size(self, doc):
+        if isinstance(doc, RawBSONDocument):
+            return len(doc.raw)
+        if self._estimated_doc_bytes is None:
+            self._estimated_doc_bytes = len(bson.encode(doc))
+        return self._estimated_doc_bytes
+
+    def is_full(self, batch_docs, batch_bytes):
+        if batch_docs >= self.max_docs or batch_bytes >= self.max_batch_bytes:
+            return True
+        if batch_docs < self.min_docs:
+            return False
+        with self._lock:
+            ratio = self.ratio
+        return batch_bytes * ratio >= self.target_part_bytes
+
+    def observe(self, input_bytes, output_bytes):
+        # Llamado desde los workers de subida con la razón real de la última parte
+        if not input_bytes or not output_bytes:
+            return
+        with self._lock:
+            self.ratio = self.ratio * (1 - self.smoothing) + (output_bytes / input_bytes) * self.smoothing
+
+    def describe(self):
+        return (f"target {self.target_part_bytes / MB:.0f} MB per part, max {self.max_batch_bytes / MB:.0f} MB in memory, "
+                f"{self.min_docs}-{self.max_docs} docs")
+
+
+class FixedBatcher:
+    # batch_size explícito en la config: el comportamiento anterior (N documentos por parte)
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+
+    def doc_size(self, doc):
+        return len(doc.raw) if isinstance(doc, RawBSONDocument) else 0
+
+    def is_full(self, batch_docs, batch_bytes):
+        return batch_docs >= self.batch_size
+
+    def observe(self, input_bytes, output_bytes):
+        pass
+
+    def describe(self):
+        return f"{self.batch_size} docs per part"
@@ -0,0 +1,125 @@
+import random
+import string
+import struct
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+
+# Documentos sintéticos con la forma de las colecciones reales, reproducibles por semilla.
+# Las fechas (updatedAt / createdAt en ms) caen dentro del día de benchmark para que los filtros de config/ apliquen.
+
+COLLECTIONS = ("transactionresponse", "terminal", "sale", "refund")
+DEPENDENCIES = {"refund": ("sale",)}
+
+
+def _oid(rng, ts):
+    return ObjectId(struct.pack(">I", ts) + rng.randbytes(8))
+
+
+def _text(rng, n):
+    return "".join(rng.choices(string.ascii_letters + string.digits, k=n))
+
+
+def _moment(rng, day_ms):
+    return day_ms + rng.randrange(86400 * 1000)
+
+
+def transactionresponse(rng, day_ms, i):
+    created = _moment(rng, day_ms)
+    return {
+        "_id": _oid(rng, created // 1000),
+        "createdAt": created,
+        "updatedAt": created + rng.randrange(60000),
+        "amount": round(rng.uniform(1, 50000), 2),
+        "currency": rng.choice([484, 840]),
+        "responseCode": rng.choice(["00", "05", "51", 0, 5]),  # tipos mezclados como en producción
+        "transactionId": _text(rng, 20),
+        "reasonCode": rng.choice([None, "R01", 12]),
+        "folio": str(rng.randrange(10 ** 9)),
+        "orderId": _text(rng, 16),
+        "card": {"bin": str(rng.randrange(400000, 600000)), "last4": f"{rng.randrange(10000):04d}", "brand": rng.choice(["VISA", "MC", "AMEX"])},
+        "merchant": {
+            "name": _text(rng, 24),
+            "address": {"street": _text(rng, 30), "city": _text(rng, 12), "zip": f"{rng.randrange(100000):05d}"},
+            "mcc": rng.randrange(1000, 9999),
+        },
+        "authnum": f"{rng.randrange(10 ** 6):06d}",
+        "data": {
+            "status": rng.choice(["approved", "declined", 1, 0]),
+            "gwErrorCode": rng.choice([None, "E100", 100]),
+            "gateway": {"name": rng.choice(["prosa", "evo", "amex"]), "raw": {"iso": {f"f{k}": _text(rng, 8) for k in range(rng.randrange(10, 30))}}},
+            "attempts": [{"at": created + j, "code": rng.choice(["00", "91"])} for j in range(rng.randrange(1, 4))],
+        },
+    }
+
+
+def terminal(rng, day_ms, i):
+    created = _moment(rng, day_ms)
+    # params grande: muchas llaves (varias en el blacklist) y valores largos
+    params = {f"opt{k}": _text(rng, rng.randrange(20, 200)) for k in range(rng.randrange(60, 160))}
+    params.update({
+        "publicKey": _text(rng, 400),
+        "secretKey": _text(rng, 400),
+        "chargeRequest": {"template": _text(rng, 2000)},
+        "userId": _text(rng, 12),
+        "environment": rng.choice(["prod", "sandbox"]),
+    })
+    return {
+        "_id": _oid(rng, created // 1000),
+        "createdAt": created,
+        "updatedAt": created,
+        "serial": _text(rng, 12),
+        "seller": _oid(rng, created // 1000),
+        "params": params,
+        "paramsTest": {k: v for k, v in list(params.items())[:20]},
+    }
+
+
+def sale(rng, day_ms, i):
+    created = _moment(rng, day_ms)
+    return {
+        "_id": _oid(rng, created // 1000),
+        "createdAt": created,
+        "updatedAt": created + rng.randrange(3600000),
+        "amount": round(rng.uniform(1, 20000), 2),
+        "currency": 484,
+        "seller": _oid(rng, created // 1000),
+        "terminal": _oid(rng, created // 1000),
+        "cardNumber": f"{rng.randrange(10 ** 15, 10 ** 16)}",
+        "customerEmail": f"{_text(rng, 10)}@example.com",
+        "transactionId": _text(rng, 20),
+        "items": [{"sku": _text(rng, 8), "qty": rng.randrange(1, 5), "price": round(rng.uniform(1, 500), 2)} for _ in range(rng.randrange(1, 6))],
+    }
+
+
+def refund(rng, day_ms, i, sale_ids):
+    created = _moment(rng, day_ms)
+    return {
+        "_id": _oid(rng, created // 1000),
+        "createdAt": created,
+        "updatedAt": created,
+        "sale": rng.choice(sale_ids),
+        "amount": round(rng.uniform(1, 2000), 2),
+        "reference": rng.choice([_text(rng, 10), rng.randrange(10 ** 6)]),
+        "transactionId": _text(rng, 20),
+        "cardNumber": f"{rng.randrange(10 ** 15, 10 ** 16)}",
+        "customerEmail": f"{_text(rng, 10)}@example.com",
+    }
+
+
+GENERATORS = {"transactionresponse": transactionresponse, "terminal": terminal, "sale": sale}
+
+
+def generate(collection, count, day, seed=42):
+    # {colección: [docs]} con la colección pedida y las que necesita (ej. refund → sale)
+    day_ms = int(datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+    data = {}
+    for name in DEPENDENCIES.get(collection, ()) + (collection,):
+        rng = random.Random(f"{seed}:{name}")
+        if name == "refund":
+            sale_ids = [doc["_id"] for doc in data["sale"]]
+            data[name] = [refund(rng, day_ms, i, sale_ids) for i in range(count)]
+        else:
+            data[name] = [GENERATORS[name](rng, day_ms, i) for i in range(count)]
+    return data
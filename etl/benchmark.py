@@ -0,0 +1,247 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+import bench_data
+
+
+# Benchmark reproducible de MongoETLExtractor con datos sintéticos (bench_data.py):
+#   Mongo → mongomock en memoria, o un mongod local con --mongo-uri
+#   S3    → moto en memoria, o un endpoint local (MinIO, etc.) con --s3-endpoint
+# Cada caso (colección × formato × writer) corre en un proceso nuevo para que el pico de RSS sea solo suyo.
+# Dependencias opcionales en requirements-bench.txt.
+#
+#   python3 etl/benchmark.py --docs 20000 --save
+#   python3 etl/benchmark.py --docs 20000 --compare benchmarks/results/<commit>.json
+
+BUCKET = "etl-benchmark"
+DAY = "2025-01-15"
+DEFAULT_RESULTS_DIR = "benchmarks/results"
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _is_local(uri):
+    host = urlparse(uri).hostname or ""
+    return host in ("localhost", "127.0.0.1", "::1")
+
+
+def _case_config(collection, writer, overrides):
+    with open(os.path.join(REPO_ROOT, "config", f"{collection}_config.json")) as f:
+        config = json.load(f)
+    # Se mide el camino de exportación en un solo proceso: sin scan paralelo (mongomock no se comparte
+    # entre procesos) ni detección de cambios (necesita RawBSONDocument del driver real)
+    config.pop("parallel_scan", None)
+    config.pop("change_detection", None)
+    config["parquet_writer"] = writer
+    config.update(overrides)
+    return config
+
+
+def _load(db, data):
+    for name, docs in data.items():
+        db[name].drop()
+        for i in range(0, len(docs), 5000):
+            db[name].insert_many(docs[i:i + 5000])
+
+
+def _run_case(case):
+    # Corre en un proceso nuevo (spawn); devuelve las métricas del caso
+    workdir = tempfile.mkdtemp(prefix="etl-bench-")
+    try:
+        os.makedirs(os.path.join(workdir, "config"))
+        with open(os.path.join(workdir, "config", f"{case['collection']}_config.json"), "w") as f:
+            json.dump(_case_config(case["collection"], case["writer"], case["overrides"]), f)
+        metrics_path = os.path.join(workdir, "metrics.jsonl")
+        os.environ.update({
+            "ETL_METRICS_FILE": metrics_path,
+            "ETL_METRICS_RSS_INTERVAL": "0.5",
+            "ETL_HISTORY_DB": os.path.join(workdir, "history.db"),
+            "REFERENCE_CACHE_DIR": os.path.join(workdir, "reference_cache"),
+            "ETL_RESUME": "0",
+        })
+        os.chdir(workdir)
+        sys.path.insert(0, os.path.join(REPO_ROOT, "etl"))
+
+        import boto3
+        from mongo_etl import MongoETLExtractor
+
+        data = bench_data.generate(case["collection"], case["docs"], DAY, case["seed"])
+        input_bytes = _bson_bytes(data[case["collection"]])
+        if case["mongo_uri"]:
+            import pymongo
+            client = pymongo.MongoClient(case["mongo_uri"])
+        else:
+            import mongomock
+            client = mongomock.MongoClient()
+        _load(client["EtominTransactions"], data)
+        del data
+
+        mock = None
+        if case["s3_endpoint"]:
+            s3 = boto3.client("s3", endpoint_url=case["s3_endpoint"], region_name="us-east-1")
+        else:
+            from moto import mock_aws
+            mock = mock_aws()
+            mock.start()
+            s3 = boto3.client("s3", region_name="us-east-1")
+        try:
+            s3.create_bucket(Bucket=BUCKET)
+        except s3.exceptions.BucketAlreadyOwnedByYou:
+            pass
+
+        baseline_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        extractor = MongoETLExtractor(case["mongo_uri"] or "mongodb://benchmark", BUCKET, case["collection"], DAY, case["format"],
+                                      client=client, s3_client=s3)
+        started = time.perf_counter()
+        docs = extractor._extract_day(DAY)
+        elapsed = time.perf_counter() - started
+
+        output_bytes = parts = 0
+        for page in s3.get_paginator("list_objects_v2").paginate(Bucket=BUCKET, Prefix=f"{case['collection']}/"):
+            for obj in page.get("Contents", []):
+                output_bytes += obj["Size"]
+                parts += 1
+        run = {}
+        with open(metrics_path) as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("event") == "run":
+                    run = record
+        if mock is not None:
+            mock.stop()
+
+        return {
+            "collection": case["collection"],
+            "format": case["format"],
+            "writer": case["writer"],
+            "docs": docs,
+            "elapsed_s": round(elapsed, 3),
+            "docs_per_s": round(docs / elapsed, 1) if elapsed else None,
+            "input_bytes": input_bytes,
+            "input_mb_per_s": round(input_bytes / elapsed / (1024 ** 2), 2) if elapsed else None,
+            "output_bytes": output_bytes,
+            "parts": parts,
+            "stages_s": run.get("stages_s", {}),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "baseline_rss_mb": round(baseline_rss_mb, 1),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _bson_bytes(docs):
+    import bson
+    return sum(len(bson.encode(doc)) for doc in docs)
+
+
+def _key(result):
+    return result["collection"], result["format"], result["writer"]
+
+
+def _print_results(results):
+    print(f"\n{'collection':<20} {'format':<8} {'writer':<7} {'docs':>8} {'docs/s':>10} {'MB/s':>7} {'out MB':>8} {'parts':>6} {'peak MB':>8}  stages")
+    for r in results:
+        stages = " ".join(f"{k}={v:.2f}" for k, v in r["stages_s"].items() if v)
+        print(f"{r['collection']:<20} {r['format']:<8} {r['writer']:<7} {r['docs']:>8} {r['docs_per_s'] or 0:>10.1f} "
+              f"{r['input_mb_per_s'] or 0:>7.2f} {r['output_bytes'] / (1024 ** 2):>8.2f} {r['parts']:>6} {r['peak_rss_mb']:>8.1f}  {stages}")
+
+
+def _compare(results, baseline_path, threshold):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {_key(r): r for r in baseline["results"]}
+    print(f"\n📊 Compared with {baseline.get('commit')} ({baseline_path}), regression threshold {threshold:.0%}")
+    regressions = 0
+    for r in results:
+        before = previous.get(_key(r))
+        if before is None or not before.get("docs_per_s") or not r.get("docs_per_s"):
+            continue
+        speed = r["docs_per_s"] / before["docs_per_s"] - 1
+        rss = r["peak_rss_mb"] / before["peak_rss_mb"] - 1 if before.get("peak_rss_mb") else 0.0
+        flag = ""
+        if speed < -threshold or rss > threshold:
+            flag = " ⚠️ regression"
+            regressions += 1
+        print(f"   {'/'.join(_key(r)):<36} docs/s {speed:+7.1%}  peak RSS {rss:+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de MongoETLExtractor con datos sintéticos y stand-ins locales")
+    parser.add_argument("--collections", nargs="+", default=list(bench_data.COLLECTIONS), choices=bench_data.COLLECTIONS)
+    parser.add_argument("--formats", nargs="+", default=["parquet", "json"], choices=["parquet", "json", "both"])
+    parser.add_argument("--writers", nargs="+", default=["pandas", "arrow"], choices=["pandas", "arrow"])
+    parser.add_argument("--docs", type=int, default=10000, help="Documentos por colección")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--set", nargs="*", default=[], metavar="KEY=JSON", help="Overrides de config para todos los casos, ej. batch_size=5000")
+    parser.add_argument("--mongo-uri", help="mongod local en lugar de mongomock (se reescriben las colecciones sintéticas)")
+    parser.add_argument("--s3-endpoint", help="Endpoint S3 local (ej. MinIO) en lugar de moto")
+    parser.add_argument("--save", action="store_true", help=f"Guarda los resultados en {DEFAULT_RESULTS_DIR}/<commit>.json")
+    parser.add_argument("--output", help="Ruta del JSON de resultados")
+    parser.add_argument("--compare", help="JSON de resultados anterior para comparar")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Variación que cuenta como regresión")
+    args = parser.parse_args()
+
+    if args.mongo_uri and not _is_local(args.mongo_uri):
+        # El benchmark borra y recarga las colecciones de EtominTransactions
+        parser.error("--mongo-uri must point to a local mongod (localhost / 127.0.0.1)")
+    overrides = {}
+    for item in args.set:
+        key, _, value = item.partition("=")
+        overrides[key] = json.loads(value)
+
+    cases = [
+        {"collection": c, "format": fmt, "writer": writer, "docs": args.docs, "seed": args.seed, "overrides": overrides,
+         "mongo_uri": args.mongo_uri, "s3_endpoint": args.s3_endpoint}
+        for c in args.collections for fmt in args.formats for writer in args.writers
+        # El writer solo cambia algo cuando hay Parquet
+        if fmt != "json" or writer == args.writers[0]
+    ]
+
+    commit = _git_commit()
+    print(f"🏁 Benchmark {commit}: {len(cases)} cases, {args.docs} docs per collection")
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for case in cases:
+        print(f"▶️ {case['collection']} / {case['format']} / {case['writer']}")
+        with ctx.Pool(processes=1) as pool:
+            results.append(pool.apply(_run_case, (case,)))
+    _print_results(results)
+
+    report = {
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "params": {"docs": args.docs, "seed": args.seed, "overrides": overrides,
+                   "mongo": "mongod" if args.mongo_uri else "mongomock", "s3": "endpoint" if args.s3_endpoint else "moto"},
+        "results": results,
+    }
+    output = args.output or (os.path.join(REPO_ROOT, DEFAULT_RESULTS_DIR, f"{commit}.json") if args.save else None)
+    if output:
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results saved to {output}")
+
+    if args.compare and _compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
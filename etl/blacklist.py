@@ -0,0 +1,83 @@
+def _expressible(path):
+    # Campos que Mongo no acepta (o interpreta distinto) en una proyección de exclusión
+    for segment in path.split("."):
+        if not segment or segment.startswith("$") or segment.isdigit():
+            return False
+    return True
+
+
+def _covered(path, prefixes):
+    return any(path == p or path.startswith(p + ".") for p in prefixes)
+
+
+def _build_trie(paths):
+    # {"params": {"publicKey": None, ...}} → None marca el campo a eliminar
+    root = {}
+    for path in paths:
+        keys = path.split(".")
+        node = root
+        for k in keys[:-1]:
+            child = node.setdefault(k, {})
+            if child is None:
+                break  # un prefijo ya se elimina completo
+            node = child
+        else:
+            node[keys[-1]] = None
+    return root
+
+
+def _strip(d, node):
+    for k, child in node.items():
+        if child is None:
+            d.pop(k, None)
+        else:
+            sub = d.get(k)
+            if isinstance(sub, dict):
+                _strip(sub, child)
+            elif isinstance(sub, list):
+                _strip_list(sub, child)
+
+
+def _strip_list(items, node):
+    # Igual que la proyección de Mongo: el resto del camino se aplica a cada subdocumento del arreglo,
+    # así da lo mismo con blacklist_pushdown o sin él. Un segmento numérico ("items.0.secret") apunta a un elemento
+    for k, child in node.items():
+        if k.isdigit():
+            index = int(k)
+            if child is not None and index < len(items) and isinstance(items[index], dict):
+                _strip(items[index], child)
+            continue
+        for item in items:
+            if isinstance(item, dict):
+                _strip(item, {k: child})
+            elif isinstance(item, list):
+                _strip_list(item, {k: child})
+
+
+class CompiledBlacklist:
+    # Se compila una vez por corrida: lo que se puede expresar va como proyección de exclusión al find,
+    # el resto se elimina en Python con un trie (una sola pasada por documento).
+    def __init__(self, paths, pushdown=True):
+        paths = sorted({p.strip() for p in paths or [] if p and p.strip()}, key=lambda p: (p.count("."), p))
+        projected = []
+        residual = []
+        for path in paths:
+            # "a.b" sobra si ya se elimina "a" (además Mongo marca "path collision")
+            if _covered(path, projected) or _covered(path, residual):
+                continue
+            if pushdown and _expressible(path):
+                projected.append(path)
+            else:
+                residual.append(path)
+
+        self.projection = {path: 0 for path in projected} or None
+        self.residual = residual
+        self._trie = _build_trie(residual)
+
+    def strip(self, doc):
+        if self._trie:
+            _strip(doc, self._trie)
+        return doc
+
+    def describe(self):
+        return f"{len(self.projection or {})} fields excluded by projection, {len(self.residual)} stripped in Python"
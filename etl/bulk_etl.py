@@ -6,6 +6,7 @@ import logging
 import threading
 from datetime import datetime, timedelta, timezone
 from mongo_etl import MongoETLExtractor
+from log_shipper import CloudWatchLogShipper
 import gc
 
 # Configuraciones
@@ -21,7 +22,8 @@ collections = ["transactionresponse", "sale", "seller"]
 heavy_collections = {"transactionresponse", "transaction"}  # Puedes agregar más
 
 logs_client = boto3.client("logs", region_name=os.environ.get("AWS_REGION", "us-east-1"))
-sequence_token = None
+# Los eventos se encolan y un hilo los manda en lotes: loguear no bloquea el scheduling
+log_shipper = CloudWatchLogShipper(logs_client, LOG_GROUP, LOG_STREAM)
 
 
 
@@ -33,25 +35,11 @@ def print_memory_status():
     print(f"🧠 Free: {mem.free / (1024**2):.2f} MB")
 
 def init_log_stream():
-    try:
-        logs_client.create_log_stream(logGroupName=LOG_GROUP, logStreamName=LOG_STREAM)
-    except logs_client.exceptions.ResourceAlreadyExistsException:
-        pass
+    log_shipper.start()
 
 
 def put_log(message, timestamp=None):
-    global sequence_token
-    if timestamp is None:
-        timestamp = int(time.time() * 1000)
-    kwargs = {
-        "logGroupName": LOG_GROUP,
-        "logStreamName": LOG_STREAM,
-        "logEvents": [{"timestamp": timestamp, "message": message}]
-    }
-    if sequence_token:
-        kwargs["sequenceToken"] = sequence_token
-    response = logs_client.put_log_events(**kwargs)
-    sequence_token = response.get("nextSequenceToken")
+    log_shipper.log(message, timestamp)
 
 
 def log_memory_usage():
@@ -78,8 +66,8 @@ def run_etl_thread(date_str, collection):
         if is_heavy:
             heavy_running_count += 1
     try:
-        etl = MongoETLExtractor(MONGO_URI, BUCKET_NAME, OUTPUT_FORMAT)
-        etl.extract_and_upload(collection, date_str)
+        etl = MongoETLExtractor(MONGO_URI, BUCKET_NAME, collection, date_str, OUTPUT_FORMAT)
+        etl.extract_and_upload()
     except Exception as e:
         put_log(f"❌ Error in {collection} for {date_str}: {e}")
     finally:
@@ -156,4 +144,5 @@ if __name__ == "__main__":
     gc.collect()
 
     elapsed = round(time.time() - start_ts, 2)
-    put_log(f"✅ Bulk ETL completed in {elapsed} seconds")
\ No newline at end of file
+    put_log(f"✅ Bulk ETL completed in {elapsed} seconds")
+    log_shipper.close()
\ No newline at end of file
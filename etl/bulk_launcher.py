@@ -4,49 +4,34 @@ import sys
 import time
 import argparse
 from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
 import psutil
 import json
+import os
+from scheduler import CostScheduler
+from worker_pool import WarmWorkerPool
 
 
+def parse_args():
+    # Argumentos posicionales y opcional
+    parser = argparse.ArgumentParser(description="ETL launcher por lotes")
 
-# Argumentos posicionales y opcional
-parser = argparse.ArgumentParser(description="ETL launcher por lotes")
+    # Posicionales
+    parser.add_argument("start_date", help="Fecha de inicio en formato YYYY-MM-DD")
+    parser.add_argument("end_date", help="Fecha de fin en formato YYYY-MM-DD")
+    parser.add_argument("max_parallel", type=int, help="Máximo número de procesos en paralelo")
 
-# Posicionales
-parser.add_argument("start_date", help="Fecha de inicio en formato YYYY-MM-DD")
-parser.add_argument("end_date", help="Fecha de fin en formato YYYY-MM-DD")
-parser.add_argument("max_parallel", type=int, help="Máximo número de procesos en paralelo")
-
-# Opcional
-parser.add_argument("--collections", nargs="+", help="Colecciones a procesar (si se omite, se procesan todas)")
-
-args = parser.parse_args()
-
-# Validación de colecciones si se especifican
-if args.collections:
-    invalid = [c for c in args.collections if c not in colecciones_validas]
-    if invalid:
-        print(f"❌ Colecciones no válidas: {invalid}")
-        print(f"✅ Colecciones válidas: {colecciones_validas}")
-        sys.exit(1)
-    colecciones_a_procesar = args.collections
-else:
-    colecciones_a_procesar = colecciones_validas
-
-start_date = datetime.strptime(args.start_date, "%Y-%m-%d")
-end_date = datetime.strptime(args.end_date, "%Y-%m-%d")
-max_parallel = args.max_parallel
-
-
-# Crear lista de tareas (combinación de fechas y colecciones)
-tasks = []
-current = start_date
-while current <= end_date:
-    date_str = current.strftime("%Y-%m-%d")
-    for collection in colecciones_a_procesar:
-        tasks.append((date_str, collection))
-    current += timedelta(days=1)
+    # Opcional
+    parser.add_argument("--collections", nargs="+", help="Colecciones a procesar (si se omite, se procesan todas)")
+    parser.add_argument("--range", action="store_true", help="Una tarea por colección para todo el rango (una sola consulta) en lugar de una por día")
+    parser.add_argument("--schedule", choices=["cost", "fifo"], default="cost", help="cost: las tareas más largas primero según historial/conteo, dentro del presupuesto de memoria; fifo: orden fecha × colección")
+    parser.add_argument("--memory-budget-mb", type=float, help="Memoria total para las tareas en paralelo (default: 80%% de la memoria disponible)")
+    parser.add_argument("--isolated", action="store_true", help="Un subprocess de Python nuevo por tarea en lugar de workers reutilizables")
+    parser.add_argument("--worker-max-tasks", type=int, default=20, help="Tareas por worker antes de reciclarlo")
+    parser.add_argument("--worker-max-rss-mb", type=float, default=2048, help="Pico de RSS de una tarea a partir del cual se recicla su worker")
+    parser.add_argument("--resume", action="store_true", help="Salta días ya completos y retoma los que quedaron a medias según _manifests/ en S3")
 
+    return parser.parse_args()
 
 
 def load_collections(config_path="config/collections.json"):
@@ -54,15 +39,33 @@ def load_collections(config_path="config/collections.json"):
         data = json.load(f)
         return data.get("collections", [])
 
-# Función que corre el ETL como subprocess
 
-# Lista oficial de colecciones válidas
-colecciones_validas = load_collections()
+def build_tasks(args, colecciones_a_procesar):
+    # Crear lista de tareas (combinación de fechas y colecciones)
+    tasks = []
+    if args.range:
+        for collection in colecciones_a_procesar:
+            tasks.append((args.start_date, collection, args.end_date))
+    else:
+        current = datetime.strptime(args.start_date, "%Y-%m-%d")
+        end_date = datetime.strptime(args.end_date, "%Y-%m-%d")
+        while current <= end_date:
+            date_str = current.strftime("%Y-%m-%d")
+            for collection in colecciones_a_procesar:
+                tasks.append((date_str, collection, None))
+            current += timedelta(days=1)
+    return tasks
+
 
+# Función que corre el ETL como subprocess
 def run_etl(task):
-    date_str, collection = task
+    date_str, collection, end_date_str = task
     cmd = ["python3", "./etl/bulk_one_day.py", date_str, collection]
-    print(f"\n🚀 Running ETL for {collection} on {date_str}")
+    if end_date_str:
+        cmd.append(end_date_str)
+        print(f"\n🚀 Running ETL for {collection} from {date_str} to {end_date_str}")
+    else:
+        print(f"\n🚀 Running ETL for {collection} on {date_str}")
 
     # Memoria antes del subprocess
     process = psutil.Process()
@@ -79,10 +82,67 @@ def run_etl(task):
     print(f"🧠 After subprocess — RSS: {mem_info_after.rss / (1024 ** 2):.2f} MB, VMS: {mem_info_after.vms / (1024 ** 2):.2f} MB")
     print(f"✅ Finished ETL for {collection} on {date_str}")
 
-# Ejecutar en paralelo
-if __name__ == "__main__":
-    print(f"🔧 Starting ETL with max {max_parallel} parallel processes...")
+
+# Misma tarea en un worker ya caliente (imports, MongoClient y cliente S3 reutilizados)
+def run_warm(pool, task):
+    date_str, collection, end_date_str = task
+    label = f"from {date_str} to {end_date_str}" if end_date_str else f"on {date_str}"
+    print(f"\n🚀 Running ETL for {collection} {label}")
+    try:
+        pool.run_task(task)
+    except RuntimeError as e:
+        print(f"❌ Error in {collection} {label}: {e}")
+        return
+    print(f"✅ Finished ETL for {collection} {label}")
+
+
+def dispatch(args, tasks, run):
+    if args.schedule == "cost":
+        memory_budget_mb = args.memory_budget_mb or psutil.virtual_memory().available / (1024 ** 2) * 0.8
+        scheduler = CostScheduler(args.max_parallel, memory_budget_mb, mongo_uri=os.environ.get("MONGO_URI"))
+        scheduler.run(scheduler.plan(tasks), run)
+    elif args.isolated:
+        with Pool(processes=args.max_parallel) as pool:
+            pool.map(run, tasks)
+    else:
+        with ThreadPool(processes=args.max_parallel) as pool:
+            pool.map(run, tasks)
+
+
+def main():
+    # Todo el arranque vive acá: los workers (spawn) importan este módulo como __mp_main__ y no deben
+    # volver a parsear argumentos ni leer la config
+    args = parse_args()
+
+    # Lista oficial de colecciones válidas
+    colecciones_validas = load_collections()
+
+    # Validación de colecciones si se especifican
+    if args.collections:
+        invalid = [c for c in args.collections if c not in colecciones_validas]
+        if invalid:
+            print(f"❌ Colecciones no válidas: {invalid}")
+            print(f"✅ Colecciones válidas: {colecciones_validas}")
+            sys.exit(1)
+        colecciones_a_procesar = args.collections
+    else:
+        colecciones_a_procesar = colecciones_validas
+
+    if args.resume:
+        # Los subprocesos heredan el entorno
+        os.environ["ETL_RESUME"] = "1"
+    tasks = build_tasks(args, colecciones_a_procesar)
+
+    # Ejecutar en paralelo
+    print(f"🔧 Starting ETL with max {args.max_parallel} parallel processes...")
     start = time.time()
-    with Pool(processes=max_parallel) as pool:
-        pool.map(run_etl, tasks)
-    print(f"🏁 All ETL tasks completed in {round(time.time() - start, 2)} seconds.")
\ No newline at end of file
+    if args.isolated:
+        dispatch(args, tasks, run_etl)
+    else:
+        with WarmWorkerPool(args.max_parallel, max_tasks=args.worker_max_tasks, max_rss_mb=args.worker_max_rss_mb) as warm_pool:
+            dispatch(args, tasks, lambda task: run_warm(warm_pool, task))
+    print(f"🏁 All ETL tasks completed in {round(time.time() - start, 2)} seconds.")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,19 +5,24 @@ from datetime import datetime
 from mongo_etl import MongoETLExtractor  # Tu clase actual, sin cambios
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python bulk_one_day.py <YYYY-MM-DD> <collection>")
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python bulk_one_day.py <YYYY-MM-DD> <collection> [<end YYYY-MM-DD>]")
         sys.exit(1)
 
     date_str = sys.argv[1]
     collection = sys.argv[2]
+    end_date_str = sys.argv[3] if len(sys.argv) == 4 else None
 
     extractor = MongoETLExtractor(
         mongo_uri=os.environ["MONGO_URI"],
         bucket_name=os.environ.get("S3_BUCKET", "etl-riesgo-penalizaciones-data"),
-        coleccion = collection,
+        collection = collection,
         date_str = date_str,
         output_format=os.environ.get("OUTPUT_FORMAT", "parquet")
     )
 
-    extractor.extract_and_upload()
\ No newline at end of file
+    if end_date_str:
+        # Modo rango: una sola consulta para [date_str, end_date_str]
+        extractor.extract_range(date_str, end_date_str)
+    else:
+        extractor.extract_and_upload()
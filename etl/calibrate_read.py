@@ -0,0 +1,119 @@
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import pymongo
+
+from mongo_etl import MongoETLExtractor
+from read_profile import ReadProfile
+
+
+# Prueba perfiles de lectura (sección "read" de la config) sobre una ventana de muestra y reporta el throughput.
+# Solo lee de Mongo: no escribe nada en S3.
+#
+#   python3 etl/calibrate_read.py --collection transactionresponse --date 2025-06-06
+#   python3 etl/calibrate_read.py --collection sale --date 2025-06-06 --candidates candidates.json
+
+DEFAULT_CANDIDATES = [
+    {},
+    {"compressors": ["snappy"]},
+    {"compressors": ["zstd"]},
+    {"compressors": ["zstd"], "batch_size": 2000},
+    {"compressors": ["zstd"], "batch_size": 10000},
+    {"compressors": ["zstd"], "batch_size": 10000, "exhaust": True},
+    {"compressors": ["zstd"], "batch_size": 10000, "read_preference": "secondaryPreferred"},
+]
+
+
+def _measure(extractor, profile, start_ms, end_ms, limit):
+    # Cliente nuevo por candidato: la compresión se negocia al conectar
+    extractor.read_profile = ReadProfile(profile)
+    client = pymongo.MongoClient(extractor.mongo_uri, **extractor.read_profile.client_options())
+    try:
+        extractor._bind_client(client)
+        started = time.perf_counter()
+        first_doc = None
+        docs = size = 0
+        cursor = extractor._build_cursor_with_config(start_ms, end_ms)
+        try:
+            for doc in cursor:
+                if first_doc is None:
+                    first_doc = time.perf_counter() - started
+                docs += 1
+                size += len(doc.raw)
+                if docs >= limit:
+                    break
+        finally:
+            cursor.close()
+        elapsed = time.perf_counter() - started
+    finally:
+        client.close()
+    return {
+        "docs": docs,
+        "bytes": size,
+        "elapsed_s": round(elapsed, 3),
+        "first_doc_s": round(first_doc or 0.0, 3),
+        "docs_per_s": round(docs / elapsed, 1) if elapsed else 0.0,
+        "mb_per_s": round(size / elapsed / (1024 ** 2), 2) if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibra la sección 'read' de una colección con una ventana de muestra")
+    parser.add_argument("--collection", required=True)
+    parser.add_argument("--date", required=True, help="Día de muestra YYYY-MM-DD")
+    parser.add_argument("--window-minutes", type=int, default=60, help="Duración de la ventana desde el inicio del día")
+    parser.add_argument("--limit", type=int, default=200000, help="Máximo de documentos leídos por candidato")
+    parser.add_argument("--repeat", type=int, default=2, help="Lecturas por candidato; se reporta la más rápida (la primera calienta caches)")
+    parser.add_argument("--candidates", help="JSON con una lista de perfiles a probar (por defecto la configurada + un set estándar)")
+    args = parser.parse_args()
+
+    mongo_uri = os.environ.get("MONGO_URI")
+    if not mongo_uri:
+        parser.error("MONGO_URI is not set")
+
+    extractor = MongoETLExtractor(mongo_uri, os.environ.get("S3_BUCKET", "etl-riesgo-penalizaciones-data"), args.collection, args.date)
+    # Los tamaños se miden sobre los bytes del wire
+    extractor.raw_bson = True
+    default_client = extractor.client
+
+    if args.candidates:
+        with open(args.candidates) as f:
+            candidates = json.load(f)
+    else:
+        candidates = [extractor.config.get("read", {})] + [c for c in DEFAULT_CANDIDATES if c != extractor.config.get("read", {})]
+
+    start = datetime.strptime(args.date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    start_ms = int(start.timestamp() * 1000)
+    end_ms = int((start + timedelta(minutes=args.window_minutes)).timestamp() * 1000)
+    print(f"🔬 Calibrating reads for {args.collection}: {args.date} first {args.window_minutes} min, up to {args.limit} docs, {len(candidates)} profiles")
+
+    results = []
+    try:
+        for profile in candidates:
+            label = ReadProfile(profile).describe()
+            try:
+                runs = [_measure(extractor, profile, start_ms, end_ms, args.limit) for _ in range(max(args.repeat, 1))]
+            except Exception as e:
+                # ej. exhaust detrás de mongos o un compresor sin su paquete
+                print(f"   ❌ {label}: {type(e).__name__}: {e}")
+                continue
+            best = max(runs, key=lambda r: r["docs_per_s"])
+            results.append((profile, best))
+            print(f"   {label:<70} {best['docs']:>8} docs {best['docs_per_s']:>10.1f} docs/s {best['mb_per_s']:>7.2f} MB/s  first doc {best['first_doc_s']:.2f}s")
+    finally:
+        default_client.close()
+
+    if not results:
+        print("❌ No profile could be measured")
+        return
+    profile, best = max(results, key=lambda item: item[1]["docs_per_s"])
+    print(f"\n🏆 Fastest: {ReadProfile(profile).describe()} ({best['docs_per_s']:.1f} docs/s)")
+    print(f"   Add to config/{args.collection}_config.json:")
+    print(json.dumps({"read": profile}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+import json
+import threading
+import time
+from datetime import datetime, timezone
+
+from bson import json_util
+from bson.timestamp import Timestamp
+from pymongo.errors import OperationFailure
+
+from metrics import RunMetrics
+
+
+# Eventos que cambian la colección por completo: el stream se invalida y hay que volver a la extracción diaria
+TERMINAL_EVENTS = ("drop", "rename", "dropDatabase", "invalidate")
+CHANGE_STREAM_HISTORY_LOST = 286
+REFERENCE_CHUNK = 10000
+# Las partes de cada micro-batch: <collection>/day=DD-MM-YYYY/stream_<seq>_partN.<ext>
+STREAM_PART_PREFIX = "stream_"
+
+
+class StreamTerminated(RuntimeError):
+    # El stream no se puede retomar (colección invalidada, token fuera del oplog): reiniciarlo no sirve
+    pass
+
+
+class StreamState:
+    # Estado durable del stream de una colección en S3: _streams/<collection>/state.json
+    #   token   → resume token del último evento ya subido
+    #   seq     → número del último micro-batch confirmado (nombra las partes stream_<seq>_partN)
+    #   pending → micro-batch en escritura; si el proceso muere a la mitad, sus partes se borran al reiniciar
+    #             y los eventos se vuelven a leer desde token
+    def __init__(self, s3, bucket_name, collection):
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.key = f"_streams/{collection}/state.json"
+        self.data = {"collection": collection, "token": None, "seq": 0, "pending": None, "docs": 0}
+
+    def load(self):
+        try:
+            body = self.s3.get_object(Bucket=self.bucket_name, Key=self.key)["Body"].read()
+            self.data.update(json.loads(body))
+        except self.s3.exceptions.NoSuchKey:
+            pass
+        return self
+
+    @property
+    def token(self):
+        # El token se guarda como Extended JSON: en servidores viejos _data es binario
+        return json_util.loads(self.data["token"]) if self.data["token"] else None
+
+    @token.setter
+    def token(self, value):
+        self.data["token"] = json_util.dumps(value) if value is not None else None
+
+    def save(self):
+        self.data["updated_at"] = datetime.now(timezone.utc).isoformat()
+        self.s3.put_object(Bucket=self.bucket_name, Key=self.key, Body=json.dumps(self.data).encode("utf-8"))
+
+
+class ChangeStreamIngestor:
+    # Modo continuo sobre un MongoETLExtractor: sigue el change stream de la colección y escribe micro-batches
+    # en las mismas particiones day=DD-MM-YYYY que la extracción diaria, con el mismo blacklist y tipos.
+    #   - un micro-batch se cierra con el batcher del extractor (bytes / docs) o cada flush_seconds
+    #   - dentro de un micro-batch queda solo la última versión de cada _id
+    #   - colecciones con filter_from_reference van al día del documento referenciado (ej. refund → día de su sale)
+    # Orden de escritura: state con pending → partes → state con el token nuevo. Un reinicio nunca pierde eventos
+    # y a lo sumo repite el micro-batch que estaba en vuelo, con las mismas llaves.
+    def __init__(self, extractor, stop_event=None):
+        self.extractor = extractor
+        self.collection = extractor.collection
+        config = extractor.config.get("stream", {})
+        self.flush_seconds = float(config.get("flush_seconds", 60))
+        self.max_await_ms = int(config.get("max_await_ms", 1000))
+        self.partition_fields = config.get("partition_fields", extractor.config.get("range", {}).get("partition_fields", ["updatedAt", "createdAt"]))
+        self.stop_event = stop_event or threading.Event()
+        self.state = StreamState(extractor.s3, extractor.bucket_name, self.collection)
+        self._buffer = {}
+        self._buffer_bytes = 0
+        self._buffer_started = None
+        self._last_saved = time.monotonic()
+
+    # ---------- stream ----------
+
+    def _pipeline(self):
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"] + list(TERMINAL_EVENTS)}}}]
+        projection = self.extractor.blacklist.projection
+        if projection:
+            # El blacklist se aplica en el servidor también sobre el fullDocument de cada evento
+            pipeline.append({"$project": {f"fullDocument.{path}": 0 for path in projection}})
+        return pipeline
+
+    def _watch(self, start_at=None):
+        ex = self.extractor
+        collection = ex.read_profile.collection(ex.db, self.collection)
+        options = {"full_document": "updateLookup", "max_await_time_ms": self.max_await_ms}
+        if ex.read_profile.batch_size:
+            options["batch_size"] = int(ex.read_profile.batch_size)
+        if self.state.token:
+            options["resume_after"] = self.state.token
+        elif start_at is not None:
+            options["start_at_operation_time"] = Timestamp(int(start_at.timestamp()), 0)
+        return collection.watch(self._pipeline(), **options)
+
+    def run(self, start_at=None):
+        self.state.load()
+        self._recover_pending()
+        token = self.state.data["token"]
+        print(f"📡 Streaming changes of {self.collection} "
+              f"({'resuming after batch ' + str(self.state.data['seq']) if token else 'from ' + (start_at.isoformat() if start_at else 'now')})")
+
+        self.extractor.metrics = RunMetrics(self.collection, "stream").start()
+        try:
+            with self._watch(start_at) as stream:
+                while not self.stop_event.is_set():
+                    change = stream.try_next()
+                    if change is not None:
+                        if change["operationType"] in TERMINAL_EVENTS:
+                            self._flush(stream.resume_token)
+                            raise StreamTerminated(f"❌ Change stream of {self.collection} ended by '{change['operationType']}'; resync with a daily "
+                                                   f"extraction and delete s3://{self.state.bucket_name}/{self.state.key} to restart from now")
+                        self._add(change)
+                        if self._is_full():
+                            self._flush(stream.resume_token)
+                        continue
+                    # Sin eventos: se cierra el micro-batch por tiempo, o se avanza el token para no quedar fuera del oplog
+                    if self._buffer and time.monotonic() - self._buffer_started >= self.flush_seconds:
+                        self._flush(stream.resume_token)
+                    elif not self._buffer and time.monotonic() - self._last_saved >= self.flush_seconds:
+                        self._save_token(stream.resume_token)
+                self._flush(stream.resume_token)
+        except OperationFailure as e:
+            self.extractor.metrics.finish(self.state.data["docs"], status="failed")
+            if e.code == CHANGE_STREAM_HISTORY_LOST:
+                raise StreamTerminated(f"❌ Resume token of {self.collection} is no longer in the oplog; backfill with a daily extraction "
+                                   f"and delete s3://{self.state.bucket_name}/{self.state.key} to restart from now") from e
+            raise
+        except Exception:
+            self.extractor.metrics.finish(self.state.data["docs"], status="failed")
+            raise
+        self.extractor.metrics.finish(self.state.data["docs"])
+        print(f"🛑 Stream of {self.collection} stopped after batch {self.state.data['seq']}")
+
+    # ---------- micro-batches ----------
+
+    def _add(self, change):
+        doc = change.get("fullDocument")
+        if doc is None:
+            return  # borrado antes del lookup: la versión final llegará en otro evento o ya no existe
+        if not self._buffer:
+            self._buffer_started = time.monotonic()
+        # dict ordenado por llegada: una nueva versión del mismo _id reemplaza a la anterior y pasa al final
+        self._buffer.pop(doc["_id"], None)
+        self._buffer[doc["_id"]] = doc
+        self._buffer_bytes += self.extractor.batcher.doc_size(doc)
+
+    def _is_full(self):
+        return self.extractor.batcher.is_full(len(self._buffer), self._buffer_bytes)
+
+    def _days(self, docs):
+        ex = self.extractor
+        if "filter_from_reference" not in ex.config:
+            return [ex._partition_day(doc, self.partition_fields)[0] for doc in docs]
+
+        # El día lo define el documento referenciado, igual que en la extracción diaria
+        target_field = ex.config.get("reference_target", "_id")
+        reference_field = ex.config["reference_field"]
+        refs = list({doc.get(target_field) for doc in docs if doc.get(target_field) is not None})
+        reference = ex.read_profile.collection(ex.db, ex.config["reference_from"])
+        projection = {field: 1 for field in self.partition_fields}
+        projection[reference_field] = 1
+        ref_days = {}
+        for i in range(0, len(refs), REFERENCE_CHUNK):
+            query = {reference_field: {"$in": refs[i:i + REFERENCE_CHUNK]}}
+            for ref in ex.read_profile.find(reference, query, projection):
+                ref_days[ref.get(reference_field)] = ex._partition_day(ref, self.partition_fields)[0]
+        return [ref_days.get(doc.get(target_field)) for doc in docs]
+
+    def _part_prefix(self, seq):
+        return f"{STREAM_PART_PREFIX}{seq:010d}"
+
+    def _recover_pending(self):
+        pending = self.state.data.get("pending")
+        if not pending:
+            return
+        ex = self.extractor
+        prefix = self._part_prefix(pending["seq"])
+        deleted = 0
+        for day in pending["days"]:
+            day_prefix = datetime.strptime(day, "%Y-%m-%d").strftime("day=%d-%m-%Y")
+            response = ex.s3.list_objects_v2(Bucket=ex.bucket_name, Prefix=f"{self.collection}/{day_prefix}/{prefix}_")
+            keys = [{"Key": obj["Key"]} for obj in response.get("Contents", [])]
+            if keys:
+                ex.s3.delete_objects(Bucket=ex.bucket_name, Delete={"Objects": keys})
+                deleted += len(keys)
+        print(f"♻️ Batch {pending['seq']} of {self.collection} was interrupted: {deleted} partial files removed, replaying from the last token")
+        self.state.data["pending"] = None
+        self.state.save()
+
+    def _flush(self, token):
+        if not self._buffer:
+            self._save_token(token)
+            return
+        ex = self.extractor
+        docs = list(self._buffer.values())
+        input_bytes = self._buffer_bytes
+        self._buffer, self._buffer_bytes, self._buffer_started = {}, 0, None
+
+        groups, skipped = {}, 0
+        for doc, day in zip(docs, self._days(docs)):
+            if day is None:
+                skipped += 1
+                continue
+            groups.setdefault(day, []).append(doc)
+        if skipped:
+            print(f"⚠️ {skipped} changed documents of {self.collection} without a partition day, skipped")
+
+        seq = self.state.data["seq"] + 1
+        self.state.data["pending"] = {"seq": seq, "days": sorted(groups)}
+        self.state.save()
+
+        ex.part_prefix = self._part_prefix(seq)
+        for day, day_docs in sorted(groups.items()):
+            target_date = datetime.strptime(day, "%Y-%m-%d")
+            share = int(input_bytes * len(day_docs) / len(docs))
+            prepared = ex._transform_batch((0, day_docs, share), ex.blacklist)
+            ex._upload_batch(prepared, self.collection, target_date)
+        ex._save_schema()
+
+        self.state.token = token
+        self.state.data.update({"seq": seq, "pending": None, "docs": self.state.data["docs"] + len(docs)})
+        self.state.save()
+        self._last_saved = time.monotonic()
+        print(f"🌊 {self.collection} batch {seq}: {len(docs)} documents into {len(groups)} days")
+
+    def _save_token(self, token):
+        if token is None or token == self.state.token:
+            return
+        self.state.token = token
+        self.state.save()
+        self._last_saved = time.monotonic()
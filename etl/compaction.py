@@ -0,0 +1,416 @@
+import argparse
+import io
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
+import boto3
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from inventory import schema_hash
+from ndjson import CODECS, NDJSONWriter, codec_for_key, decompress
+from run_manifest import DayManifest
+from s3_sink import S3MultipartSink, MB
+from schema_registry import ARROW_TYPES, SchemaRegistry, _as_string, widen
+
+
+# Compacta las partes chicas de un día (data_partN, data_sNN_partN, compactaciones previas) en pocos archivos de
+# ~target_mb por formato. Las partes stream_* no se tocan: la extracción diaria las borra al reemplazarlas
+# (_supersede_stream_parts) y dentro de un data_c* quedarían duplicadas para siempre.
+# Orden de escritura, para que un corte a la mitad nunca deje el día incompleto:
+#   1. _manifests/<collection>/day=.../compaction.json con estado "writing" y las llaves viejas
+#   2. archivos nuevos en day=.../_compaction/c<generación>/ + verificación de filas. Athena, Glue, Spark y Hive
+#      ignoran los prefijos que empiezan con "_", así que lo que lee el prefijo del día no los ve todavía
+#   3. "promoting": copia del lado del servidor a day=.../data_c<generación>_partN.<ext>
+#   4. swap: el manifest del día pasa a listar solo los archivos nuevos (un PUT) y compaction.json queda "committed"
+#   5. se borran las partes viejas, el staging y compaction.json
+# Una corrida siguiente deshace todo lo anterior a "committed" o termina el borrado según compaction.json.
+#
+#   python3 etl/compaction.py --collection sale --start-date 2025-01-01 --end-date 2025-01-31 --workers 8
+
+PART_PATTERN = re.compile(r"/data(?:_[a-z]?\d+)*(?:_part\d+)?\.(parquet|json(?:\.gz|\.zst)?)$")
+STAGING_DIR = "_compaction"
+DEFAULT_TARGET_MB = 128
+
+
+class S3RangeReader(io.RawIOBase):
+    # Archivo de solo lectura sobre GETs con Range: pq.read_schema solo baja el footer del Parquet
+    def __init__(self, s3, bucket_name, key, size):
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.key = key
+        self.size = size
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        else:
+            self.position = self.size + offset
+        return self.position
+
+    def readinto(self, buffer):
+        if self.position >= self.size:
+            return 0
+        end = min(self.position + len(buffer), self.size) - 1
+        data = self.s3.get_object(Bucket=self.bucket_name, Key=self.key, Range=f"bytes={self.position}-{end}")["Body"].read()
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+def _kind(arrow_type):
+    if pa.types.is_null(arrow_type):
+        return "null"
+    if pa.types.is_boolean(arrow_type):
+        return "bool"
+    if pa.types.is_integer(arrow_type):
+        return "int"
+    if pa.types.is_floating(arrow_type):
+        return "float"
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return "string"
+    if pa.types.is_timestamp(arrow_type):
+        return "timestamp"
+    if pa.types.is_binary(arrow_type):
+        return "binary"
+    return None  # listas, structs, etc.
+
+
+def unify_schemas(schemas, registry=None):
+    # Columnas de todas las partes en orden de aparición; los tipos en conflicto se ensanchan como en el registro
+    # (int → float → string) y lo anidado que no coincide queda como texto JSON
+    columns = {}
+    for schema in schemas:
+        for field in schema:
+            current = columns.get(field.name)
+            if current is None or current == field.type:
+                columns[field.name] = field.type
+                continue
+            a, b = _kind(current), _kind(field.type)
+            if a is None or b is None:
+                if not pa.types.is_null(field.type):
+                    columns[field.name] = field.type if pa.types.is_null(current) else pa.string()
+            else:
+                columns[field.name] = ARROW_TYPES[widen(a, b)]
+    if registry is not None:
+        for name, kind in registry.columns.items():
+            if name in columns and kind != "null":
+                columns[name] = ARROW_TYPES[kind]
+    return pa.schema([pa.field(name, arrow_type) for name, arrow_type in columns.items()])
+
+
+def conform(table, schema):
+    arrays = []
+    for field in schema:
+        if field.name not in table.column_names:
+            arrays.append(pa.nulls(table.num_rows, type=field.type))
+            continue
+        column = table.column(field.name)
+        if column.type == field.type:
+            arrays.append(column)
+        elif pa.types.is_null(column.type):
+            arrays.append(pa.nulls(table.num_rows, type=field.type))
+        else:
+            try:
+                arrays.append(column.cast(field.type))
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+                if not pa.types.is_string(field.type):
+                    raise
+                # listas / structs → JSON, igual que el registro de esquema
+                arrays.append(pa.array([_as_string(v) for v in column.to_pylist()], type=pa.string()))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class DayCompactor:
+    def __init__(self, s3, bucket_name, collection, target_mb=DEFAULT_TARGET_MB, min_files=2, dry_run=False):
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.collection = collection
+        self.target_bytes = int(target_mb * MB)
+        self.min_files = min_files
+        self.dry_run = dry_run
+        config = _load_config(collection)
+        json_config = config.get("json", {})
+        self.json_codec = json_config.get("compression")
+        self.json_level = json_config.get("level")
+        self.registry = SchemaRegistry.from_config(collection, config)
+
+    # ---------- estado ----------
+
+    def _state_key(self, day_prefix):
+        return f"{DayManifest.prefix(self.collection)}{day_prefix}/compaction.json"
+
+    def _read_state(self, key):
+        try:
+            return json.loads(self.s3.get_object(Bucket=self.bucket_name, Key=key)["Body"].read())
+        except self.s3.exceptions.NoSuchKey:
+            return None
+
+    def _write_state(self, key, state):
+        self.s3.put_object(Bucket=self.bucket_name, Key=key, Body=json.dumps(state).encode("utf-8"))
+
+    def _delete(self, keys):
+        keys = sorted(keys)
+        for i in range(0, len(keys), 1000):
+            self.s3.delete_objects(Bucket=self.bucket_name, Delete={"Objects": [{"Key": k} for k in keys[i:i + 1000]], "Quiet": True})
+
+    def _list(self, prefix):
+        objects = {}
+        for page in self.s3.get_paginator("list_objects_v2").paginate(Bucket=self.bucket_name, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                objects[obj["Key"]] = obj["Size"]
+        return objects
+
+    def _generation_keys(self, prefix, generation, objects):
+        # Lo escrito por una generación: su staging y las copias ya promovidas al prefijo del día
+        staging = f"{prefix}{STAGING_DIR}/c{generation}/"
+        return [k for k in objects if k.startswith(staging) or k.startswith(f"{prefix}data_c{generation}_")]
+
+    def _recover(self, state_key, state, prefix, objects):
+        if state["state"] != "committed":
+            # El swap nunca ocurrió: el manifest sigue listando las partes viejas y lo nuevo sobra
+            leftovers = self._generation_keys(prefix, state["generation"], objects)
+            self._delete(leftovers)
+            print(f"↩️ {self.collection}/{state['day']}: rolled back an interrupted compaction ({len(leftovers)} files)")
+        else:
+            staging = f"{prefix}{STAGING_DIR}/c{state['generation']}/"
+            old_keys = set(state["old"])
+            old = [k for k in objects if k in old_keys or k.startswith(staging)]
+            self._delete(old)
+            print(f"↪️ {self.collection}/{state['day']}: finished an interrupted compaction ({len(old)} old parts removed)")
+        self.s3.delete_object(Bucket=self.bucket_name, Key=state_key)
+
+    def _promote(self, prefix, files):
+        # Copia del lado del servidor (multipart si hace falta): los bytes no pasan por este proceso
+        for f in files:
+            target = f"{prefix}{f['key'].rsplit('/', 1)[-1]}"
+            self.s3.copy({"Bucket": self.bucket_name, "Key": f["key"]}, self.bucket_name, target)
+            f["staged"], f["key"] = f["key"], target
+
+    # ---------- compactación ----------
+
+    def compact_day(self, date_str):
+        day_prefix = datetime.strptime(date_str, "%Y-%m-%d").strftime("day=%d-%m-%Y")
+        prefix = f"{self.collection}/{day_prefix}/"
+        state_key = self._state_key(day_prefix)
+        objects = self._list(prefix)
+
+        state = self._read_state(state_key)
+        if state is not None and not self.dry_run:
+            self._recover(state_key, state, prefix, objects)
+            objects = self._list(prefix)
+
+        manifest = DayManifest(self.s3, self.bucket_name, self.collection, date_str).load()
+        if manifest.data["status"] == "in_progress":
+            return {"day": date_str, "status": "skipped", "reason": "extraction in progress"}
+
+        # Solo archivos directamente bajo day=.../ (no el staging de otra generación)
+        parts = {k: size for k, size in objects.items() if "/" not in k[len(prefix):] and PART_PATTERN.search(k)}
+        by_format = {"parquet": [], "json": []}
+        for key in sorted(parts):
+            by_format["parquet" if key.endswith(".parquet") else "json"].append(key)
+        planned = {fmt: keys for fmt, keys in by_format.items()
+                   if len(keys) >= self.min_files and len(keys) > -(-sum(parts[k] for k in keys) // self.target_bytes)}
+        if not planned:
+            return {"day": date_str, "status": "skipped", "reason": "already compact", "files": len(parts)}
+        old_keys = [k for keys in planned.values() for k in keys]
+        old_bytes = sum(parts[k] for k in old_keys)
+        if self.dry_run:
+            return {"day": date_str, "status": "dry-run", "files": len(old_keys), "bytes": old_bytes}
+
+        generation = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+        state = {"day": date_str, "state": "writing", "generation": generation, "old": old_keys, "new": []}
+        self._write_state(state_key, state)
+
+        staging = f"{prefix}{STAGING_DIR}/c{generation}/"
+        new_files = []
+        try:
+            if "parquet" in planned:
+                new_files += self._compact_parquet(staging, generation, planned["parquet"], parts)
+            if "json" in planned:
+                new_files += self._compact_json(staging, generation, planned["json"])
+            state.update({"state": "promoting", "new": [f["key"] for f in new_files]})
+            self._write_state(state_key, state)
+            self._promote(prefix, new_files)
+        except Exception:
+            # Por prefijo de la generación: si falla la verificación de filas los archivos ya están escritos
+            # pero nunca llegaron a new_files
+            self._delete(self._generation_keys(prefix, generation, self._list(prefix)))
+            self.s3.delete_object(Bucket=self.bucket_name, Key=state_key)
+            raise
+
+        # Swap: a partir de este PUT el manifest del día solo lista los archivos compactados
+        kept = [p for p in manifest.data["parts"] if not set(p["keys"]) & set(old_keys)]
+        manifest.data["parts"] = kept + [
+            {"keys": [f["key"]], "rows": f["rows"], "bytes": f["bytes"], "batch_index": None, "last_id": None,
+             "schema_hash": f.get("schema_hash")} for f in new_files
+        ]
+        if manifest.data["status"] == "new":
+            manifest.data["status"] = "complete"
+            manifest.data["doc_count"] = max(sum(f["rows"] for f in new_files if f["format"] == fmt) for fmt in planned)
+        manifest.data["compacted_at"] = datetime.now(timezone.utc).isoformat()
+        manifest.save()
+        manifest.publish()
+        state.update({"state": "committed", "new": [f["key"] for f in new_files]})
+        self._write_state(state_key, state)
+
+        self._delete(old_keys + [f["staged"] for f in new_files])
+        self.s3.delete_object(Bucket=self.bucket_name, Key=state_key)
+        new_bytes = sum(f["bytes"] for f in new_files)
+        print(f"🗜️ {self.collection}/{day_prefix}: {len(old_keys)} parts ({old_bytes / MB:.1f} MB) → {len(new_files)} files ({new_bytes / MB:.1f} MB)")
+        return {"day": date_str, "status": "compacted", "files": len(old_keys), "bytes": old_bytes,
+                "new_files": len(new_files), "new_bytes": new_bytes}
+
+    def _compact_parquet(self, staging, generation, keys, sizes):
+        schemas = [pq.read_schema(S3RangeReader(self.s3, self.bucket_name, k, sizes[k])) for k in keys]
+        schema = unify_schemas(schemas, self.registry)
+        files, rows_in = [], 0
+        writer = sink = None
+        file_rows = 0
+        try:
+            for key in keys:
+                body = self.s3.get_object(Bucket=self.bucket_name, Key=key)["Body"].read()
+                table = conform(pq.read_table(pa.BufferReader(body)), schema)
+                del body
+                rows_in += table.num_rows
+                if writer is None:
+                    sink = S3MultipartSink(self.s3, self.bucket_name, f"{staging}data_c{generation}_part{len(files) + 1}.parquet")
+                    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+                    file_rows = 0
+                writer.write_table(table)
+                file_rows += table.num_rows
+                if sink.bytes_written >= self.target_bytes:
+                    writer.close()
+                    sink.complete()
+                    files.append({"key": sink.key, "rows": file_rows, "bytes": sink.bytes_written, "format": "parquet",
+                                  "schema_hash": schema_hash(schema)})
+                    writer = sink = None
+            if writer is not None:
+                writer.close()
+                sink.complete()
+                files.append({"key": sink.key, "rows": file_rows, "bytes": sink.bytes_written, "format": "parquet",
+                                  "schema_hash": schema_hash(schema)})
+                writer = sink = None
+        except Exception:
+            if sink is not None:
+                sink.abort()
+            self._delete([f["key"] for f in files])
+            raise
+        _check_rows(keys, rows_in, files)
+        return files
+
+    def _compact_json(self, staging, generation, keys):
+        ext = f".json{CODECS[self.json_codec]}"
+        files, rows_in = [], 0
+        writer = sink = None
+        try:
+            for key in keys:
+                body = self.s3.get_object(Bucket=self.bucket_name, Key=key)["Body"].read()
+                lines = decompress(body, codec_for_key(key)).decode("utf-8").splitlines()
+                del body
+                if sink is None:
+                    sink = S3MultipartSink(self.s3, self.bucket_name, f"{staging}data_c{generation}_part{len(files) + 1}{ext}")
+                    writer = NDJSONWriter(sink, self.json_codec, self.json_level)
+                for line in lines:
+                    if line.strip():
+                        writer.write_encoded(line)
+                        rows_in += 1
+                if sink.bytes_written >= self.target_bytes:
+                    writer.close()
+                    sink.complete()
+                    files.append({"key": sink.key, "rows": writer.rows, "bytes": sink.bytes_written, "format": "json"})
+                    writer = sink = None
+            if sink is not None:
+                writer.close()
+                sink.complete()
+                files.append({"key": sink.key, "rows": writer.rows, "bytes": sink.bytes_written, "format": "json"})
+                writer = sink = None
+        except Exception:
+            if sink is not None:
+                sink.abort()
+            self._delete([f["key"] for f in files])
+            raise
+        _check_rows(keys, rows_in, files)
+        return files
+
+
+def _check_rows(keys, rows_in, files):
+    rows_out = sum(f["rows"] for f in files)
+    if rows_in != rows_out:
+        raise RuntimeError(f"❌ Compaction row mismatch for {keys[0].rsplit('/', 1)[0]}: {rows_in} read, {rows_out} written")
+
+
+def _load_config(collection):
+    try:
+        with open(f"config/{collection}_config.json") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise ValueError(f"❌ Config not found for collection: {collection}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compacta las partes chicas de S3 en pocos archivos por día")
+    parser.add_argument("--collection", required=True)
+    parser.add_argument("--start-date", required=True, help="YYYY-MM-DD")
+    parser.add_argument("--end-date", help="YYYY-MM-DD (default: start-date)")
+    parser.add_argument("--target-mb", type=float, default=DEFAULT_TARGET_MB, help="Tamaño buscado de cada archivo compactado")
+    parser.add_argument("--min-files", type=int, default=2, help="Días con menos partes por formato no se tocan")
+    parser.add_argument("--min-age-days", type=int, default=1, help="No compacta días más recientes (pueden seguir recibiendo partes)")
+    parser.add_argument("--workers", type=int, default=4, help="Días compactados en paralelo")
+    parser.add_argument("--dry-run", action="store_true", help="Solo reporta qué días se compactarían")
+    parser.add_argument("--s3-endpoint", help="Endpoint S3 alternativo (ej. MinIO local)")
+    args = parser.parse_args()
+
+    bucket_name = os.environ.get("S3_BUCKET", "etl-riesgo-penalizaciones-data")
+    s3 = boto3.client("s3", endpoint_url=args.s3_endpoint) if args.s3_endpoint else boto3.client("s3")
+    start = datetime.strptime(args.start_date, "%Y-%m-%d")
+    end = datetime.strptime(args.end_date or args.start_date, "%Y-%m-%d")
+    newest = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=args.min_age_days)
+    days = []
+    current = start
+    while current <= end:
+        if current.date() <= newest.date():
+            days.append(current.strftime("%Y-%m-%d"))
+        current += timedelta(days=1)
+    if not days:
+        print("ℹ️ No days old enough to compact in the range")
+        return
+
+    compactor = DayCompactor(s3, bucket_name, args.collection, args.target_mb, args.min_files, args.dry_run)
+    print(f"🗜️ Compacting {args.collection}: {len(days)} days, target {args.target_mb:.0f} MB, {args.workers} workers{' (dry run)' if args.dry_run else ''}")
+    results, failed = [], 0
+    with ThreadPoolExecutor(max_workers=max(args.workers, 1)) as executor:
+        futures = {executor.submit(compactor.compact_day, day): day for day in days}
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                failed += 1
+                print(f"❌ {args.collection}/{futures[future]}: {e}")
+
+    compacted = [r for r in results if r["status"] in ("compacted", "dry-run")]
+    before = sum(r["files"] for r in compacted)
+    after = sum(r.get("new_files", 0) for r in compacted)
+    print(f"📊 {len(compacted)} days {'to compact' if args.dry_run else 'compacted'} ({before} parts"
+          f"{'' if args.dry_run else f' → {after} files'}), {len(results) - len(compacted)} skipped, {failed} failed")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -29,7 +29,10 @@ def main():
     colecciones_validas = load_collections()
     parser.add_argument("--date", required=True, help="Extraction date in format YYYY-MM-DD")
     parser.add_argument("--collection", required=True, choices=colecciones_validas, help="Collection to extract")
+    parser.add_argument("--resume", action="store_true", help="Skip the day if already complete, or continue from its last uploaded part")
     args = parser.parse_args()
+    if args.resume:
+        os.environ["ETL_RESUME"] = "1"
 
     mongo_uri = os.environ.get("MONGO_URI")
     bucket_name = os.environ.get("S3_BUCKET", "etl-riesgo-penalizaciones-data")
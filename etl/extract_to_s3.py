@@ -6,23 +6,16 @@ import pymongo
 import time
 import logging
 from datetime import datetime, timedelta, timezone
+from log_shipper import CloudWatchLogShipper
 
 LOG_GROUP = "/etl/riesgo-penalizaciones"
 LOG_STREAM = f"run-{datetime.now(timezone.utc).strftime('%Y-%m-%d-%H%M%S')}"
 logs_client = boto3.client("logs", region_name = "us-east-1")
+log_shipper = CloudWatchLogShipper(logs_client, LOG_GROUP, LOG_STREAM)
 
 def log_to_cloudwatch(message):
-    try:
-        logs_client.create_log_stream(logGroupName=LOG_GROUP, logStreamName=LOG_STREAM)
-    except logs_client.exceptions.ResourceAlreadyExistsException:
-        pass
-
-    timestamp = int(time.time() * 1000)
-    logs_client.put_log_events(
-        logGroupName=LOG_GROUP,
-        logStreamName=LOG_STREAM,
-        logEvents=[{"timestamp": timestamp, "message": message}]
-    )
+    # El stream se crea una sola vez y los eventos salen en lotes; atexit vacía lo pendiente
+    log_shipper.start().log(message)
 
 
 
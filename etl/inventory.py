@@ -0,0 +1,166 @@
+import hashlib
+import json
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError, ParamValidationError
+
+
+DAY_PREFIX = re.compile(r"/day=(\d{2})-(\d{2})-(\d{4})/$")
+# Partes de datos de un día: data.json, data_part1.parquet, data_s01_part1.parquet, data_c<gen>_part1.parquet,
+# stream_0000000042_part1.json.gz, etc.
+DATA_FILE = re.compile(r"/(?:data(?:_[sc]\d+)?|stream_\d+)(?:_part\d+)?\.(?:json|parquet)(?:\.gz|\.zst)?$")
+
+
+def schema_hash(schema):
+    # Huella estable de un esquema de Arrow (nombres, tipos y nulabilidad; sin la metadata de pandas)
+    return hashlib.sha1(schema.to_string(show_schema_metadata=False).encode("utf-8")).hexdigest()[:16]
+
+
+def day_entry(keys, size, status="unknown", doc_count=None, schema_hashes=(), source="manifest"):
+    # keys: archivos de datos del día; size: bytes totales
+    return {
+        "status": status,
+        "doc_count": doc_count,
+        "files": len(keys),
+        "parquet": sum(1 for key in keys if key.endswith(".parquet")),
+        "json": sum(1 for key in keys if ".json" in key.rsplit("/", 1)[-1]),
+        "bytes": size,
+        "schema_hashes": sorted(set(h for h in schema_hashes if h)),
+        "source": source,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+class CollectionIndex:
+    # Resumen por colección de todos sus días: _manifests/<collection>/index.json
+    #   {"collection", "days": {"YYYY-MM-DD": {status, doc_count, files, parquet, json, bytes, schema_hashes, source}}}
+    # Cada día completo lo actualiza con PUT condicional (If-Match sobre el ETag) para que workers en paralelo
+    # no se pisen; rebuild() lo reconstruye listando los días en paralelo para datos anteriores a los manifests.
+    def __init__(self, s3, bucket_name, collection, max_retries=10):
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.collection = collection
+        self.key = f"_manifests/{collection}/index.json"
+        self.max_retries = max_retries
+        self._conditional = True
+
+    def _get(self):
+        try:
+            response = self.s3.get_object(Bucket=self.bucket_name, Key=self.key)
+            return json.loads(response["Body"].read()), response.get("ETag")
+        except self.s3.exceptions.NoSuchKey:
+            return {"collection": self.collection, "days": {}}, None
+
+    def load(self):
+        return self._get()[0]
+
+    def _put(self, data, etag):
+        data["updated_at"] = datetime.now(timezone.utc).isoformat()
+        body = json.dumps(data).encode("utf-8")
+        if self._conditional:
+            condition = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+            try:
+                self.s3.put_object(Bucket=self.bucket_name, Key=self.key, Body=body, **condition)
+                return True
+            except ParamValidationError:
+                # botocore sin escrituras condicionales: último en escribir gana, rebuild() corrige
+                self._conditional = False
+            except ClientError as e:
+                if e.response["Error"]["Code"] in ("PreconditionFailed", "ConditionalRequestConflict", "412"):
+                    return False
+                raise
+        self.s3.put_object(Bucket=self.bucket_name, Key=self.key, Body=body)
+        return True
+
+    def _modify(self, change, label):
+        # change(days) modifica el dict de días; se reintenta con el índice recién leído si otro worker escribió antes
+        for _ in range(self.max_retries):
+            data, etag = self._get()
+            change(data["days"])
+            if self._put(data, etag):
+                return True
+            time.sleep(random.uniform(0.05, 0.5))
+        print(f"⚠️ Could not update s3://{self.bucket_name}/{self.key} for {label} (concurrent writers); run review_dates.py --rebuild")
+        return False
+
+    def update(self, date_str, entry):
+        return self._modify(lambda days: days.__setitem__(date_str, entry), date_str)
+
+    def apply(self, entries=None, removed=()):
+        # Varios días en un solo PUT (ej. después de una purga de retención)
+        def change(days):
+            days.update(entries or {})
+            for date_str in removed:
+                days.pop(date_str, None)
+        return self._modify(change, f"{len(entries or {}) + len(removed)} days")
+
+    # ---------- reconstrucción ----------
+
+    def listing_entry(self, prefix, objects):
+        # Entrada de un día a partir de su listado [(key, bytes)]; el manifest del día, si existe, aporta estado,
+        # documentos y hashes de esquema
+        day = prefix.rstrip("/").rsplit("/", 1)[-1]
+        manifest = _read_json(self.s3, self.bucket_name, f"_manifests/{self.collection}/{day}/manifest.json") or {}
+        # Con manifest solo cuentan las llaves que lista (más las partes stream_*, que nunca están en él): así una
+        # compactación o reescritura a medias no se cuenta doble. Los subprefijos (_compaction/) nunca son datos.
+        referenced = {k for part in manifest.get("parts", []) for k in part["keys"]}
+        files = {k: size for k, size in objects
+                 if "/" not in k[len(prefix):] and DATA_FILE.search(k)
+                 and (not referenced or k in referenced or "/stream_" in k)}
+        hashes = [p.get("schema_hash") for p in manifest.get("parts", [])]
+        return day_entry(list(files), sum(files.values()), manifest.get("status", "unknown"),
+                         manifest.get("doc_count"), hashes, source="listing")
+
+    def rebuild(self, workers=16):
+        # Un listado por día (en paralelo) en lugar de uno sobre toda la colección
+        days = list_days(self.s3, self.bucket_name, self.collection)
+
+        def scan(item):
+            date_str, prefix = item
+            return date_str, self.listing_entry(prefix, list_objects(self.s3, self.bucket_name, prefix))
+
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            entries = dict(executor.map(scan, days))
+        data = {"collection": self.collection, "days": dict(sorted(entries.items())), "rebuilt_at": datetime.now(timezone.utc).isoformat()}
+        # Se escribe sin condición: el listado es la fuente de verdad en este momento
+        data["updated_at"] = datetime.now(timezone.utc).isoformat()
+        self.s3.put_object(Bucket=self.bucket_name, Key=self.key, Body=json.dumps(data).encode("utf-8"))
+        return data
+
+
+def list_top_level(s3, bucket_name, collection):
+    # Un listado con delimitador bajo <collection>/: días [(YYYY-MM-DD, prefijo)], otros prefijos y objetos sueltos
+    days, others, objects = [], [], []
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket_name, Prefix=f"{collection}/", Delimiter="/"):
+        for common in page.get("CommonPrefixes", []):
+            match = DAY_PREFIX.search(common["Prefix"])
+            if match:
+                dd, mm, yyyy = match.groups()
+                days.append((f"{yyyy}-{mm}-{dd}", common["Prefix"]))
+            else:
+                others.append(common["Prefix"])
+        objects.extend((obj["Key"], obj["Size"]) for obj in page.get("Contents", []))
+    return sorted(days), others, objects
+
+
+def list_days(s3, bucket_name, collection):
+    # [(YYYY-MM-DD, "<collection>/day=DD-MM-YYYY/")] usando el delimitador: no lista los objetos de cada día
+    return list_top_level(s3, bucket_name, collection)[0]
+
+
+def list_objects(s3, bucket_name, prefix):
+    objects = []
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket_name, Prefix=prefix):
+        objects.extend((obj["Key"], obj["Size"]) for obj in page.get("Contents", []))
+    return objects
+
+
+def _read_json(s3, bucket_name, key):
+    try:
+        return json.loads(s3.get_object(Bucket=bucket_name, Key=key)["Body"].read())
+    except s3.exceptions.NoSuchKey:
+        return None
@@ -0,0 +1,252 @@
+import atexit
+import collections
+import json
+import os
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+
+# Límites de PutLogEvents
+MAX_BATCH_EVENTS = 10000
+MAX_BATCH_BYTES = 1048576
+EVENT_OVERHEAD = 26  # bytes que CloudWatch suma a cada evento
+MAX_EVENT_BYTES = 256 * 1024 - EVENT_OVERHEAD
+MAX_BATCH_SPAN_MS = 24 * 3600 * 1000
+
+
+class CloudWatchLogShipper:
+    # log() solo encola el evento; un hilo en segundo plano los manda en lotes dentro de los límites de la API.
+    # Si la cola se llena los eventos nuevos van a spill_path (JSON lines, un archivo por proceso: <spill_path>.<pid>)
+    # o, sin spill_path, se descartan y se cuenta cuántos. close() (registrado en atexit) vacía la cola antes de salir.
+    # Un lote que no se pudo mandar también va al spill con un intento más; después de max_spill_attempts se aparta
+    # en <spill_path>.failed, así un error no reintentable no se recarga y reintenta para siempre.
+    # logs_client puede ser cualquier objeto con create_log_stream / put_log_events (boto3, moto o un doble local).
+    def __init__(self, logs_client, log_group, log_stream, flush_interval=5.0, max_buffer=50000,
+                 spill_path=None, max_retries=8, max_spill_attempts=3):
+        self.logs_client = logs_client
+        self.log_group = log_group
+        self.log_stream = log_stream
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        spill_path = spill_path if spill_path is not None else os.environ.get("LOG_SPILL_PATH")
+        # Por pid: varios procesos con el mismo LOG_SPILL_PATH no se pisan al recargar
+        self.spill_path = f"{spill_path}.{os.getpid()}" if spill_path else None
+        self.failed_path = f"{self.spill_path}.failed" if self.spill_path else None
+        self.max_retries = max_retries
+        self.max_spill_attempts = max(int(max_spill_attempts), 1)
+        self.sequence_token = None
+        self.dropped = 0
+        self.spilled = 0
+        self.quarantined = 0
+        self._buffer = collections.deque()
+        self._cond = threading.Condition()
+        self._spill_lock = threading.Lock()
+        self._closed = False
+        self._stream_ready = False
+        self._sending = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="cloudwatch-shipper", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+        return self
+
+    # ---------- productor ----------
+
+    def log(self, message, timestamp=None):
+        if timestamp is None:
+            timestamp = int(time.time() * 1000)
+        encoded = message.encode("utf-8")
+        if len(encoded) > MAX_EVENT_BYTES:
+            message = encoded[:MAX_EVENT_BYTES].decode("utf-8", errors="ignore")
+        event = {"timestamp": timestamp, "message": message}
+        with self._cond:
+            if len(self._buffer) < self.max_buffer:
+                self._buffer.append(event)
+                if len(self._buffer) >= MAX_BATCH_EVENTS:
+                    self._cond.notify()
+                return
+        self._overflow(event)
+
+    def _overflow(self, event):
+        if self.spill_path:
+            with self._spill_lock, open(self.spill_path, "a") as f:
+                f.write(json.dumps(event) + "\n")
+            self.spilled += 1
+        else:
+            self.dropped += 1
+
+    # ---------- consumidor ----------
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._buffer and not self._closed:
+                    self._cond.wait(self.flush_interval)
+                closing = self._closed
+            self._drain()
+            if closing:
+                return
+
+    def _drain(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                self._sending = False
+                if not self._reload_spill():
+                    return
+                continue
+            if not self._send(batch):
+                # No se pudo mandar (reintentos agotados o error no reintentable): a disco si hay dónde, si no se pierden
+                self._spill_failed(batch)
+                self._sending = False
+                return
+
+    def _spill_failed(self, batch):
+        if not self.spill_path:
+            self.dropped += len(batch)
+            return
+        retry, failed = [], []
+        for event in batch:
+            event = dict(event, attempts=event.get("attempts", 0) + 1)
+            (failed if event["attempts"] >= self.max_spill_attempts else retry).append(event)
+        with self._spill_lock:
+            for path, events in ((self.spill_path, retry), (self.failed_path, failed)):
+                if events:
+                    with open(path, "a") as f:
+                        f.writelines(json.dumps(e) + "\n" for e in events)
+        self.spilled += len(retry)
+        if failed and not self.quarantined:
+            print(f"🚫 CloudWatch rejected log events {self.max_spill_attempts} times, moving them to {self.failed_path}")
+        self.quarantined += len(failed)
+
+    def _next_batch(self):
+        batch, size = [], 0
+        with self._cond:
+            while self._buffer and len(batch) < MAX_BATCH_EVENTS:
+                event = self._buffer[0]
+                event_size = len(event["message"].encode("utf-8")) + EVENT_OVERHEAD
+                if size + event_size > MAX_BATCH_BYTES:
+                    break
+                if batch and event["timestamp"] - batch[0]["timestamp"] > MAX_BATCH_SPAN_MS:
+                    break
+                batch.append(self._buffer.popleft())
+                size += event_size
+            self._sending = bool(batch)
+        # PutLogEvents exige orden cronológico dentro del lote
+        batch.sort(key=lambda e: e["timestamp"])
+        return batch
+
+    def _reload_spill(self):
+        # Cuando la cola se vacía se recuperan los eventos que se fueron a disco, solo hasta max_buffer;
+        # el resto queda en el archivo para la próxima vez
+        if not self.spill_path:
+            return False
+        with self._cond:
+            room = self.max_buffer - len(self._buffer)
+        if room <= 0:
+            return False
+        events = []
+        with self._spill_lock:
+            if not os.path.exists(self.spill_path):
+                return False
+            remaining = f"{self.spill_path}.remaining"
+            with open(self.spill_path) as f, open(remaining, "w") as rest:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    if len(events) < room:
+                        events.append(json.loads(line))
+                    else:
+                        rest.write(line)
+            if os.path.getsize(remaining):
+                os.replace(remaining, self.spill_path)
+            else:
+                os.remove(remaining)
+                os.remove(self.spill_path)
+        with self._cond:
+            self._buffer.extend(events)
+        return bool(events)
+
+    def _ensure_stream(self):
+        if self._stream_ready:
+            return
+        try:
+            self.logs_client.create_log_stream(logGroupName=self.log_group, logStreamName=self.log_stream)
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ResourceAlreadyExistsException":
+                raise
+        self._stream_ready = True
+
+    def _send(self, batch):
+        delay = 0.2
+        for _ in range(self.max_retries):
+            try:
+                self._ensure_stream()
+                events = [{"timestamp": e["timestamp"], "message": e["message"]} for e in batch]
+                kwargs = {"logGroupName": self.log_group, "logStreamName": self.log_stream, "logEvents": events}
+                if self.sequence_token:
+                    kwargs["sequenceToken"] = self.sequence_token
+                response = self.logs_client.put_log_events(**kwargs)
+                self.sequence_token = response.get("nextSequenceToken")
+                return True
+            except ClientError as e:
+                error = e.response.get("Error", {})
+                code = error.get("Code")
+                if code in ("InvalidSequenceTokenException", "DataAlreadyAcceptedException"):
+                    self.sequence_token = e.response.get("expectedSequenceToken") or _expected_token(error.get("Message", ""))
+                    if code == "DataAlreadyAcceptedException":
+                        return True
+                    continue
+                if code == "ResourceNotFoundException":
+                    self._stream_ready = False
+                    continue
+                if code not in ("ThrottlingException", "ServiceUnavailableException"):
+                    print(f"⚠️ CloudWatch put_log_events failed: {e}")
+                    return False
+            except Exception as e:
+                print(f"⚠️ CloudWatch put_log_events failed: {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, 10)
+        return False
+
+    # ---------- cierre ----------
+
+    def flush(self, timeout=30):
+        # Espera a que la cola quede vacía (o hasta timeout)
+        with self._cond:
+            self._cond.notify()
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._cond:
+                if not self._buffer and not self._sending:
+                    return True
+            time.sleep(0.05)
+        return False
+
+    def close(self, timeout=30):
+        if self._closed:
+            return
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.dropped:
+            print(f"⚠️ {self.dropped} log events dropped (buffer full)")
+        if self.spilled and os.path.exists(self.spill_path):
+            print(f"💾 {self.spilled} log events spilled to {self.spill_path}")
+        if self.quarantined:
+            print(f"🚫 {self.quarantined} log events set aside in {self.failed_path} after {self.max_spill_attempts} failed attempts")
+
+
+def _expected_token(message):
+    # "The given sequenceToken is invalid. The next expected sequenceToken is: 4961..."
+    marker = "sequenceToken is: "
+    if marker in message:
+        return message.split(marker, 1)[1].strip() or None
+    return None
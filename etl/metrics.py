@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import psutil
+
+
+STAGES = ("fetch", "sanitize", "convert", "normalize", "serialize", "upload")
+
+
+class RunMetrics:
+    # Contadores por etapa (segundos y bytes) de una corrida, escritos como JSON lines en ETL_METRICS_FILE:
+    # una línea por parte subida y un resumen al final con docs/s, tamaños de parte y RSS muestreado.
+    # Se mide por batch y por parte, nunca por documento, para que medir no sea lo más lento de la corrida.
+    # ETL_TRACEMALLOC=<frames> agrega al resumen las líneas que más memoria asignaron.
+    def __init__(self, collection, label, path=None, rss_interval=None, tracemalloc_frames=None):
+        self.collection = collection
+        self.label = label
+        self.path = os.environ.get("ETL_METRICS_FILE", "etl_metrics.jsonl") if path is None else path
+        if rss_interval is None:
+            rss_interval = float(os.environ.get("ETL_METRICS_RSS_INTERVAL", 5))
+        if tracemalloc_frames is None:
+            tracemalloc_frames = int(os.environ.get("ETL_TRACEMALLOC", 0))
+        self.rss_interval = rss_interval
+        self.tracemalloc_frames = tracemalloc_frames
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.bytes = dict.fromkeys(STAGES, 0)
+        self.part_sizes = []
+        self.rss_samples = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._started = None
+        self._process = psutil.Process()
+
+    # ---------- contadores ----------
+
+    def add(self, stage, seconds, nbytes=0):
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+            self.bytes[stage] = self.bytes.get(stage, 0) + nbytes
+
+    @contextmanager
+    def stage(self, name, nbytes=0):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started, nbytes)
+
+    def part(self, key, rows, size):
+        with self._lock:
+            self.part_sizes.append(size)
+        self._emit({"event": "part", "key": key, "rows": rows, "bytes": size})
+
+    # ---------- ciclo de vida ----------
+
+    def start(self):
+        self._started = time.perf_counter()
+        if self.tracemalloc_frames:
+            import tracemalloc
+            tracemalloc.start(self.tracemalloc_frames)
+        if self.rss_interval > 0:
+            self._sampler = threading.Thread(target=self._sample_rss, name="metrics-rss", daemon=True)
+            self._sampler.start()
+        return self
+
+    @property
+    def peak_rss_mb(self):
+        # Pico de RSS muestreado durante esta corrida; a diferencia de ru_maxrss no arrastra el de tareas anteriores
+        # del mismo proceso (workers del pool)
+        with self._lock:
+            return round(max(self.rss_samples) / (1024 ** 2), 1) if self.rss_samples else None
+
+    def _sample_rss(self):
+        while True:
+            rss = self._process.memory_info().rss
+            with self._lock:
+                self.rss_samples.append(rss)
+            if self._stop.wait(self.rss_interval):
+                break
+
+    def finish(self, docs, status="ok"):
+        elapsed = time.perf_counter() - self._started if self._started else 0.0
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        with self._lock:
+            self.rss_samples.append(self._process.memory_info().rss)
+            sizes = sorted(self.part_sizes)
+            summary = {
+                "event": "run",
+                "status": status,
+                "elapsed_s": round(elapsed, 3),
+                "docs": docs,
+                "docs_per_s": round(docs / elapsed, 1) if elapsed else None,
+                "stages_s": {k: round(v, 3) for k, v in self.seconds.items()},
+                "stages_bytes": self.bytes,
+                "parts": len(sizes),
+                "part_bytes": {
+                    "min": sizes[0],
+                    "median": sizes[len(sizes) // 2],
+                    "max": sizes[-1],
+                    "total": sum(sizes),
+                } if sizes else None,
+                "rss_mb": {
+                    "max": round(max(self.rss_samples) / (1024 ** 2), 1),
+                    "last": round(self.rss_samples[-1] / (1024 ** 2), 1),
+                    "samples": len(self.rss_samples),
+                },
+            }
+        if self.tracemalloc_frames:
+            summary["tracemalloc_top"] = self._tracemalloc_top()
+        self._emit(summary)
+
+        stages = ", ".join(f"{k} {v:.1f}s" for k, v in summary["stages_s"].items() if v)
+        print(f"📈 {self.collection} {self.label}: {docs} docs in {elapsed:.1f}s ({summary['docs_per_s'] or 0} docs/s) — {stages}")
+        return summary
+
+    def _tracemalloc_top(self, limit=10):
+        # Reemplaza el escaneo de gc.get_objects(): solo cuesta mientras tracemalloc está activo
+        import tracemalloc
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        top = []
+        for stat in snapshot.statistics("lineno")[:limit]:
+            frame = stat.traceback[0]
+            top.append({"where": f"{frame.filename}:{frame.lineno}", "mb": round(stat.size / (1024 ** 2), 2), "blocks": stat.count})
+        for entry in top:
+            print(f"🧱 {entry['where']}: {entry['mb']} MB in {entry['blocks']} blocks")
+        return top
+
+    def _emit(self, record):
+        if not self.path:
+            return
+        record = {
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "pid": os.getpid(),
+            "collection": self.collection,
+            "run": self.label,
+            **record,
+        }
+        line = json.dumps(record, default=str) + "\n"
+        # Una sola escritura en modo append: líneas de varios procesos no se mezclan
+        with open(self.path, "a") as f:
+            f.write(line)
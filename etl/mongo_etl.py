@@ -2,59 +2,148 @@
 import json
 import boto3
 import pymongo
+from pymongo.errors import ExecutionTimeout
 from datetime import datetime, timedelta,timezone
 from configparser import ConfigParser
-from io import BytesIO
 import pandas as pd
 from bson import ObjectId
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from arrow_writer import ArrowParquetWriter, flatten_document
+from s3_sink import S3MultipartSink, MB
+from pipeline import StagedPipeline
+from blacklist import CompiledBlacklist
+from reference_join import ReferenceJoin
+from reference_cache import ReferenceIdCache
+from snapshot_index import SnapshotIndex
+from run_manifest import DayManifest, ResumeMismatch
+from inventory import schema_hash
+from retention import RetentionEngine, RetentionPolicy
+from scheduler import record_run
+from metrics import RunMetrics
+from batching import ByteBudgetBatcher, FixedBatcher
+from read_profile import ReadProfile
+from schema_registry import SchemaRegistry
+from ndjson import NDJSONWriter, CODECS, plain_document
+from query_planner import QueryPlanner, ChainedCursor
+from change_stream import STREAM_PART_PREFIX
+import pyarrow as pa
+import pyarrow.parquet as pq
+import threading
+import time
 import gc
+import os
+import math
+import multiprocessing
 import psutil
 import bson
 
 
+# Tamaño máximo de un documento en MongoDB
+MAX_BSON_BYTES = 16 * MB
+
 
 class MongoETLExtractor:
-    def __init__(self, mongo_uri, bucket_name, collection, date_str, output_format="parquet"):
+    def __init__(self, mongo_uri, bucket_name, collection, date_str, output_format="parquet", client=None, s3_client=None):
         self.mongo_uri = mongo_uri
         self.bucket_name = bucket_name
         self.output_format = output_format.lower()
         self.date_str = date_str
         self.collection = collection
         self.config = self._load_config()
-
-        try:
-            self.client = pymongo.MongoClient(self.mongo_uri)
-            self.client.server_info()
-            print("✅ Connected to MongoDB.")
-        except Exception as e:
-             print("❌ MongoDB connection failed:", e)
-             raise
-             
-        self.db = self.client["EtominTransactions"]
-        self.s3 = boto3.client("s3")
-
-    def _delete_collection_data(self):
-        prefix = f"{self.collection}/"  # Borra todo lo que esté bajo este prefijo
-        print(f"🧹 Borrando todos los archivos en s3://{self.bucket_name}/{prefix} ...")
-
-        paginator = self.s3.get_paginator("list_objects_v2")
-        pages = paginator.paginate(Bucket=self.bucket_name, Prefix=prefix)
-
-        to_delete = []
-        for page in pages:
-            if "Contents" in page:
-                for obj in page["Contents"]:
-                    to_delete.append({"Key": obj["Key"]})
-
-        if to_delete:
-            # Borrado en bloques de hasta 1000 objetos (límite de AWS)
-            for i in range(0, len(to_delete), 1000):
-                chunk = to_delete[i:i+1000]
-                self.s3.delete_objects(Bucket=self.bucket_name, Delete={"Objects": chunk})
-            print(f"✅ {len(to_delete)} objetos eliminados.")
+        self.parquet_writer = self.config.get("parquet_writer", "pandas")
+        if self.parquet_writer not in ("pandas", "arrow"):
+            raise ValueError(f"❌ Invalid parquet_writer for '{collection}': {self.parquet_writer} (use 'pandas' or 'arrow')")
+        self.batch_size = int(self.config.get("batch_size", 1000))
+        # Por defecto N documentos por parte (batch_size, 1000); la sección "batching" activa batches por presupuesto de bytes
+        if "batching" in self.config and "batch_size" not in self.config:
+            self.batcher = ByteBudgetBatcher.from_config(self.config["batching"])
+        else:
+            self.batcher = FixedBatcher(self.batch_size)
+        # Sección "json": compresión de las partes NDJSON (gzip / zstd → .json.gz / .json.zst)
+        json_config = self.config.get("json", {})
+        self.json_compression = json_config.get("compression")
+        if self.json_compression not in CODECS:
+            raise ValueError(f"❌ Invalid json.compression for '{collection}': {self.json_compression} (use 'gzip' or 'zstd')")
+        self.json_level = json_config.get("level")
+        upload_config = self.config.get("upload", {})
+        self.part_size = int(upload_config.get("part_size_mb", 8) * MB)
+        self.max_in_flight = int(upload_config.get("max_in_flight", 4))
+        self.pipeline_config = self.config.get("pipeline")
+        self._arrow_lock = threading.Lock()
+        self.blacklist = CompiledBlacklist(self.config.get("blacklist", []), pushdown=self.config.get("blacklist_pushdown", True))
+        # raw_bson: el cursor entrega RawBSONDocument, el tamaño sale gratis de los bytes y el decode se hace en la etapa de transformación
+        self.raw_bson = bool(self.config.get("raw_bson", False))
+        self.max_document_bytes = int(self.config.get("max_document_mb", 16) * MB)
+        # MongoDB no guarda documentos de más de 16 MB: un documento ya decodificado solo se re-serializa para medirlo
+        # cuando el límite configurado es menor
+        self._encode_to_measure = self.max_document_bytes < MAX_BSON_BYTES
+        # Prefijo de las partes: "data" → data_partN; el scan paralelo usa data_sXX para no chocar entre slices
+        self.part_prefix = "data"
+        self._pending_snapshot = None
+        # Checkpoints por día en _manifests/ (ETL_CHECKPOINTS=0 los apaga); con ETL_RESUME=1 se salta lo ya subido
+        self.checkpoints = os.environ.get("ETL_CHECKPOINTS", "1") != "0"
+        self.resume = os.environ.get("ETL_RESUME", "0") == "1"
+        # Se reemplaza por uno nuevo en cada día / rango extraído
+        self.metrics = RunMetrics(collection, date_str)
+        # Sección "read": compresión de red, batchSize del cursor, readPreference, allowDiskUse y exhaust
+        self.read_profile = ReadProfile(self.config.get("read"))
+        # Sección "schema": columnas y tipos estables desde config/<collection>_schema.json (None = inferencia por batch)
+        self.schema = SchemaRegistry.from_config(collection, self.config)
+        # Sección "query_plan": explain antes de cada extracción con filtro y reescritura del $or si hay COLLSCAN
+        self.query_planner = QueryPlanner.from_config(self.config)
+
+        # client / s3_client: los workers del launcher reutilizan sus conexiones entre tareas; esas no se cierran aquí
+        self._owns_clients = client is None
+        if client is not None:
+            self.client = client
+        else:
+            try:
+                self.client = pymongo.MongoClient(self.mongo_uri, **self.read_profile.client_options())
+                self.client.server_info()
+                print("✅ Connected to MongoDB.")
+            except Exception as e:
+                 print("❌ MongoDB connection failed:", e)
+                 raise
+
+        self._bind_client(self.client)
+        self.s3 = s3_client or boto3.client("s3")
+
+    def _bind_client(self, client):
+        # Colección destino con el readPreference del perfil (y RawBSONDocument si raw_bson)
+        self.client = client
+        self.db = client["EtominTransactions"]
+        codec_options = CodecOptions(document_class=RawBSONDocument) if self.raw_bson else None
+        self.target = self.read_profile.collection(self.db, self.collection, codec_options)
+
+    def _delete_collection_data(self, date_str):
+        # Borra lo anterior bajo <collection>/ (salvo retention.keep_last_snapshots días) listando cada día en paralelo
+        policy = RetentionPolicy.from_config(self.config)
+        print(f"🧹 Borrando los archivos en s3://{self.bucket_name}/{self.collection}/ "
+              f"({f'conservando los últimos {policy.keep_last_snapshots} días' if policy.keep_last_snapshots else 'todo'}) ...")
+        summary = RetentionEngine(self.s3, self.bucket_name, self.collection, policy).purge_collection(writing=date_str)
+        if summary["errors"]:
+            # Partes viejas mezcladas con el snapshot nuevo darían datos duplicados
+            raise RuntimeError(f"❌ Could not delete {summary['errors']} objects of the previous {self.collection} snapshot")
+        if summary["objects"]:
+            print(f"✅ {summary['objects']} objetos eliminados.")
         else:
             print("ℹ️ No se encontraron archivos para borrar.")
 
+    def _supersede_stream_parts(self, date_str, since):
+        # Las partes stream_* de stream_runner.py comparten el prefijo day= con las de la extracción diaria: una vez
+        # completo el día, las subidas antes de que empezara esta corrida ya están en sus partes y se borran para no
+        # duplicar documentos. Las más nuevas se conservan (pueden traer cambios que el cursor ya no vio).
+        day_prefix = datetime.strptime(date_str, "%Y-%m-%d").strftime("day=%d-%m-%Y")
+        stale = []
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=f"{self.collection}/{day_prefix}/{STREAM_PART_PREFIX}"):
+            stale.extend(obj["Key"] for obj in page.get("Contents", []) if obj["LastModified"] < since)
+        for i in range(0, len(stale), 1000):
+            self.s3.delete_objects(Bucket=self.bucket_name, Delete={"Objects": [{"Key": k} for k in stale[i:i + 1000]]})
+        if stale:
+            print(f"🧹 Removed {len(stale)} stream parts of {self.collection} for {date_str} superseded by the daily extraction")
+
     def _load_config(self):
         try:
             with open(f"config/{self.collection}_config.json") as f:
@@ -80,28 +169,48 @@ class MongoETLExtractor:
 
 
 
-    def _paginated_cursor(self, collection, target_field, reference_ids, chunk_size=10000):
-        for i in range(0, len(reference_ids), chunk_size):
-            chunk = reference_ids[i:i + chunk_size]
-            #print(f"🔄 Procesando chunk {i // chunk_size + 1} con {len(chunk)} elementos")
-            for doc in self.db[collection].find({target_field: {"$in": chunk}}):
-                yield doc
-            
+    def _find(self, query):
+        # Todas las lecturas de la colección destino llevan la proyección del blacklist y el perfil de lectura
+        return self.read_profile.find(self.target, query, self.blacklist.projection)
+
+    def _planned_find(self, query):
+        if self.query_planner is None:
+            return self._find(query)
+        queries = self.query_planner.plan(self.target, query, self.collection)
+        if len(queries) == 1:
+            return self._find(queries[0])
+        # Ramas disjuntas por el $nor de cada una: se leen en secuencia sin deduplicar en memoria
+        return ChainedCursor(lambda q=q: self._find(q) for q in queries)
+
+    def _reference_join(self):
+        join_config = self.config.get("reference_join", {})
+        return ReferenceJoin(
+            self.target,
+            self.read_profile.collection(self.db, self.config["reference_from"]),
+            self.config["reference_field"],
+            target_field=self.config.get("reference_target", "_id"),
+            projection=self.blacklist.projection,
+            strategy=join_config.get("strategy", "chunked"),
+            workers=join_config.get("workers", 4),
+            chunk_size=join_config.get("chunk_size", 10000),
+            read_profile=self.read_profile,
+        )
+
     def _build_cursor_with_config(self, start_ms, end_ms):
         mode = self.config.get("mode","delta")
         if mode == "replace":
             print(f"🧹 Mode is 'replace' → extracting entire collection '{self.collection}' in chunks")
-            return self.db[self.collection].find({})
+            return self._find({})
         
     # Si es delta, procesamos los filtros como antes
-        filter_config = self.conf
+        filter_config = self.config
 
         if "filter" in filter_config:
             if any(k in filter_config for k in ["filter_from_reference", "reference_from", "reference_field"]):
                 raise ValueError(f"❌ Invalid fileter config for '{self.collection}': cannot mix 'filter' with reference-based fields")
             query = self._replace_placeholders(filter_config["filter"], start_ms, end_ms)
             print(f"This is the query :: '{query}'")
-            return self.db[self.collection].find(query)
+            return self._planned_find(query)
 
         elif "filter_from_reference" in filter_config:
             required_keys = {"reference_from", "reference_field"}
@@ -110,24 +219,18 @@ class MongoETLExtractor:
 
             ref_query = self._replace_placeholders(filter_config["filter_from_reference"], start_ms, end_ms)
             print(filter_config["reference_field"], ref_query)
-
-            # Usa aggregate en lugar de distinct para evitar errores de 16MB
-            reference_from = filter_config["reference_from"]
-            reference_field = f"${filter_config['reference_field']}"
-
-            pipeline = [
-                {"$match": ref_query},
-                {"$group": {"_id": reference_field}}
-            ]
-
-            reference_ids = [doc["_id"] for doc in self.db[reference_from].aggregate(pipeline)]
-
-            if not reference_ids:
-                print(f"⚠️ No referenced IDs found for {self.collection}, skipping...")
-                return self.db[self.collection].find({"_id": {"$exists": False, "$eq": None}})
-
-            target_field = filter_config.get("reference_target", "_id")
-            return self._paginated_cursor(self.collection, target_field, reference_ids)
+            if self.query_planner is not None:
+                # El filtro corre dentro del $match de un aggregate: solo se reporta el plan, no se reescribe
+                reference = self.read_profile.collection(self.db, filter_config["reference_from"])
+                self.query_planner.plan(reference, ref_query, f"{self.collection} → {filter_config['reference_from']}", rewrite=False)
+
+            join = self._reference_join()
+            reference_ids = None
+            # El mismo set de ids (ej. sale del día) lo piden refund y chargeback: se reutiliza del cache local
+            if join.strategy != "aggregate" and self.config.get("reference_cache", True):
+                key = ReferenceIdCache.make_key(filter_config["reference_from"], filter_config["reference_field"], ref_query, start_ms)
+                reference_ids = ReferenceIdCache().get_or_compute(key, lambda: join.iter_reference_ids(ref_query))
+            return join.cursor(ref_query, reference_ids)
         elif "filterByIds" in filter_config:
             field = filter_config["filterByIds"].get("field", "_id")
             raw_values = filter_config["filterByIds"].get("values", [])
@@ -136,53 +239,238 @@ class MongoETLExtractor:
             values = [ObjectId(v) if field == "_id" else v for v in raw_values]
 
             print(f"🔍 Filtering collection '{self.collection}' by {field} with {len(values)} values")
-            return self.db[self.collection].find({field: {"$in": values}})
+            return self._find({field: {"$in": values}})
 
         else:
             print(f"⚠️ No valid filter configuration found for '{self.collection}', returning empty cursor.")
-            return self.db[self.collection].find({"_id": {"$exists": False, "$eq": None}})
-
-    def _process_batch(self, docs, collection, target_date, blacklist, batch_index):
-        
-        sanitized_docs = [self._sanitize_document(doc, blacklist) for doc in docs]
-    
+            return self._find({"_id": {"$exists": False, "$eq": None}})
 
+    def _open_arrow_writer(self, target_date):
+        if self.parquet_writer != "arrow" or self.output_format not in ("parquet", "both"):
+            return None
         prefix = target_date.strftime("day=%d-%m-%Y")
-   
+        return ArrowParquetWriter(
+            self.s3,
+            self.bucket_name,
+            f"{self.collection}/{prefix}/{self.part_prefix}",
+            type_config=self.config.get("types", {}),
+            part_size=self.part_size,
+            max_in_flight=self.max_in_flight,
+            schema_registry=self.schema,
+        )
+
+    def _open_sink(self, key):
+        return S3MultipartSink(self.s3, self.bucket_name, key, part_size=self.part_size, max_in_flight=self.max_in_flight)
+
+    def _transform_batch(self, item, blacklist, arrow_writer=None):
+        batch_index, docs, input_bytes = item
+        last_id = str(docs[-1].get("_id")) if docs else None
+        with self.metrics.stage("sanitize"):
+            sanitized_docs = [self._sanitize_document(self._decode(doc), blacklist) for doc in docs]
+        prepared = {"batch_index": batch_index, "rows": len(sanitized_docs), "input_bytes": input_bytes, "last_id": last_id,
+                    "docs": None, "record_batch": None, "df": None, "table": None}
 
         if self.output_format in ("json", "both"):
-            content = "\n".join(json.dumps(doc, default=str) for doc in converted_docs)
-            json_key = f"{collection}/{prefix}/data_part{batch_index + 1}.json"
-            self.s3.put_object(Bucket=self.bucket_name, Key=json_key, Body=content.encode("utf-8"))
-    
-            del content
-
-        if self.output_format in ("parquet", "both"):
-            converted_docs = [self._convert_types(doc) for doc in sanitized_docs]
-            df = pd.json_normalize(converted_docs)
-
-            type_config = self.config.get("types",{})
-            for col in type_config.get("force_string", []):
-                if col in df.columns:
-                    df[col] = df[col].astype(str)
-            for col in type_config.get("force_number", []):
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors="coerce")
-
-            buffer = BytesIO()
-            df.to_parquet(buffer, index=False)
-            parquet_key = f"{collection}/{prefix}/data_part{batch_index + 1}.parquet"
-            self.s3.put_object(Bucket=self.bucket_name, Key=parquet_key, Body=buffer.getvalue())
+            # Solo el NDJSON pasa todo a tipos JSON (Decimal128 → str, binarios → base64); el Parquet conserva sus tipos
+            with self.metrics.stage("convert"):
+                prepared["docs"] = [plain_document(doc) for doc in sanitized_docs]
+
+        converted_docs = None
+        if self.output_format in ("parquet", "both") and arrow_writer is None:
+            with self.metrics.stage("convert"):
+                converted_docs = [self._convert_types(doc) for doc in sanitized_docs]
+
+        if self.output_format in ("parquet", "both") and arrow_writer is not None:
+            # El writer de Arrow hace la misma conversión que _convert_types mientras arma las columnas
+            with self.metrics.stage("normalize"):
+                prepared["record_batch"] = arrow_writer.to_record_batch(sanitized_docs)
+
+        elif self.output_format in ("parquet", "both") and self.schema is not None:
+            # Mismos valores que el camino de pandas (ObjectId y fechas como texto) pero con las columnas y tipos del registro
+            with self.metrics.stage("normalize"):
+                rows = [flatten_document(doc) for doc in converted_docs]
+                prepared["table"] = pa.Table.from_batches([self.schema.record_batch(rows, f"{self.date_str}/batch {batch_index + 1}")])
+            del rows
+
+        elif self.output_format in ("parquet", "both"):
+            with self.metrics.stage("normalize"):
+                df = pd.json_normalize(converted_docs)
+
+                type_config = self.config.get("types",{})
+                for col in type_config.get("force_string", []):
+                    if col in df.columns:
+                        df[col] = df[col].astype(str)
+                for col in type_config.get("force_number", []):
+                    if col in df.columns:
+                        df[col] = pd.to_numeric(df[col], errors="coerce")
+            prepared["df"] = df
+            del converted_docs
+
+        return prepared
+
+    def _write_part(self, key, rows, write):
+        # write(sink) serializa hacia el multipart; lo que tarda el complete() al cerrar cuenta como subida
+        sink = self._open_sink(key)
+        with sink:
+            started = time.perf_counter()
+            write(sink)
+            serialized = time.perf_counter()
+        self.metrics.add("serialize", serialized - started)
+        self.metrics.add("upload", time.perf_counter() - serialized, sink.bytes_written)
+        self.metrics.part(key, rows, sink.bytes_written)
+        return sink.bytes_written
+
+    def _write_json_lines(self, docs, sink):
+        # docs ya convertidos (plain_document): se codifican sin default=str y se entregan al multipart por pedazos
+        NDJSONWriter(sink, self.json_compression, self.json_level).write_all(docs).close()
+
+    def _upload_batch(self, prepared, collection, target_date, arrow_writer=None, manifest=None):
+        prefix = target_date.strftime("day=%d-%m-%Y")
+        batch_index = prepared["batch_index"]
+        rows = prepared["rows"]
+        keys, size, largest, parquet_schema = [], 0, 0, None
+
+        if prepared["docs"] is not None:
+            json_key = f"{collection}/{prefix}/{self.part_prefix}_part{batch_index + 1}.json{CODECS[self.json_compression]}"
+            written = self._write_part(json_key, rows, lambda sink: self._write_json_lines(prepared["docs"], sink))
+            keys.append(json_key)
+            size += written
+            largest = max(largest, written)
+
+        if prepared["record_batch"] is not None:
+            # Un solo Parquet por día: cada batch es un row group
+            with self._arrow_lock, self.metrics.stage("serialize"):
+                before = arrow_writer.bytes_written
+                arrow_writer.write_batch(prepared["record_batch"])
+                largest = max(largest, arrow_writer.bytes_written - before)
+
+        if prepared["df"] is not None:
+            parquet_key = f"{collection}/{prefix}/{self.part_prefix}_part{batch_index + 1}.parquet"
+            written = self._write_part(parquet_key, rows, lambda sink: prepared["df"].to_parquet(sink, index=False))
+            parquet_schema = pa.Schema.from_pandas(prepared["df"], preserve_index=False)
+            keys.append(parquet_key)
+            size += written
+            largest = max(largest, written)
+
+        if prepared["table"] is not None:
+            parquet_key = f"{collection}/{prefix}/{self.part_prefix}_part{batch_index + 1}.parquet"
+            written = self._write_part(parquet_key, rows, lambda sink: pq.write_table(prepared["table"], sink))
+            parquet_schema = prepared["table"].schema
+            keys.append(parquet_key)
+            size += written
+            largest = max(largest, written)
+
+        # Razón real salida/entrada de esta parte: ajusta el tamaño de los próximos batches
+        self.batcher.observe(prepared["input_bytes"], largest)
+
+        if manifest is not None and keys:
+            # La parte queda confirmada solo cuando todos sus archivos están completos en S3
+            manifest.record_part(keys, rows, size, batch_index=batch_index, last_id=prepared["last_id"],
+                                 schema_hash=schema_hash(parquet_schema) if parquet_schema is not None else None)
+
+        return rows
+
+    def _process_batch(self, docs, collection, target_date, blacklist, batch_index, arrow_writer=None, manifest=None, input_bytes=0):
+        prepared = self._transform_batch((batch_index, docs, input_bytes), blacklist, arrow_writer)
+        self._upload_batch(prepared, collection, target_date, arrow_writer, manifest)
+
+        del prepared
+        del docs
+        gc.collect()
 
-            buffer.close()
-            del buffer
+    def _decode(self, doc):
+        if isinstance(doc, RawBSONDocument):
+            return bson.decode(doc.raw, codec_options=self.db.codec_options)
+        return doc
 
-            del df
+    def _iter_documents(self, cursor, date_str, stats):
+        # Un error del cursor (red, CursorNotFound, un chunk del join paralelo) corta el día: si se siguiera,
+        # el día terminaría incompleto con el manifest en "complete" y --resume nunca lo volvería a extraer
+        while True:
+            try:
+                doc = next(cursor)
+            except StopIteration:
+                break
+
+            # Con raw_bson el tamaño sale de los bytes; sin raw_bson hay que re-serializar el documento
+            if isinstance(doc, RawBSONDocument):
+                size = len(doc.raw)
+            else:
+                size = len(bson.encode(doc)) if self._encode_to_measure else 0
+            if size > self.max_document_bytes:
+                doc_id = doc.get("_id")
+                print(f"🚨 Documento muy grande en {self.collection} para {date_str} ({size / MB:.2f} MB), saltando: {doc_id}")
+                stats["oversized"].append(doc_id)
+                continue
+
+            yield doc
+
+    def _iter_batches(self, cursor, date_str, stats, resume=None):
+        batch = []
+        batch_index = 0  # 🆕 contador para el nombre del archivo
+        documents = self._iter_documents(cursor, date_str, stats)
+        if resume is not None:
+            batch_index = self._skip_committed(documents, resume)
+            stats["docs"] += resume[1]
+        # fetch: tiempo dentro del cursor hasta completar cada batch (sin contar lo que tarda el consumidor)
+        batcher = self.batcher
+        batch_bytes = 0
+        started = time.perf_counter()
+        for doc in documents:
+            batch.append(doc)
+            batch_bytes += batcher.doc_size(doc)
+            if batcher.is_full(len(batch), batch_bytes):
+                stats["docs"] += len(batch)
+                self.metrics.add("fetch", time.perf_counter() - started, batch_bytes)
+                yield batch_index, batch, batch_bytes
+                started = time.perf_counter()
+                batch = []
+                batch_bytes = 0
+                batch_index += 1
+
+        if batch:
+            stats["docs"] += len(batch)
+            self.metrics.add("fetch", time.perf_counter() - started, batch_bytes)
+            yield batch_index, batch, batch_bytes
+
+    def _skip_committed(self, documents, resume):
+        # Se vuelven a leer (sin transformar ni subir) los documentos de las partes ya confirmadas;
+        # el _id del último tiene que coincidir con el del manifest o el orden del cursor cambió
+        next_index, rows, last_id = resume
+        skipped, doc = 0, None
+        while skipped < rows:
+            doc = next(documents, None)
+            if doc is None:
+                break
+            skipped += 1
+        if skipped < rows or str(doc.get("_id")) != last_id:
+            raise ResumeMismatch(f"cursor for {self.collection} does not match the manifest after {skipped} documents")
+        print(f"⏩ Resuming {self.collection} at part {next_index + 1}: {rows} documents already uploaded")
+        return next_index
+
+    def _run_batches(self, cursor, target_date, date_str, blacklist, arrow_writer=None, manifest=None, resume=None):
+        stats = {"docs": 0, "oversized": []}
+        batches = self._iter_batches(cursor, date_str, stats, resume)
+
+        if not self.pipeline_config:
+            for batch_index, batch, batch_bytes in batches:
+                self._process_batch(batch, self.collection, target_date, blacklist, batch_index, arrow_writer, manifest, batch_bytes)
+        else:
+            pipeline = StagedPipeline(
+                transform_workers=self.pipeline_config.get("transform_workers", 1),
+                upload_workers=self.pipeline_config.get("upload_workers", 2),
+                queue_size=self.pipeline_config.get("queue_size", 4),
+            )
+            print(f"🔀 Pipeline: {pipeline.transform_workers} transform / {pipeline.upload_workers} upload workers, queue {pipeline.queue_size}")
+            pipeline.run(
+                batches,
+                lambda item: self._transform_batch(item, blacklist, arrow_writer),
+                lambda prepared: self._upload_batch(prepared, self.collection, target_date, arrow_writer, manifest),
+            )
 
-        del sanitized_docs
-        del converted_docs
-        del docs
-        gc.collect()
+        if stats["oversized"]:
+            print(f"🚨 {len(stats['oversized'])} documentos saltados por tamaño en {self.collection} para {date_str}: {stats['oversized'][:20]}")
+        return stats["docs"]
 
 
 
@@ -212,124 +500,505 @@ class MongoETLExtractor:
             return set()
 
     def _sanitize_document(self,doc, blacklist):
-        for field in blacklist:
-            keys = field.split(".")
-            d = doc
-            for k in keys[:-1]:
-                d = d.get(k, {})
-                if not isinstance(d, dict):
-                    d = {}
-                    break  # termina la cadena si ya no es un dict
-            if isinstance(d, dict):
-                d.pop(keys[-1], None)
-        return doc
+        # blacklist es el CompiledBlacklist: solo quedan los campos que no se pudieron proyectar en Mongo
+        return blacklist.strip(doc)
     
-    def extract_and_upload(self, date_str=None):
-        from time import time
+    def _day_window(self, date_str):
+        target_date = datetime.strptime(date_str, "%Y-%m-%d")
+        next_day = target_date + timedelta(days=1)
+        start_ms = int(target_date.replace(tzinfo=timezone.utc).timestamp() * 1000)
+        end_ms = int(next_day.replace(tzinfo=timezone.utc).timestamp() * 1000)
+        return target_date, start_ms, end_ms
+
+    def _extract_day(self, date_str):
+        start = time.time()
+        started_at = datetime.now(timezone.utc)
+        target_date, start_ms, end_ms = self._day_window(date_str)
+        manifest = self._open_manifest(date_str)
+        if manifest is not None and self.resume and manifest.is_complete(self._run_fingerprint(start_ms, end_ms)):
+            print(f"⏭️ {self.collection} for {date_str} already complete ({manifest.data['doc_count']} documents), skipping")
+            return manifest.data["doc_count"]
+        if self.config.get("mode", "delta") == "replace":
+            if self._snapshot_unchanged():
+                print(f"⏱️ Elapsed time: {round(time.time() - start, 2)} seconds for {self.collection} (unchanged)")
+                record_run(self.collection, date_str, start, 0)
+                return 0
+            self._delete_collection_data(date_str)
+        print(f"📦 Processing collection: {self.collection} for {date_str}")
+        print(f"⏱ Timestamp range: {start_ms} to {end_ms}")
+
+        self.metrics = RunMetrics(self.collection, date_str).start()
+        try:
+            workers = self._scan_workers(start_ms, end_ms)
+            if workers > 1:
+                doc_count = self._parallel_scan(date_str, start_ms, end_ms, workers, manifest)
+            else:
+                doc_count = self._extract_window(date_str, start_ms, end_ms, manifest)
+        except Exception:
+            self.metrics.finish(0, status="failed")
+            raise
+        finally:
+            self._save_schema()
+        self.metrics.finish(doc_count)
+        self._supersede_stream_parts(date_str, started_at)
+
+        print(f"📄 Processed {doc_count} documents in '{self.collection}' for {date_str}")
+        if self._pending_snapshot is not None:
+            # El índice solo se guarda después de exportar completo, así un fallo vuelve a exportar en la próxima corrida
+            self._pending_snapshot.save(self.s3, self.bucket_name, self.collection)
+            self._pending_snapshot = None
+        print(f"⏱️ Elapsed time: {round(time.time() - start, 2)} seconds for {self.collection}/{target_date.strftime('day=%d-%m-%Y')}")
+        # Duración, documentos y pico de RSS para que el scheduler del launcher estime las próximas corridas
+        record_run(self.collection, date_str, start, doc_count, self.metrics.peak_rss_mb)
+        return doc_count
+
+    def _snapshot_unchanged(self):
+        # change_detection: se hashea la colección (bytes BSON ya proyectados, sin decodificar) y se compara
+        # con el índice de la corrida anterior; si nada cambió no se borra ni se reescribe nada en S3.
+        detection = self.config.get("change_detection")
+        if not detection:
+            return False
+        detection = detection if isinstance(detection, dict) else {}
+
+        fingerprint = SnapshotIndex.fingerprint(self.config, self.output_format)
+        raw = self.read_profile.collection(self.db, self.collection, CodecOptions(document_class=RawBSONDocument))
+        current = SnapshotIndex.build(self.read_profile.find(raw, {}, self.blacklist.projection), fingerprint)
+        previous = SnapshotIndex.load(self.s3, self.bucket_name, self.collection)
+        self._pending_snapshot = current
+
+        if previous is None:
+            print(f"🆕 No previous snapshot for '{self.collection}', full export")
+            return False
+        if previous.config_fingerprint != fingerprint:
+            print(f"⚙️ Config changed for '{self.collection}' since last snapshot, full export")
+            return False
+        full_every = detection.get("full_every_days", 7) * 86400
+        if datetime.now(timezone.utc).timestamp() - previous.full_at > full_every:
+            print(f"🗓️ Last full snapshot of '{self.collection}' is older than {detection.get('full_every_days', 7)} days, full export")
+            return False
+
+        added, changed, removed = current.diff(previous)
+        if added or changed or removed:
+            print(f"🔁 '{self.collection}' changed: {added} new, {changed} modified, {removed} removed → full export")
+            return False
+
+        existing = self.s3.list_objects_v2(Bucket=self.bucket_name, Prefix=f"{self.collection}/", MaxKeys=1)
+        if not existing.get("KeyCount"):
+            print(f"⚠️ Snapshot index exists but s3://{self.bucket_name}/{self.collection}/ is empty, full export")
+            return False
+
+        print(f"✅ '{self.collection}' unchanged ({current.count} documents), skipping export")
+        self._pending_snapshot = None
+        return True
+
+    def _save_schema(self):
+        # Lo aprendido se guarda aunque la corrida falle: las partes ya subidas se escribieron con esos tipos
+        if self.schema is not None:
+            self.schema.save()
+
+    def _open_manifest(self, date_str, name="manifest"):
+        if not self.checkpoints:
+            return None
+        return DayManifest(self.s3, self.bucket_name, self.collection, date_str, name).load()
+
+    def _run_fingerprint(self, start_ms, end_ms):
+        # Un manifest solo vale para la misma config, formato y ventana de tiempo
+        return SnapshotIndex.fingerprint(self.config, self.output_format, self.parquet_writer, self.batch_size, start_ms, end_ms)
+
+    def _resume_point(self, manifest, fingerprint):
+        if not (self.resume and manifest.is_resumable(fingerprint)):
+            return None
+        # Solo se retoma a mitad de día si cada batch es su propio archivo y el orden del cursor es reproducible
+        if self.config.get("mode", "delta") == "replace":
+            print(f"ℹ️ '{self.collection}' is in replace mode, restarting from the first part")
+            return None
+        if self.parquet_writer == "arrow" and self.output_format in ("parquet", "both"):
+            print(f"ℹ️ parquet_writer 'arrow' writes one file per day for '{self.collection}', restarting the day")
+            return None
+        if "filter_from_reference" in self.config and self.config.get("reference_join", {}).get("strategy", "chunked") == "parallel":
+            print(f"ℹ️ reference_join 'parallel' has no stable order for '{self.collection}', restarting the day")
+            return None
+        resume = manifest.resume_point()
+        return resume if resume[0] > 0 else None
+
+    def _extract_window(self, date_str, start_ms, end_ms, manifest=None):
+        target_date = datetime.strptime(date_str, "%Y-%m-%d")
+        print(f"🛡️ Blacklist: {self.blacklist.describe()}")
+        print(f"📏 Batching: {self.batcher.describe()}")
+        if manifest is None:
+            return self._extract_cursor(target_date, date_str, start_ms, end_ms)
+
+        fingerprint = self._run_fingerprint(start_ms, end_ms)
+        previous_keys = self._previous_keys(manifest)
+        resume = self._resume_point(manifest, fingerprint)
+        if resume is not None:
+            manifest.keep_batches_before(resume[0])
+        manifest.start(fingerprint, keep_parts=resume is not None)
+        try:
+            doc_count = self._extract_cursor(target_date, date_str, start_ms, end_ms, manifest, resume)
+        except ResumeMismatch as e:
+            print(f"⚠️ {e}, restarting {date_str} from the first part")
+            manifest.start(fingerprint)
+            doc_count = self._extract_cursor(target_date, date_str, start_ms, end_ms, manifest)
+
+        self._delete_stale_parts(previous_keys, manifest)
+        manifest.complete(doc_count)
+        return doc_count
+
+    def _previous_keys(self, manifest):
+        # Partes que dejó la corrida anterior. Para el manifest del día también las de sus slices: una corrida
+        # paralela cortada (o con otra cantidad de workers) solo las tiene en data_sXX.json
+        keys = set(manifest.part_keys())
+        if manifest.name == "manifest":
+            for slice_manifest in manifest.slices():
+                keys.update(slice_manifest.part_keys())
+        return keys
+
+    def _delete_stale_parts(self, previous_keys, manifest, slices=0):
+        # Partes de una corrida anterior que esta ya no escribió (ej. el día quedó con menos documentos, o cambió
+        # entre scan simple y paralelo); los manifests de slices que esta corrida no usó también sobran
+        stale = sorted(previous_keys - set(manifest.part_keys()))
+        for i in range(0, len(stale), 1000):
+            self.s3.delete_objects(Bucket=self.bucket_name, Delete={"Objects": [{"Key": k} for k in stale[i:i + 1000]]})
+        if stale:
+            print(f"🧹 Removed {len(stale)} stale parts from a previous run")
+        if manifest.name == "manifest":
+            for slice_manifest in manifest.slices()[slices:]:
+                slice_manifest.delete()
+
+    def _extract_cursor(self, target_date, date_str, start_ms, end_ms, manifest=None, resume=None):
+        cursor = self._build_cursor_with_config(start_ms,end_ms)
+        arrow_writer = self._open_arrow_writer(target_date)
         try:
-            start = time()
-            date_str = date_str or self.date_str
-            target_date = datetime.strptime(date_str, "%Y-%m-%d")
-            next_day = target_date + timedelta(days=1)
-            start_ms = int(target_date.replace(tzinfo=timezone.utc).timestamp() * 1000)
-            end_ms = int(next_day.replace(tzinfo=timezone.utc).timestamp() * 1000)
-            if self.config.get("mode", "delta") == "replace":
-                self._delete_collection_data()
-            print(f"📦 Processing collection: {self.collection} for {date_str}")
-            print(f"⏱ Timestamp range: {start_ms} to {end_ms}")
-            blacklist = self.config.get("blacklist", [])
-
-            cursor = self._build_cursor_with_config(start_ms,end_ms)
-            batch = []
-            batch_size = 1000
-            doc_count = 0
-
-
-            batch_index = 0  # 🆕 contador para el nombre del archivo
+            doc_count = self._run_batches(cursor, target_date, date_str, self.blacklist, arrow_writer, manifest, resume)
+
+            if arrow_writer is not None:
+                arrow_writer.close()
+                if manifest is not None:
+                    for f in arrow_writer.files:
+                        manifest.record_part([f["key"]], f["rows"], f["bytes"], schema_hash=f["schema_hash"])
+        except Exception:
+            if arrow_writer is not None:
+                arrow_writer.abort()
+            raise
+        finally:
+            cursor.close()
+
+        del cursor
+        return doc_count
+
+    def _scan_workers(self, start_ms, end_ms):
+        scan_config = self.config.get("parallel_scan")
+        if not scan_config or self.config.get("mode", "delta") == "replace":
+            return 1
+        if not any(k in self.config for k in ("filter", "filter_from_reference")):
+            return 1
+
+        max_workers = int(scan_config.get("max_workers", os.cpu_count() or 1))
+        workers = scan_config.get("workers", "auto")
+        if workers != "auto":
+            return max(1, min(int(workers), max_workers))
+
+        # Conteo barato con límite de tiempo; si no alcanza, el día es pesado y se usan todos los workers
+        docs_per_worker = int(scan_config.get("docs_per_worker", 250000))
+        if "filter" in self.config:
+            counted, query = self.target, self._replace_placeholders(self.config["filter"], start_ms, end_ms)
+        else:
+            counted = self.read_profile.collection(self.db, self.config["reference_from"])
+            query = self._replace_placeholders(self.config["filter_from_reference"], start_ms, end_ms)
+        try:
+            count = counted.count_documents(query, maxTimeMS=int(scan_config.get("count_max_time_ms", 5000)))
+        except ExecutionTimeout:
+            print(f"⏱️ Count timed out for {counted.name}, using {max_workers} scan workers")
+            return max_workers
+        workers = max(1, min(max_workers, math.ceil(count / docs_per_worker)))
+        print(f"🔢 ~{count} documents in {counted.name} for the window → {workers} scan workers")
+        return workers
+
+    def _parallel_scan(self, date_str, start_ms, end_ms, workers, manifest=None):
+        # El día se parte en N rebanadas de tiempo; cada proceso lee la suya con su propia conexión
+        step = math.ceil((end_ms - start_ms) / workers)
+        slices = []
+        for i in range(workers):
+            slice_start = start_ms + i * step
+            slice_end = min(start_ms + (i + 1) * step, end_ms)
+            if slice_start < slice_end:
+                slices.append((self.mongo_uri, self.bucket_name, self.collection, date_str, self.output_format, i, slice_start, slice_end))
+
+        print(f"🧵 Parallel scan of {self.collection} for {date_str} with {len(slices)} workers")
+        ctx = multiprocessing.get_context("spawn")  # MongoClient no es fork-safe
+        if manifest is not None:
+            previous_keys = self._previous_keys(manifest)
+            manifest.start(self._run_fingerprint(start_ms, end_ms))
+        with ctx.Pool(processes=len(slices)) as pool:
+            results = pool.starmap(_scan_slice, slices)
+
+        doc_count = sum(count for count, _ in results)
+        if manifest is not None:
+            # Cada slice lleva su propio manifest (data_sXX.json); el del día se completa cuando terminan todos
+            manifest.data["parts"] = [part for _, parts in results for part in parts]
+            self._delete_stale_parts(previous_keys, manifest, slices=len(slices))
+            manifest.complete(doc_count, slices=len(slices))
+        return doc_count
+
+    def _partition_day(self, doc, fields):
+        # Día (UTC) del primer campo de partición presente; True si es el primer campo (el del orden principal)
+        for i, field in enumerate(fields):
+            value = doc.get(field)
+            if value is None:
+                continue
+            try:
+                if isinstance(value, datetime):
+                    moment = value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+                else:
+                    moment = datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+            except (TypeError, ValueError, OverflowError):
+                return None, False
+            return moment.strftime("%Y-%m-%d"), i == 0
+        return None, False
+
+    def _extract_range_single_pass(self, days):
+        start = time.time()
+        started_at = datetime.now(timezone.utc)
+        _, start_ms, _ = self._day_window(days[0])
+        _, _, end_ms = self._day_window(days[-1])
+        range_config = self.config.get("range", {})
+        fields = range_config.get("partition_fields", ["updatedAt", "createdAt"])
+        sort = range_config.get("sort", True)
+
+        print(f"📦 Processing collection: {self.collection} from {days[0]} to {days[-1]} in a single pass")
+        print(f"⏱ Timestamp range: {start_ms} to {end_ms}")
+        print(f"🛡️ Blacklist: {self.blacklist.describe()}")
+        print(f"📏 Batching: {self.batcher.describe()}")
+
+        query = self._replace_placeholders(self.config["filter"], start_ms, end_ms)
+        print(f"This is the query :: '{query}'")
+        if not sort:
+            cursor = self._planned_find(query)
+        else:
+            if self.query_planner is not None:
+                # Con orden el cursor tiene que ser uno solo: se reporta el plan pero no se parte el $or
+                self.query_planner.plan(self.target, query, self.collection, rewrite=False)
+            cursor = self._find(query)
+        if sort:
+            # Orden por los campos de partición: cuando el primero avanza de día, los días anteriores ya no reciben documentos
+            cursor = cursor.sort([(f, 1) for f in fields]).allow_disk_use(True)
+
+        valid_days = set(days)
+        partitions = {}
+        watermark = None
+        stats = {"docs": 0, "oversized": [], "outside": 0}
+        self.metrics = RunMetrics(self.collection, f"{days[0]}..{days[-1]}").start()
+        try:
+            documents = self._iter_documents(cursor, days[0], stats)
+            fetch_seconds = 0.0
             while True:
-                try:
-                    doc = next(cursor)
-                except StopIteration:
+                fetch_started = time.perf_counter()
+                doc = next(documents, None)
+                fetch_seconds += time.perf_counter() - fetch_started
+                if doc is None:
                     break
-                except Exception as e:
-                    print("❌ Error al obtener documento del cursor:", e)
+                day, primary = self._partition_day(doc, fields)
+                if day not in valid_days:
+                    stats["outside"] += 1
                     continue
-
-                try:
-                    size = len(bson.BSON.encode(doc))
-                    if size > 16 * 1024 * 1024:
-                        print(f"🚨 Documento muy grande en {self.collection} para {date_str}, saltando: {doc.get('_id')}")
-                        continue
-                except Exception as e:
-                    print("❌ Error al revisar tamaño del documento:", e)
-                    continue
-
-                batch.append(doc)
-                if len(batch) >= batch_size:
-                    self._process_batch(batch, self.collection, target_date, blacklist, batch_index)
-                    doc_count += len(batch)
-                    batch.clear()
-                    batch_index += 1
-            
-            if batch:
-                self._process_batch(batch, self.collection, target_date, blacklist, batch_index)
-                doc_count += len(batch)
-
-            print(f"📄 Processed {doc_count} documents in '{self.collection}' for {date_str}")
+                if sort and primary and day != watermark:
+                    watermark = day
+                    for open_day, partition in partitions.items():
+                        if open_day < day and not partition.closed:
+                            partition.close()
+                partition = partitions.get(day)
+                if partition is None:
+                    partition = partitions[day] = _DayPartition(self, day)
+                partition.add(doc)
+                stats["docs"] += 1
+
+            # Los días sin documentos también se cierran: su manifest queda completo con 0 y se borra lo de la corrida anterior
+            for day in days:
+                if day not in partitions:
+                    partitions[day] = _DayPartition(self, day)
+            for partition in partitions.values():
+                if not partition.closed:
+                    partition.close()
+            self.metrics.add("fetch", fetch_seconds)
+        except Exception:
+            for partition in partitions.values():
+                partition.abort()
+            self.metrics.finish(stats["docs"], status="failed")
+            raise
+        finally:
             cursor.close()
-            del cursor
-
-            def log_large_objects(min_size_mb=0.1):
-                print("🔍 Buscando objetos grandes en memoria...")
-                count = 0
-                for obj in gc.get_objects():
-                    try:
-                        size_mb = sys.getsizeof(obj) / (1024 ** 2)
-                        if size_mb > min_size_mb:
-                            print(f"🧱 Tipo: {type(obj)}, Tamaño: {size_mb:.2f} MB")
-                            count += 1
-                            if count >= 10:  # límite para evitar spam
-                                break
-                    except Exception:
-                        pass
-            import gc
-            import sys
-
-            def debug_large_objects(threshold_mb=5):
-                print("🔍 Escaneando objetos grandes en memoria:")
-                for obj in gc.get_objects():
-                    try:
-                        size = sys.getsizeof(obj)
-                        if size > threshold_mb * 1024 * 1024:
-                            print(f"🧱 Tipo: {type(obj)} — Tamaño: {size / (1024**2):.2f} MB")
-                    except Exception:
-                        pass
-
-            print(f"⏱️ Elapsed time: {round(time() - start, 2)} seconds for {self.collection}/{target_date.strftime('day=%d-%m-%Y')}")
-            log_large_objects(min_size_mb=1)
-            mem = psutil.virtual_memory()
-        
-            print(f"⏱️ Mem usage before cleanup: {mem.percent}% ({mem.used / (1024**2):.2f} MB)")
-
-            process = psutil.Process()
-            mem_info = process.memory_info()
-            print(f"🧠 RSS: {mem_info.rss / (1024 ** 2):.2f} MB, VMS: {mem_info.vms / (1024 ** 2):.2f} MB)")
+            self._save_schema()
+        self.metrics.finish(stats["docs"])
+        for day in days:
+            partition = partitions[day]
+            if partition.skipped:
+                continue
+            self._supersede_stream_parts(day, started_at)
+            # Una corrida por día, con lo que tardó su partición, igual que las corridas por día
+            record_run(self.collection, day, time.time() - (partition.closed_at - partition.opened_at),
+                       partition.doc_count, self.metrics.peak_rss_mb)
+
+        if stats["outside"]:
+            print(f"⚠️ {stats['outside']} documentos sin día de partición dentro del rango, omitidos")
+        if stats["oversized"]:
+            print(f"🚨 {len(stats['oversized'])} documentos saltados por tamaño en {self.collection}: {stats['oversized'][:20]}")
+        print(f"📄 Processed {stats['docs']} documents in '{self.collection}' for {len(days)} days")
+        print(f"⏱️ Elapsed time: {round(time.time() - start, 2)} seconds for {self.collection} {days[0]} → {days[-1]}")
+        return stats["docs"]
+
+    def _report_memory(self):
+        # Lecturas baratas de psutil; el detalle por etapa y el RSS muestreado quedan en ETL_METRICS_FILE
+        mem = psutil.virtual_memory()
+        print(f"⏱️ Mem usage before cleanup: {mem.percent}% ({mem.used / (1024**2):.2f} MB)")
+
+        process = psutil.Process()
+        mem_info = process.memory_info()
+        print(f"🧠 RSS: {mem_info.rss / (1024 ** 2):.2f} MB, VMS: {mem_info.vms / (1024 ** 2):.2f} MB)")
+
+    def _cleanup(self):
+        if hasattr(self, "client") and self._owns_clients:
             self.client.close()
+        if hasattr(self, "s3"):
             del self.s3
-            gc.collect()
-            debug_large_objects()
-            mem = psutil.virtual_memory()
-            print(f"🧠 Mem usage after cleanup: {mem.percent}% ({mem.used / (1024**2):.2f} MB)")
-            log_large_objects(min_size_mb=0.1)
+        gc.collect()
+        mem = psutil.virtual_memory()
+        print(f"🧠 Mem usage after cleanup: {mem.percent}% ({mem.used / (1024**2):.2f} MB)")
+
+    def extract_and_upload(self, date_str=None):
+        try:
+            self._extract_day(date_str or self.date_str)
+            self._report_memory()
         finally: 
-            if hasattr(self, "client"):
-                self.client.close()
-            if hasattr(self, "s3"):
-                del self.s3
-            gc.collect()
-            debug_large_objects()
-            mem = psutil.virtual_memory()
-            print(f"🧠 Mem usage after cleanup: {mem.percent}% ({mem.used / (1024**2):.2f} MB)")
-            log_large_objects(min_size_mb=0.1)
-        
+            self._cleanup()
+
+    def extract_range(self, start_date_str, end_date_str):
+        # Rango [start, end] con el mismo layout en S3 que las corridas por día, en un solo proceso y conexión
+        try:
+            start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
+            end_date = datetime.strptime(end_date_str, "%Y-%m-%d")
+            days = []
+            current = start_date
+            while current <= end_date:
+                days.append(current.strftime("%Y-%m-%d"))
+                current += timedelta(days=1)
+            if not days:
+                raise ValueError(f"❌ Empty range: {start_date_str} → {end_date_str}")
+
+            mode = self.config.get("mode", "delta")
+            if mode == "replace":
+                # Cada día borra y reemplaza la colección completa: solo el último día deja algo en S3
+                print(f"🧹 Mode is 'replace' → extracting '{self.collection}' once for {days[-1]}")
+                self._extract_day(days[-1])
+            elif "filter" in self.config:
+                self._extract_range_single_pass(days)
+            else:
+                # filter_from_reference: el día lo define la colección de referencia, se recorre día por día
+                for day in days:
+                    self._extract_day(day)
+            self._report_memory()
+        finally:
+            self._cleanup()
+
+
+def _scan_slice(mongo_uri, bucket_name, collection, date_str, output_format, slice_index, start_ms, end_ms):
+    extractor = MongoETLExtractor(mongo_uri, bucket_name, collection, date_str, output_format)
+    extractor.part_prefix = f"data_s{slice_index + 1:02d}"
+    extractor.metrics = RunMetrics(collection, f"{date_str}/{extractor.part_prefix}").start()
+    try:
+        print(f"🔹 Slice {slice_index + 1} of {collection}/{date_str}: {start_ms} → {end_ms}")
+        manifest = extractor._open_manifest(date_str, extractor.part_prefix)
+        try:
+            count = extractor._extract_window(date_str, start_ms, end_ms, manifest)
+        except Exception:
+            extractor.metrics.finish(0, status="failed")
+            raise
+        finally:
+            extractor._save_schema()
+        extractor.metrics.finish(count)
+        return count, manifest.data["parts"] if manifest is not None else []
+    finally:
+        extractor.client.close()
+
+
+class _DayPartition:
+    # Batches y writer de un día dentro de una extracción por rango
+    def __init__(self, extractor, date_str):
+        self.extractor = extractor
+        self.date_str = date_str
+        self.target_date = datetime.strptime(date_str, "%Y-%m-%d")
+        self.batch = []
+        self.batch_bytes = 0
+        self.batch_index = 0
+        self.doc_count = 0
+        self.closed = False
+        self.skipped = False
+        self.arrow_writer = None
+        self.previous_keys = set()
+        self.opened_at = self.closed_at = time.time()
+        _, start_ms, end_ms = extractor._day_window(date_str)
+        self.fingerprint = extractor._run_fingerprint(start_ms, end_ms)
+        self.manifest = extractor._open_manifest(date_str)
+        if self.manifest is not None:
+            if extractor.resume and self.manifest.is_complete(self.fingerprint):
+                # Día ya completo en una corrida anterior: sus documentos se leen pero no se escriben
+                print(f"⏭️ {extractor.collection} for {date_str} already complete, skipping its documents")
+                self.skipped = True
+                return
+            self.previous_keys = extractor._previous_keys(self.manifest)
+            self.manifest.start(self.fingerprint)
+        self.arrow_writer = extractor._open_arrow_writer(self.target_date)
+
+    def add(self, doc):
+        if self.skipped:
+            return
+        if self.closed:
+            self._reopen()
+        self.batch.append(doc)
+        self.batch_bytes += self.extractor.batcher.doc_size(doc)
+        if self.extractor.batcher.is_full(len(self.batch), self.batch_bytes):
+            self.flush()
+
+    def flush(self):
+        if not self.batch:
+            return
+        ex = self.extractor
+        ex._process_batch(self.batch, ex.collection, self.target_date, ex.blacklist, self.batch_index, self.arrow_writer, self.manifest, self.batch_bytes)
+        self.doc_count += len(self.batch)
+        self.batch = []
+        self.batch_bytes = 0
+        self.batch_index += 1
+
+    def close(self):
+        self.closed = True
+        if self.skipped:
+            return
+        self.flush()
+        if self.arrow_writer is not None:
+            self.arrow_writer.close()
+            if self.manifest is not None:
+                for f in self.arrow_writer.files:
+                    self.manifest.record_part([f["key"]], f["rows"], f["bytes"], schema_hash=f["schema_hash"])
+                self.arrow_writer.files = []
+        if self.manifest is not None:
+            self.extractor._delete_stale_parts(self.previous_keys, self.manifest)
+            self.previous_keys = set()
+            self.manifest.complete(self.doc_count)
+        self.closed_at = time.time()
+        print(f"📄 Processed {self.doc_count} documents in '{self.extractor.collection}' for {self.date_str}")
+
+    def abort(self):
+        if self.arrow_writer is not None:
+            self.arrow_writer.abort()
+
+    def _reopen(self):
+        # Solo pasa si el orden no es monotónico (ej. tipos mezclados en el campo de partición)
+        print(f"⚠️ Documento para {self.date_str} después de cerrar el día, se escribe en una parte nueva")
+        previous = self.arrow_writer
+        self.arrow_writer = self.extractor._open_arrow_writer(self.target_date)
+        if previous is not None and self.arrow_writer is not None:
+            self.arrow_writer.file_index = previous.file_index
+        if self.manifest is not None:
+            self.manifest.start(self.fingerprint, keep_parts=True)
+        self.closed = False
 
@@ -0,0 +1,127 @@
+import base64
+import json
+import zlib
+from datetime import datetime
+
+from bson import ObjectId
+from bson.binary import Binary
+from bson.decimal128 import Decimal128
+
+from s3_sink import MB
+
+
+CODECS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+_NATIVE = (str, int, float, bool, type(None))
+# Un encoder reutilizado, sin default=: todo llega ya convertido a tipos JSON
+_ENCODER = json.JSONEncoder(check_circular=False)
+
+
+def _convert_other(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal128):
+        return str(value)
+    if isinstance(value, (Binary, bytes)):
+        return base64.b64encode(bytes(value)).decode("ascii")
+    if isinstance(value, tuple):
+        return [plain_value(v) for v in value]
+    return str(value)
+
+
+def plain_value(value):
+    # Tipos BSON → JSON sin pasar por el callback default de json.dumps
+    if isinstance(value, _NATIVE):
+        return value
+    if isinstance(value, dict):
+        return {k: plain_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [plain_value(v) for v in value]
+    return _convert_other(value)
+
+
+def plain_document(doc):
+    return {k: plain_value(v) for k, v in doc.items()}
+
+
+def _compressor(codec, level):
+    if codec is None:
+        return None
+    if codec == "gzip":
+        # wbits=31 → contenedor gzip, legible con gunzip / Athena
+        return zlib.compressobj(6 if level is None else level, zlib.DEFLATED, 31)
+    if codec == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("❌ json.compression 'zstd' needs the 'zstandard' package")
+        return zstandard.ZstdCompressor(level=3 if level is None else level).compressobj()
+    raise ValueError(f"❌ Invalid json.compression: {codec} (use 'gzip' or 'zstd')")
+
+
+class NDJSONWriter:
+    # Escribe documentos ya convertidos (plain_document) como JSON lines hacia un objeto con write():
+    # las líneas se juntan hasta chunk_bytes, se comprimen (gzip / zstd) y se entregan al sink por pedazos.
+    def __init__(self, sink, codec=None, level=None, chunk_bytes=MB):
+        if codec not in CODECS:
+            raise ValueError(f"❌ Invalid json.compression: {codec} (use 'gzip' or 'zstd')")
+        self.sink = sink
+        self.chunk_bytes = chunk_bytes
+        self.rows = 0
+        self._compressor = _compressor(codec, level)
+        self._pending = []
+        self._pending_bytes = 0
+
+    def write(self, doc):
+        self.write_encoded(_ENCODER.encode(doc))
+
+    def write_encoded(self, line):
+        # Línea JSON ya codificada (ej. al compactar partes existentes)
+        if self.rows:
+            line = "\n" + line
+        self._pending.append(line)
+        self._pending_bytes += len(line)
+        self.rows += 1
+        if self._pending_bytes >= self.chunk_bytes:
+            self._flush_chunk()
+
+    def write_all(self, docs):
+        for doc in docs:
+            self.write(doc)
+        return self
+
+    def _flush_chunk(self):
+        if not self._pending:
+            return
+        data = "".join(self._pending).encode("utf-8")
+        self._pending = []
+        self._pending_bytes = 0
+        if self._compressor is not None:
+            data = self._compressor.compress(data)
+        if data:
+            self.sink.write(data)
+
+    def close(self):
+        self._flush_chunk()
+        if self._compressor is not None:
+            tail = self._compressor.flush()
+            if tail:
+                self.sink.write(tail)
+
+
+def codec_for_key(key):
+    for codec, suffix in CODECS.items():
+        if suffix and key.endswith(suffix):
+            return codec
+    return None
+
+
+def decompress(data, codec):
+    if codec is None:
+        return data
+    if codec == "gzip":
+        return zlib.decompress(data, 47)  # 32 + 15: detecta el encabezado gzip
+    import zstandard
+    # decompressobj acepta frames sin tamaño declarado (los que escribe compressobj)
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
@@ -0,0 +1,87 @@
+import queue
+import threading
+
+
+_DONE = object()
+
+
+class PipelineAborted(Exception):
+    pass
+
+
+class StagedPipeline:
+    # Lector (hilo principal) → transformación (N hilos) → subida (M hilos), unidos por colas acotadas.
+    # Si una etapa se atrasa las colas se llenan y el lector deja de pedir documentos al cursor,
+    # así la memoria queda limitada a ~queue_size batches por etapa.
+    def __init__(self, transform_workers=1, upload_workers=2, queue_size=4):
+        self.transform_workers = max(int(transform_workers), 1)
+        self.upload_workers = max(int(upload_workers), 1)
+        self.queue_size = max(int(queue_size), 1)
+        self._error = None
+        self._error_lock = threading.Lock()
+
+    def _fail(self, error):
+        with self._error_lock:
+            if self._error is None:
+                self._error = error
+
+    def _put(self, q, item):
+        while True:
+            if self._error is not None:
+                raise PipelineAborted()
+            try:
+                q.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _worker(self, inbox, fn, outbox):
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                return
+            if self._error is not None:
+                continue  # drenar la cola después de un error
+            try:
+                result = fn(item)
+                if outbox is not None:
+                    self._put(outbox, result)
+            except PipelineAborted:
+                continue
+            except BaseException as e:
+                self._fail(e)
+
+    def _start(self, count, name, inbox, fn, outbox):
+        threads = []
+        for i in range(count):
+            t = threading.Thread(target=self._worker, args=(inbox, fn, outbox), name=f"{name}-{i}", daemon=True)
+            t.start()
+            threads.append(t)
+        return threads
+
+    def run(self, items, transform, upload):
+        transform_queue = queue.Queue(maxsize=self.queue_size)
+        upload_queue = queue.Queue(maxsize=self.queue_size)
+
+        transformers = self._start(self.transform_workers, "transform", transform_queue, transform, upload_queue)
+        uploaders = self._start(self.upload_workers, "upload", upload_queue, upload, None)
+
+        try:
+            for item in items:
+                self._put(transform_queue, item)
+        except PipelineAborted:
+            pass
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            for _ in transformers:
+                transform_queue.put(_DONE)
+            for t in transformers:
+                t.join()
+            for _ in uploaders:
+                upload_queue.put(_DONE)
+            for t in uploaders:
+                t.join()
+
+        if self._error is not None:
+            raise self._error
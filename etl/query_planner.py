@@ -0,0 +1,161 @@
+class QueryPlanError(Exception):
+    pass
+
+
+def _plan_stages(node, stages, indexes):
+    # Recorre el plan (clásico, SBE "queryPlan" o "shards" de un cluster) juntando etapas e índices usados
+    if isinstance(node, dict):
+        if "stage" in node:
+            stages.append(node["stage"])
+        if "indexName" in node:
+            indexes.append(node["indexName"])
+        for value in node.values():
+            _plan_stages(value, stages, indexes)
+    elif isinstance(node, list):
+        for value in node:
+            _plan_stages(value, stages, indexes)
+
+
+class PlanSummary:
+    def __init__(self, explain):
+        planner = explain.get("queryPlanner", {})
+        self.stages, self.indexes = [], []
+        _plan_stages(planner.get("winningPlan", {}), self.stages, self.indexes)
+        stats = explain.get("executionStats", {})
+        self.keys_examined = stats.get("totalKeysExamined")
+        self.docs_examined = stats.get("totalDocsExamined")
+        self.returned = stats.get("nReturned")
+        self.millis = stats.get("executionTimeMillis")
+
+    @property
+    def collscan(self):
+        return "COLLSCAN" in self.stages
+
+    def describe(self):
+        plan = "COLLSCAN" if self.collscan else f"IXSCAN {', '.join(dict.fromkeys(self.indexes)) or '?'}"
+        if self.returned is None:
+            return plan
+        return (f"{plan} | keys examined {self.keys_examined}, docs examined {self.docs_examined}, "
+                f"returned {self.returned} in {self.millis} ms")
+
+
+class ChainedCursor:
+    # Lee las ramas de un $or reescrito una tras otra; cada cursor se abre solo cuando termina el anterior
+    def __init__(self, factories):
+        self._factories = list(factories)
+        self._cursor = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        # Iterador como un Cursor de pymongo: el extractor lo consume con next()
+        while True:
+            if self._cursor is None:
+                if not self._factories:
+                    raise StopIteration
+                self._cursor = self._factories.pop(0)()
+            try:
+                return next(self._cursor)
+            except StopIteration:
+                self._cursor.close()
+                self._cursor = None
+
+    def close(self):
+        self._factories = []
+        if self._cursor is not None:
+            self._cursor.close()
+            self._cursor = None
+
+
+class QueryPlanner:
+    # Preflight con explain antes de abrir el cursor de un find:
+    #   - reporta el plan ganador (queryPlanner: no ejecuta la consulta). executionStats es opcional: ejecuta el find
+    #     hasta sample_limit documentos para reportar llaves / documentos examinados, lo que en un COLLSCAN recorre la colección
+    #   - rewrite_or: un $or de nivel superior cuyo plan es COLLSCAN se parte en un find por rama; la rama i lleva
+    #     $nor de las ramas anteriores, así los resultados no se repiten y no hace falta un set de _id en memoria.
+    #     "auto" solo reescribe si todas las ramas usan índice.
+    #   - on_collscan: "warn" o "fail" cuando lo que se va a ejecutar sigue sin índice
+    def __init__(self, verbosity="queryPlanner", sample_limit=1000, rewrite_or="auto", on_collscan="warn"):
+        if verbosity not in ("queryPlanner", "executionStats"):
+            raise ValueError(f"❌ Invalid query_plan.verbosity: {verbosity} (use 'queryPlanner' or 'executionStats')")
+        if rewrite_or not in ("auto", True, False):
+            raise ValueError(f"❌ Invalid query_plan.rewrite_or: {rewrite_or} (use 'auto', true or false)")
+        if on_collscan not in ("warn", "fail"):
+            raise ValueError(f"❌ Invalid query_plan.on_collscan: {on_collscan} (use 'warn' or 'fail')")
+        self.verbosity = verbosity
+        self.sample_limit = int(sample_limit)
+        self.rewrite_or = rewrite_or
+        self.on_collscan = on_collscan
+
+    @classmethod
+    def from_config(cls, config):
+        plan_config = config.get("query_plan", {})
+        if plan_config is False or plan_config.get("preflight", True) is False:
+            return None
+        return cls(
+            verbosity=plan_config.get("verbosity", "queryPlanner"),
+            sample_limit=plan_config.get("sample_limit", 1000),
+            rewrite_or=plan_config.get("rewrite_or", "auto"),
+            on_collscan=plan_config.get("on_collscan", "warn"),
+        )
+
+    def explain(self, collection, query):
+        command = {"find": collection.name, "filter": query}
+        if self.verbosity == "executionStats" and self.sample_limit:
+            command["limit"] = self.sample_limit
+        result = collection.database.command({"explain": command, "verbosity": self.verbosity},
+                                             read_preference=collection.read_preference)
+        return PlanSummary(result)
+
+    @staticmethod
+    def or_branches(query):
+        # Ramas de un $or de nivel superior, cada una con el resto del filtro; None si no aplica
+        branches = query.get("$or") if isinstance(query, dict) else None
+        if not branches or len(branches) < 2:
+            return None
+        rest = {k: v for k, v in query.items() if k != "$or"}
+        result = []
+        for i, branch in enumerate(branches):
+            clauses = [rest, branch] if rest else [branch]
+            if i:
+                clauses.append({"$nor": branches[:i]})
+            result.append(clauses[0] if len(clauses) == 1 else {"$and": clauses})
+        return result
+
+    def plan(self, collection, query, label, rewrite=True):
+        # Devuelve la lista de filtros a ejecutar: [query] o una rama por elemento del $or.
+        # Un explain que falla (permisos, mongomock) solo se reporta: el preflight nunca frena la corrida por sí mismo.
+        try:
+            summary = self.explain(collection, query)
+        except Exception as e:
+            print(f"⚠️ Explain preflight failed for {label}: {e}")
+            return [query]
+        print(f"🔎 Plan for {label}: {summary.describe()}")
+        if not summary.collscan:
+            return [query]
+
+        branches = self.or_branches(query) if rewrite and self.rewrite_or else None
+        if branches:
+            try:
+                summaries = [self.explain(collection, branch) for branch in branches]
+            except Exception as e:
+                print(f"⚠️ Explain preflight failed for the $or branches of {label}: {e}")
+                summaries = None
+            if summaries is not None:
+                for i, branch_summary in enumerate(summaries):
+                    print(f"   🔀 $or branch {i + 1}: {branch_summary.describe()}")
+                if self.rewrite_or is True or not any(s.collscan for s in summaries):
+                    print(f"✂️ Rewriting the $or of {label} into {len(branches)} range scans")
+                    if any(s.collscan for s in summaries):
+                        self._collscan(label)
+                    return branches
+
+        self._collscan(label)
+        return [query]
+
+    def _collscan(self, label):
+        message = f"No usable index for {label}: MongoDB will scan the whole collection"
+        if self.on_collscan == "fail":
+            raise QueryPlanError(f"❌ {message} (query_plan.on_collscan = fail)")
+        print(f"🐢 {message}")
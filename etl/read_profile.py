@@ -0,0 +1,81 @@
+from pymongo import CursorType
+from pymongo.read_preferences import ReadPreference
+
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+COMPRESSORS = ("zstd", "snappy", "zlib")
+
+
+class ReadProfile:
+    # Sección "read" de config/<collection>_config.json, aplicada a todos los find / aggregate del extractor:
+    #   compressors      → compresión de red negociada con el servidor (opción del MongoClient)
+    #   batch_size       → documentos por respuesta del servidor (batchSize del cursor)
+    #   read_preference  → ej. secondaryPreferred para no leer del primario
+    #   allow_disk_use   → sorts / $group grandes sin el límite de memoria del servidor
+    #   exhaust          → el servidor empuja los batches sin esperar getMore (no soportado detrás de mongos)
+    # Sin sección "read" todo queda con los defaults del driver, como antes.
+    def __init__(self, config=None):
+        config = config or {}
+        compressors = config.get("compressors", [])
+        if isinstance(compressors, str):
+            compressors = [c.strip() for c in compressors.split(",") if c.strip()]
+        invalid = [c for c in compressors if c not in COMPRESSORS]
+        if invalid:
+            raise ValueError(f"❌ Invalid read.compressors: {invalid} (use {', '.join(COMPRESSORS)})")
+        read_preference = config.get("read_preference")
+        if read_preference is not None and read_preference not in READ_PREFERENCES:
+            raise ValueError(f"❌ Invalid read.read_preference: {read_preference} (use one of {', '.join(READ_PREFERENCES)})")
+
+        self.compressors = compressors
+        self.batch_size = config.get("batch_size")
+        self.read_preference = read_preference
+        self.allow_disk_use = config.get("allow_disk_use")
+        self.exhaust = bool(config.get("exhaust", False))
+
+    def client_options(self):
+        # zstd y snappy necesitan los paquetes zstandard / python-snappy; si faltan pymongo los omite con un warning
+        return {"compressors": ",".join(self.compressors)} if self.compressors else {}
+
+    def collection(self, db, name, codec_options=None):
+        options = {}
+        if self.read_preference:
+            options["read_preference"] = READ_PREFERENCES[self.read_preference]
+        if codec_options is not None:
+            options["codec_options"] = codec_options
+        return db.get_collection(name, **options)
+
+    def find(self, collection, query, projection=None):
+        kwargs = {}
+        if self.exhaust:
+            kwargs["cursor_type"] = CursorType.EXHAUST
+        if self.allow_disk_use is not None:
+            kwargs["allow_disk_use"] = self.allow_disk_use
+        if self.batch_size:
+            kwargs["batch_size"] = int(self.batch_size)
+        return collection.find(query, projection, **kwargs)
+
+    def aggregate(self, collection, pipeline, allow_disk_use=True):
+        kwargs = {"allowDiskUse": allow_disk_use if self.allow_disk_use is None else self.allow_disk_use}
+        if self.batch_size:
+            kwargs["batchSize"] = int(self.batch_size)
+        return collection.aggregate(pipeline, **kwargs)
+
+    def describe(self):
+        parts = []
+        if self.compressors:
+            parts.append(f"compressors={','.join(self.compressors)}")
+        if self.batch_size:
+            parts.append(f"batch_size={self.batch_size}")
+        if self.read_preference:
+            parts.append(f"read_preference={self.read_preference}")
+        if self.allow_disk_use is not None:
+            parts.append(f"allow_disk_use={self.allow_disk_use}")
+        if self.exhaust:
+            parts.append("exhaust")
+        return ", ".join(parts) or "driver defaults"
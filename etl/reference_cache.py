@@ -0,0 +1,141 @@
+import fcntl
+import hashlib
+import json
+import os
+import struct
+import time
+import bson
+import numpy as np
+from bson import ObjectId
+
+
+MB = 1024 * 1024
+HEADER = struct.Struct(">4scQ")  # magic, tipo ("O" = ObjectIds de 12 bytes, "B" = BSON), creado (epoch)
+MAGIC = b"RID1"
+
+
+class ReferenceIdCache:
+    # Cache en disco local de los ids de referencia (ej. sale._id del día) compartido entre extractores del host.
+    # Los ObjectId se guardan ordenados como arreglo binario de 12 bytes (~12 MB por millón de ids).
+    # Un lock por llave hace que, si dos procesos piden el mismo set, uno lo calcule y el otro lo reutilice.
+    def __init__(self, cache_dir=None, max_bytes=None, ttl_seconds=None):
+        self.cache_dir = cache_dir or os.environ.get("REFERENCE_CACHE_DIR", "/tmp/etl_reference_cache")
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get("REFERENCE_CACHE_MAX_MB", 512)) * MB)
+        if ttl_seconds is None:
+            ttl_seconds = int(os.environ.get("REFERENCE_CACHE_TTL", 6 * 3600))
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(reference_from, reference_field, ref_query, day):
+        raw = json.dumps([reference_from, reference_field, ref_query, day], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.ids")
+
+    def get_or_compute(self, key, compute):
+        path = self._path(key)
+        with open(os.path.join(self.cache_dir, f"{key}.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                ids = self._read(path)
+                if ids is not None:
+                    print(f"♻️ Reference ids from cache ({key[:12]})")
+                    return ids
+                ids = self._write(path, compute())
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        self._evict(keep=path)
+        return ids
+
+    # ---------- formato ----------
+
+    def _read(self, path):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if len(data) < HEADER.size:
+            return None
+        magic, kind, created = HEADER.unpack_from(data)
+        if magic != MAGIC or time.time() - created > self.ttl_seconds:
+            return None
+        os.utime(path)  # LRU: la fecha de modificación marca el último uso
+        return self._decode(kind, memoryview(data)[HEADER.size:])
+
+    @staticmethod
+    def _decode(kind, body):
+        if kind == b"O":
+            return (ObjectId(bytes(body[i:i + 12])) for i in range(0, len(body), 12))
+        return iter(bson.decode(bytes(body))["ids"])
+
+    def _write(self, path, reference_ids):
+        packed = bytearray()
+        others = None
+        for ref_id in reference_ids:
+            if others is None and isinstance(ref_id, ObjectId):
+                packed += ref_id.binary
+                continue
+            if others is None:
+                # Ids que no son ObjectId: se guarda todo como BSON
+                others = [ObjectId(bytes(packed[i:i + 12])) for i in range(0, len(packed), 12)]
+                packed = None
+            others.append(ref_id)
+
+        if others is None:
+            kind = b"O"
+            if packed:
+                # Orden lexicográfico de los 12 bytes = orden por timestamp del ObjectId
+                words = np.frombuffer(bytes(packed), dtype=">u4").reshape(-1, 3)
+                order = np.lexsort((words[:, 2], words[:, 1], words[:, 0]))
+                body = words[order].tobytes()
+            else:
+                body = b""
+        else:
+            kind = b"B"
+            body = bson.encode({"ids": others})
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, kind, int(time.time())))
+                f.write(body)
+            os.replace(tmp_path, path)
+        finally:
+            # Si la escritura falla (ej. disco lleno) no queda el .tmp ocupando espacio fuera del LRU
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        print(f"💾 Cached {len(body) // 12 if kind == b'O' else len(others)} reference ids ({len(body) / MB:.2f} MB)")
+        return self._decode(kind, memoryview(body))
+
+    # ---------- LRU ----------
+
+    def _evict(self, keep=None):
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".ids"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)  # el .lock se deja: otro proceso podría tenerlo tomado
+            except FileNotFoundError:
+                pass
+            total -= size
+            print(f"🧹 Evicted reference cache entry {os.path.basename(path)}")
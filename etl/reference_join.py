@@ -0,0 +1,168 @@
+import queue
+import threading
+
+from read_profile import ReadProfile
+
+
+STRATEGIES = ("chunked", "parallel", "aggregate")
+_DONE = object()
+
+
+class ReferenceJoin:
+    # Extrae los documentos de la colección destino cuyo target_field está en los ids de referencia.
+    #   chunked   → un find({$in: chunk}) a la vez (comportamiento original)
+    #   parallel  → hasta `workers` chunks en vuelo, resultados en una cola acotada
+    #   aggregate → todo en el servidor: $match + $group + $lookup sobre la colección de referencia
+    # En ningún caso se arma la lista completa de ids en Python: se leen del cursor del $group por chunks.
+    # read_profile: batchSize / allowDiskUse / exhaust de la sección "read" de la config para cada find y aggregate.
+    def __init__(self, target, reference, reference_field, target_field="_id", projection=None,
+                 strategy="chunked", workers=4, chunk_size=10000, queue_size=8, read_profile=None):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"❌ Invalid reference_join strategy: {strategy} (use one of {', '.join(STRATEGIES)})")
+        self.target = target
+        self.reference = reference
+        self.reference_field = reference_field
+        self.target_field = target_field
+        self.projection = projection
+        self.strategy = strategy
+        self.workers = max(int(workers), 1)
+        self.chunk_size = max(int(chunk_size), 1)
+        self.queue_size = max(int(queue_size), 1)
+        self.reference_count = 0
+        self.read_profile = read_profile or ReadProfile()
+
+    def _group_pipeline(self, ref_query):
+        return [
+            {"$match": ref_query},
+            {"$group": {"_id": f"${self.reference_field}"}},
+            {"$match": {"_id": {"$ne": None}}},
+        ]
+
+    def iter_reference_ids(self, ref_query):
+        # Usa aggregate en lugar de distinct para evitar errores de 16MB
+        for doc in self.read_profile.aggregate(self.reference, self._group_pipeline(ref_query)):
+            yield doc["_id"]
+
+    def _iter_chunks(self, reference_ids):
+        chunk = []
+        for ref_id in reference_ids:
+            chunk.append(ref_id)
+            self.reference_count += 1
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _find_chunk(self, chunk):
+        return self.read_profile.find(self.target, {self.target_field: {"$in": chunk}}, self.projection)
+
+    def cursor(self, ref_query, reference_ids=None):
+        if self.strategy == "aggregate":
+            return self._aggregate_cursor(ref_query)
+        if reference_ids is None:
+            reference_ids = self.iter_reference_ids(ref_query)
+        chunks = self._iter_chunks(reference_ids)
+        if self.strategy == "parallel":
+            return self._parallel_cursor(chunks)
+        return self._chunked_cursor(chunks)
+
+    def _chunked_cursor(self, chunks):
+        for chunk in chunks:
+            for doc in self._find_chunk(chunk):
+                yield doc
+        self._report_empty()
+
+    def _parallel_cursor(self, chunks):
+        out = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        slots = threading.Semaphore(self.workers)
+        errors = []
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    out.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def fetch(chunk):
+            try:
+                buffer = []
+                for doc in self._find_chunk(chunk):
+                    buffer.append(doc)
+                    if len(buffer) >= 1000:
+                        if not put(buffer):
+                            return
+                        buffer = []
+                if buffer:
+                    put(buffer)
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                slots.release()
+
+        def dispatch():
+            threads = []
+            try:
+                for chunk in chunks:
+                    slots.acquire()
+                    if stop.is_set():
+                        slots.release()
+                        break
+                    t = threading.Thread(target=fetch, args=(chunk,), daemon=True)
+                    t.start()
+                    threads.append(t)
+                    threads = [t for t in threads if t.is_alive()]
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            for t in threads:
+                t.join()
+            if not put(_DONE):
+                out.put(_DONE)
+
+        dispatcher = threading.Thread(target=dispatch, name="reference-join", daemon=True)
+        dispatcher.start()
+        try:
+            while True:
+                item = out.get()
+                if item is _DONE:
+                    break
+                for doc in item:
+                    yield doc
+            if errors:
+                raise errors[0]
+        finally:
+            # Si el consumidor corta antes (error o close), los workers dejan de empujar resultados
+            stop.set()
+            while dispatcher.is_alive():
+                try:
+                    out.get(timeout=0.5)
+                except queue.Empty:
+                    pass
+        self._report_empty()
+
+    def _aggregate_cursor(self, ref_query):
+        pipeline = self._group_pipeline(ref_query) + [
+            {"$lookup": {
+                "from": self.target.name,
+                "localField": "_id",
+                "foreignField": self.target_field,
+                "as": "__target",
+            }},
+            # $lookup + $unwind se fusionan en el servidor, así no se arma un arreglo de 16MB por referencia
+            {"$unwind": "$__target"},
+            {"$replaceRoot": {"newRoot": "$__target"}},
+        ]
+        if self.projection:
+            pipeline.append({"$project": self.projection})
+        reference = self.reference.with_options(codec_options=self.target.codec_options)
+        return self.read_profile.aggregate(reference, pipeline)
+
+    def _report_empty(self):
+        if self.reference_count == 0:
+            print(f"⚠️ No referenced IDs found for {self.target.name}, skipping...")
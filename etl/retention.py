@@ -0,0 +1,295 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import boto3
+
+from inventory import CollectionIndex, DATA_FILE, list_objects, list_top_level
+from run_manifest import DayManifest
+from s3_sink import MB
+
+
+FORMATS = ("parquet", "json")
+DELETE_BATCH = 1000  # Límite de llaves por delete_objects
+
+
+def file_format(key):
+    name = key.rsplit("/", 1)[-1]
+    if name.endswith(".parquet"):
+        return "parquet"
+    if ".json" in name:
+        return "json"
+    return None
+
+
+class RetentionPolicy:
+    # Sección "retention" del config de la colección:
+    #   max_age_days: borra los días cuya fecha de partición es anterior a hoy - N
+    #   keep_last_snapshots: los N días más recientes con datos nunca se borran; sin max_age_days se borra todo lo demás
+    #     (pensado para colecciones replace: al escribir un snapshot nuevo se conservan los N anteriores)
+    #   formats: formatos que se borran (default ambos); el día completo, con su manifest, solo se borra si no le queda nada
+    def __init__(self, max_age_days=None, keep_last_snapshots=0, formats=FORMATS):
+        unknown = set(formats) - set(FORMATS)
+        if unknown or not formats:
+            raise ValueError(f"❌ Invalid retention.formats: {list(formats)} (use 'parquet' and/or 'json')")
+        if max_age_days is not None and int(max_age_days) < 0:
+            raise ValueError(f"❌ Invalid retention.max_age_days: {max_age_days}")
+        if int(keep_last_snapshots) < 0:
+            raise ValueError(f"❌ Invalid retention.keep_last_snapshots: {keep_last_snapshots}")
+        self.max_age_days = None if max_age_days is None else int(max_age_days)
+        self.keep_last_snapshots = int(keep_last_snapshots)
+        self.formats = tuple(f for f in FORMATS if f in formats)
+
+    @classmethod
+    def from_config(cls, config):
+        retention = config.get("retention") or {}
+        return cls(
+            max_age_days=retention.get("max_age_days"),
+            keep_last_snapshots=retention.get("keep_last_snapshots", 0),
+            formats=retention.get("formats", FORMATS),
+        )
+
+    @property
+    def enabled(self):
+        return self.max_age_days is not None or self.keep_last_snapshots > 0
+
+    @property
+    def whole_days(self):
+        return self.formats == FORMATS
+
+    def describe(self):
+        parts = []
+        if self.max_age_days is not None:
+            parts.append(f"older than {self.max_age_days} days")
+        if self.keep_last_snapshots:
+            parts.append(f"keeping the last {self.keep_last_snapshots} days")
+        return f"{'/'.join(self.formats)} {', '.join(parts) or 'disabled'}"
+
+
+class BatchDeleter:
+    # Junta llaves desde varios hilos de listado y manda un delete_objects en cuanto hay 1000, sin esperar a
+    # que termine el listado; max_in_flight limita los borrados pendientes (y la memoria) en buckets enormes.
+    def __init__(self, s3, bucket_name, executor, max_in_flight=16, dry_run=False):
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.executor = executor
+        self.dry_run = dry_run
+        self.objects = 0
+        self.bytes = 0
+        self.errors = []
+        self._pending = []
+        self._futures = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+
+    def add(self, key, size=0):
+        with self._lock:
+            self._pending.append(key)
+            self.bytes += size or 0
+            chunk = None
+            if len(self._pending) >= DELETE_BATCH:
+                chunk, self._pending = self._pending, []
+        if chunk:
+            self._submit(chunk)
+
+    def _submit(self, chunk):
+        if self.dry_run:
+            with self._lock:
+                self.objects += len(chunk)
+            return
+        self._slots.acquire()
+        future = self.executor.submit(self._delete, chunk)
+        future.add_done_callback(lambda _: self._slots.release())
+        with self._lock:
+            self._futures.append(future)
+
+    def _delete(self, chunk):
+        response = self.s3.delete_objects(Bucket=self.bucket_name, Delete={"Objects": [{"Key": k} for k in chunk], "Quiet": True})
+        errors = response.get("Errors", [])
+        with self._lock:
+            self.objects += len(chunk) - len(errors)
+            self.errors.extend(errors)
+
+    def close(self):
+        with self._lock:
+            chunk, self._pending = self._pending, []
+        if chunk:
+            self._submit(chunk)
+        for future in self._futures:
+            future.result()
+        self._futures = []
+
+
+class RetentionEngine:
+    # Aplica la política de una colección: un listado con delimitador para conocer los días, después cada día
+    # se lista en paralelo y sus llaves van directo al BatchDeleter. Al final se ajustan manifests e índice.
+    def __init__(self, s3, bucket_name, collection, policy, workers=16, delete_workers=8, dry_run=False):
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.collection = collection
+        self.policy = policy
+        self.workers = max(workers, 1)
+        self.delete_workers = max(delete_workers, 1)
+        self.dry_run = dry_run
+        self.index = CollectionIndex(s3, bucket_name, collection)
+
+    def expired_days(self, days, today=None):
+        # days: [(YYYY-MM-DD, prefijo)] ordenados; devuelve los que la política manda borrar
+        kept = {d for d, _ in days[-self.policy.keep_last_snapshots:]} if self.policy.keep_last_snapshots else set()
+        if self.policy.max_age_days is None:
+            return [(d, p) for d, p in days if d not in kept] if kept else []
+        today = today or datetime.now(timezone.utc).date()
+        cutoff = (today - timedelta(days=self.policy.max_age_days)).strftime("%Y-%m-%d")
+        return [(d, p) for d, p in days if d < cutoff and d not in kept]
+
+    def apply(self, today=None):
+        started = time.perf_counter()
+        days, _, _ = list_top_level(self.s3, self.bucket_name, self.collection)
+        expired = self.expired_days(days, today)
+        summary = self._purge(expired, self.policy.whole_days)
+        summary.update({"days_scanned": len(days), "seconds": round(time.perf_counter() - started, 2)})
+        return summary
+
+    def purge_collection(self, writing=None):
+        # Modo replace: borra todo bajo <collection>/ antes de escribir el snapshot nuevo, salvo los últimos
+        # keep_last_snapshots días; el día writing (el que se va a escribir) siempre se borra y no cuenta entre ellos
+        started = time.perf_counter()
+        days, others, loose = list_top_level(self.s3, self.bucket_name, self.collection)
+        previous = [(d, p) for d, p in days if d != writing]
+        keep = self.policy.keep_last_snapshots
+        expired = [(d, p) for d, p in days if d == writing] + (previous[:-keep] if keep else previous)
+        summary = self._purge(sorted(expired), True, extra_prefixes=others, extra_objects=loose)
+        summary.update({"days_scanned": len(days), "seconds": round(time.perf_counter() - started, 2)})
+        return summary
+
+    # ---------- borrado ----------
+
+    def _manifest_prefix(self, prefix):
+        return f"{DayManifest.prefix(self.collection)}{prefix.rstrip('/').rsplit('/', 1)[-1]}/"
+
+    def _purge_prefix(self, deleter, prefix):
+        for key, size in list_objects(self.s3, self.bucket_name, prefix):
+            deleter.add(key, size)
+
+    def _purge_day(self, deleter, date_str, prefix, whole):
+        objects = list_objects(self.s3, self.bucket_name, prefix)
+        if whole:
+            doomed, kept = objects, []
+        else:
+            doomed = [(k, s) for k, s in objects if DATA_FILE.search(k) and file_format(k) in self.policy.formats]
+            doomed_keys = {k for k, _ in doomed}
+            kept = [(k, s) for k, s in objects if k not in doomed_keys]
+        for key, size in doomed:
+            deleter.add(key, size)
+        if not any(DATA_FILE.search(k) for k, _ in kept):
+            # Sin datos, el manifest del día (y su compaction.json) ya no describe nada
+            for key, size in list_objects(self.s3, self.bucket_name, self._manifest_prefix(prefix)):
+                deleter.add(key, size)
+            return date_str, prefix, None, len(doomed)
+        return date_str, prefix, ({k for k, _ in doomed}, kept), len(doomed)
+
+    def _purge(self, expired, whole, extra_prefixes=(), extra_objects=()):
+        summary = {"collection": self.collection, "dry_run": self.dry_run, "days_purged": 0, "days_trimmed": 0,
+                   "objects": 0, "bytes": 0, "errors": 0}
+        if not (expired or extra_prefixes or extra_objects):
+            return summary
+
+        with ThreadPoolExecutor(max_workers=self.delete_workers) as delete_executor:
+            deleter = BatchDeleter(self.s3, self.bucket_name, delete_executor, max_in_flight=self.delete_workers * 2, dry_run=self.dry_run)
+            for key, size in extra_objects:
+                deleter.add(key, size)
+            with ThreadPoolExecutor(max_workers=self.workers) as list_executor:
+                others = [list_executor.submit(self._purge_prefix, deleter, prefix) for prefix in extra_prefixes]
+                results = list(list_executor.map(lambda item: self._purge_day(deleter, item[0], item[1], whole), expired))
+                for future in others:
+                    future.result()
+            deleter.close()
+
+        removed = [date_str for date_str, _, trimmed, _ in results if trimmed is None]
+        trimmed = [(date_str, prefix, t) for date_str, prefix, t, count in results if t is not None and count]
+        summary.update({"days_purged": len(removed), "days_trimmed": len(trimmed), "objects": deleter.objects,
+                        "bytes": deleter.bytes, "errors": len(deleter.errors)})
+        for error in deleter.errors[:10]:
+            print(f"⚠️ Could not delete {error.get('Key')}: {error.get('Code')} {error.get('Message')}")
+        if self.dry_run or not (removed or trimmed):
+            return summary
+
+        entries = {}
+        for date_str, prefix, (doomed_keys, kept) in trimmed:
+            # Solo se borraron algunos formatos: el manifest deja de listar esas llaves
+            manifest = DayManifest(self.s3, self.bucket_name, self.collection, date_str).load()
+            if manifest.data["parts"]:
+                for part in manifest.data["parts"]:
+                    part["keys"] = [k for k in part["keys"] if k not in doomed_keys]
+                manifest.data["parts"] = [p for p in manifest.data["parts"] if p["keys"]]
+                manifest.save()
+            entries[date_str] = self.index.listing_entry(prefix, kept)
+        self.index.apply(entries, removed)
+        return summary
+
+
+def print_summary(summary):
+    verb = "Would delete" if summary["dry_run"] else "Deleted"
+    print(f"🧹 {summary['collection']}: {verb} {summary['objects']} objects ({summary['bytes'] / MB:.1f} MB), "
+          f"{summary['days_purged']} days removed, {summary['days_trimmed']} days trimmed of {summary['days_scanned']} "
+          f"in {summary['seconds']}s" + (f", {summary['errors']} errors" if summary["errors"] else ""))
+
+
+def _load_config(collection):
+    try:
+        with open(f"config/{collection}_config.json") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise ValueError(f"❌ Config not found for collection: {collection}")
+
+
+def load_collections(config_path="config/collections.json"):
+    with open(config_path) as f:
+        return json.load(f).get("collections", [])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Borra de S3 los días que la política de retención de cada colección ya no conserva")
+    parser.add_argument("--collections", nargs="+", help="Default: todas las de config/collections.json con sección 'retention'")
+    parser.add_argument("--max-age-days", type=int, help="Reemplaza retention.max_age_days")
+    parser.add_argument("--keep-last", type=int, help="Reemplaza retention.keep_last_snapshots")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, help="Reemplaza retention.formats")
+    parser.add_argument("--workers", type=int, default=16, help="Días listados en paralelo")
+    parser.add_argument("--delete-workers", type=int, default=8, help="delete_objects de 1000 llaves en paralelo")
+    parser.add_argument("--dry-run", action="store_true", help="Solo cuenta lo que se borraría")
+    parser.add_argument("--s3-endpoint", help="Endpoint S3 alternativo (ej. MinIO local)")
+    args = parser.parse_args()
+
+    bucket_name = os.environ.get("S3_BUCKET", "etl-riesgo-penalizaciones-data")
+    s3 = boto3.client("s3", endpoint_url=args.s3_endpoint) if args.s3_endpoint else boto3.client("s3")
+
+    totals = {"objects": 0, "bytes": 0, "errors": 0}
+    for collection in args.collections or load_collections():
+        retention = dict(_load_config(collection).get("retention") or {})
+        if args.max_age_days is not None:
+            retention["max_age_days"] = args.max_age_days
+        if args.keep_last is not None:
+            retention["keep_last_snapshots"] = args.keep_last
+        if args.formats:
+            retention["formats"] = args.formats
+        policy = RetentionPolicy.from_config({"retention": retention})
+        if not policy.enabled:
+            if args.collections:
+                print(f"ℹ️ {collection} has no retention policy, skipping")
+            continue
+        print(f"🗓️ Retention for {collection}: {policy.describe()}")
+        summary = RetentionEngine(s3, bucket_name, collection, policy, args.workers, args.delete_workers, args.dry_run).apply()
+        print_summary(summary)
+        for key in totals:
+            totals[key] += summary[key]
+
+    verb = "would be deleted" if args.dry_run else "deleted"
+    print(f"✅ {totals['objects']} objects ({totals['bytes'] / MB:.1f} MB) {verb}" + (f", {totals['errors']} errors" if totals["errors"] else ""))
+
+
+if __name__ == "__main__":
+    main()
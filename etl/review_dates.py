@@ -1,30 +1,92 @@
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
 import boto3
-import re
-from collections import defaultdict
-from datetime import datetime
-
-bucket_name = "etl-riesgo-penalizaciones-data"
-
-s3 = boto3.client("s3")
-paginator = s3.get_paginator("list_objects_v2")
-pages = paginator.paginate(Bucket=bucket_name)
-
-# Detecta archivos: data.json, data.parquet, data_part1.json, etc.
-pattern = re.compile(r"([^/]+)/day=(\d{2}-\d{2}-\d{4})/data(?:_part\d+)?\.(json|parquet)$")
-
-summary = defaultdict(lambda: defaultdict(lambda: {"json": 0, "parquet": 0}))
-
-for page in pages:
-    for obj in page.get("Contents", []):
-        key = obj["Key"]
-        match = pattern.match(key)
-        if match:
-            collection, date_str, file_type = match.groups()
-            summary[collection][date_str][file_type] += 1
-
-# Imprime ordenado por fecha correctamente
-for collection in summary:
-    print(f"\n📁 Collection: {collection}")
-    for date_str in sorted(summary[collection], key=lambda d: datetime.strptime(d, "%d-%m-%Y")):
-        counts = summary[collection][date_str]
-        print(f"  📅 {date_str} → JSON: {counts['json']}, Parquet: {counts['parquet']}")
\ No newline at end of file
+
+from inventory import CollectionIndex
+
+
+# Auditoría de días por colección a partir de _manifests/<collection>/index.json (un GET por colección).
+# Colecciones sin índice, o con --rebuild, se reconstruyen listando cada day=DD-MM-YYYY/ en paralelo.
+#
+#   python3 etl/review_dates.py --collections sale refund --start-date 2025-01-01 --end-date 2025-06-30 --strict
+
+def load_collections(config_path="config/collections.json"):
+    with open(config_path) as f:
+        return json.load(f).get("collections", [])
+
+
+def _days_between(start, end):
+    day = start
+    while day <= end:
+        yield day.strftime("%Y-%m-%d")
+        day += timedelta(days=1)
+
+
+def find_gaps(days, start_date=None, end_date=None):
+    # days: {"YYYY-MM-DD": entrada del índice}; el rango por omisión va del primer al último día registrado
+    if not days and not (start_date and end_date):
+        return {"missing": [], "without_parquet": [], "incomplete": []}
+    start = datetime.strptime(start_date or min(days), "%Y-%m-%d")
+    end = datetime.strptime(end_date or max(days), "%Y-%m-%d")
+    in_range = list(_days_between(start, end))
+    return {
+        "missing": [d for d in in_range if d not in days or not days[d]["files"]],
+        "without_parquet": [d for d in in_range if d in days and days[d]["files"] and not days[d]["parquet"]],
+        "incomplete": [d for d in in_range if d in days and days[d]["status"] not in ("complete", "unknown")],
+    }
+
+
+def _display(date_str):
+    return datetime.strptime(date_str, "%Y-%m-%d").strftime("%d-%m-%Y")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumen y huecos por día de los datos en S3")
+    parser.add_argument("--collections", nargs="+", help="Default: todas las de config/collections.json")
+    parser.add_argument("--start-date", help="YYYY-MM-DD (default: primer día con datos)")
+    parser.add_argument("--end-date", help="YYYY-MM-DD (default: último día con datos)")
+    parser.add_argument("--rebuild", action="store_true", help="Reconstruye el índice listando los prefijos de cada día (datos sin manifests)")
+    parser.add_argument("--workers", type=int, default=16, help="Días listados en paralelo al reconstruir")
+    parser.add_argument("--strict", action="store_true", help="Termina con código 1 si hay días faltantes, sin Parquet o incompletos")
+    parser.add_argument("--s3-endpoint", help="Endpoint S3 alternativo (ej. MinIO local)")
+    args = parser.parse_args()
+
+    bucket_name = os.environ.get("S3_BUCKET", "etl-riesgo-penalizaciones-data")
+    s3 = boto3.client("s3", endpoint_url=args.s3_endpoint) if args.s3_endpoint else boto3.client("s3")
+
+    found_gaps = False
+    for collection in args.collections or load_collections():
+        index = CollectionIndex(s3, bucket_name, collection)
+        data = index.load()
+        if args.rebuild or not data["days"]:
+            print(f"🔁 Rebuilding the inventory of {collection} from the S3 listing...")
+            data = index.rebuild(args.workers)
+
+        days = data["days"]
+        print(f"\n📁 Collection: {collection}")
+        for date_str in sorted(days):
+            entry = days[date_str]
+            status = "" if entry["status"] in ("complete", "unknown") else f" ({entry['status']})"
+            print(f"  📅 {_display(date_str)} → JSON: {entry['json']}, Parquet: {entry['parquet']}{status}")
+
+        gaps = find_gaps(days, args.start_date, args.end_date)
+        for label, emoji, dates in (("Missing days", "🕳️", gaps["missing"]),
+                                    ("Days without Parquet", "📄", gaps["without_parquet"]),
+                                    ("Incomplete days", "⏳", gaps["incomplete"])):
+            if dates:
+                found_gaps = True
+                print(f"  {emoji} {label} ({len(dates)}): {', '.join(_display(d) for d in dates)}")
+        hashes = {h for entry in days.values() for h in entry.get("schema_hashes", [])}
+        if len(hashes) > 1:
+            print(f"  🧬 {len(hashes)} distinct Parquet schemas across the indexed days")
+
+    if args.strict and found_gaps:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
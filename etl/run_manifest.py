@@ -0,0 +1,140 @@
+import json
+import re
+import threading
+from datetime import datetime, timezone
+
+from inventory import CollectionIndex, day_entry
+
+
+SLICE_MANIFEST = re.compile(r"/(data_s\d+)\.json$")
+
+
+class ResumeMismatch(Exception):
+    pass
+
+
+class DayManifest:
+    # Registro en S3 de lo que ya quedó subido para un (colección, día):
+    #   _manifests/<collection>/day=DD-MM-YYYY/manifest.json
+    # Cada parte confirmada guarda sus llaves, filas, bytes, índice de batch y último _id,
+    # así una corrida con --resume salta días completos y retoma días a medias desde la última parte.
+    # Al completarse, el manifest del día (no los de cada slice) se resume en _manifests/<collection>/index.json.
+    def __init__(self, s3, bucket_name, collection, date_str, name="manifest"):
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.name = name
+        day = datetime.strptime(date_str, "%Y-%m-%d").strftime("day=%d-%m-%Y")
+        self.key = f"_manifests/{collection}/{day}/{name}.json"
+        self.data = {
+            "collection": collection,
+            "date": date_str,
+            "status": "new",
+            "fingerprint": None,
+            "doc_count": 0,
+            "parts": [],
+        }
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def prefix(collection):
+        return f"_manifests/{collection}/"
+
+    def load(self):
+        try:
+            body = self.s3.get_object(Bucket=self.bucket_name, Key=self.key)["Body"].read()
+            self.data = json.loads(body)
+        except self.s3.exceptions.NoSuchKey:
+            pass
+        return self
+
+    def save(self):
+        self.data["updated_at"] = datetime.now(timezone.utc).isoformat()
+        self.s3.put_object(Bucket=self.bucket_name, Key=self.key, Body=json.dumps(self.data).encode("utf-8"))
+
+    # ---------- estado ----------
+
+    def is_complete(self, fingerprint):
+        return self.data["status"] == "complete" and self.data["fingerprint"] == fingerprint
+
+    def is_resumable(self, fingerprint):
+        return self.data["status"] == "in_progress" and self.data["fingerprint"] == fingerprint and bool(self.data["parts"])
+
+    def start(self, fingerprint, keep_parts=False):
+        with self._lock:
+            if not keep_parts:
+                self.data["parts"] = []
+            self.data["status"] = "in_progress"
+            self.data["fingerprint"] = fingerprint
+            self.data["started_at"] = datetime.now(timezone.utc).isoformat()
+            self.save()
+
+    def record_part(self, keys, rows, size, batch_index=None, last_id=None, schema_hash=None):
+        with self._lock:
+            self.data["parts"].append({
+                "keys": list(keys),
+                "rows": rows,
+                "bytes": size,
+                "batch_index": batch_index,
+                "last_id": last_id,
+                "schema_hash": schema_hash,
+            })
+            self.save()
+
+    def complete(self, doc_count, **extra):
+        with self._lock:
+            self.data["status"] = "complete"
+            self.data["doc_count"] = doc_count
+            self.data["completed_at"] = datetime.now(timezone.utc).isoformat()
+            self.data.update(extra)
+            self.save()
+        self.publish()
+
+    # ---------- inventario ----------
+
+    def summary(self):
+        # Entrada del día en el índice de la colección
+        parts = self.data["parts"]
+        return day_entry(self.part_keys(), sum(p["bytes"] or 0 for p in parts), self.data["status"],
+                         self.data["doc_count"], [p.get("schema_hash") for p in parts])
+
+    def publish(self):
+        if self.name != "manifest":
+            return
+        # El índice es un resumen: si no se puede actualizar, el día sigue completo y --rebuild lo recupera
+        try:
+            CollectionIndex(self.s3, self.bucket_name, self.data["collection"]).update(self.data["date"], self.summary())
+        except Exception as e:
+            print(f"⚠️ Could not update the inventory index of {self.data['collection']} for {self.data['date']}: {e}")
+
+    # ---------- resume ----------
+
+    def resume_point(self):
+        # (siguiente batch, filas ya confirmadas, último _id) del prefijo contiguo de batches subidos;
+        # con el pipeline las partes pueden confirmarse fuera de orden, por eso solo cuenta el prefijo sin huecos
+        by_index = {p["batch_index"]: p for p in self.data["parts"] if p["batch_index"] is not None}
+        next_index, rows, last_id = 0, 0, None
+        while next_index in by_index:
+            rows += by_index[next_index]["rows"]
+            last_id = by_index[next_index]["last_id"]
+            next_index += 1
+        return next_index, rows, last_id
+
+    def keep_batches_before(self, batch_index):
+        # Descarta partes posteriores a un hueco: se van a volver a escribir con las mismas llaves
+        with self._lock:
+            self.data["parts"] = [p for p in self.data["parts"] if p["batch_index"] is not None and p["batch_index"] < batch_index]
+
+    def part_keys(self):
+        return [key for part in self.data["parts"] for key in part["keys"]]
+
+    # ---------- slices ----------
+
+    def slices(self):
+        # Manifests de las slices del scan paralelo del mismo día (data_sXX.json), ya cargados
+        prefix = self.key.rsplit("/", 1)[0] + "/data_s"
+        response = self.s3.list_objects_v2(Bucket=self.bucket_name, Prefix=prefix)
+        names = [m.group(1) for m in (SLICE_MANIFEST.search(o["Key"]) for o in response.get("Contents", [])) if m]
+        return [DayManifest(self.s3, self.bucket_name, self.data["collection"], self.data["date"], name).load() for name in sorted(names)]
+
+    def delete(self):
+        self.s3.delete_object(Bucket=self.bucket_name, Key=self.key)
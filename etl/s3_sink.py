@@ -0,0 +1,154 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+MB = 1024 * 1024
+MIN_PART_SIZE = 5 * MB  # mínimo de S3 para todas las partes excepto la última
+
+
+class S3MultipartSink:
+    # Objeto tipo archivo (write/tell/close) que sube a S3 por multipart mientras se escribe.
+    # Solo mantiene en memoria la parte actual + max_in_flight partes subiendo.
+    # close() solo cierra la escritura (pyarrow lo llama aunque haya fallado); el objeto
+    # aparece en S3 únicamente con complete(), y abort() descarta las partes subidas.
+    def __init__(self, s3, bucket_name, key, part_size=8 * MB, max_in_flight=4):
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.key = key
+        self.part_size = max(int(part_size), MIN_PART_SIZE)
+        self.max_in_flight = max(int(max_in_flight), 1)
+        self.bytes_written = 0
+        self.closed = False
+        self.finished = False
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._executor = None
+        self._futures = []
+        self._next_part = 1
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.complete()
+        else:
+            self.abort()
+        return False
+
+    # ---------- interfaz de archivo ----------
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def readable(self):
+        return False
+
+    def tell(self):
+        return self.bytes_written
+
+    def flush(self):
+        pass
+
+    def write(self, data):
+        if self.closed or self.finished:
+            raise ValueError(f"❌ Sink already closed for s3://{self.bucket_name}/{self.key}")
+        self._buffer += data
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            with memoryview(self._buffer) as view:
+                chunk = bytes(view[:self.part_size])
+            del self._buffer[:self.part_size]
+            self._submit_part(chunk)
+        return len(data)
+
+    # ---------- multipart ----------
+
+    def _start_upload(self):
+        response = self.s3.create_multipart_upload(Bucket=self.bucket_name, Key=self.key)
+        self._upload_id = response["UploadId"]
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight)
+
+    def _raise_if_failed(self):
+        for future in self._futures:
+            if future.done() and future.exception() is not None:
+                raise future.exception()
+
+    def _submit_part(self, chunk):
+        if self._upload_id is None:
+            self._start_upload()
+        self._raise_if_failed()
+        self._slots.acquire()  # backpressure: como máximo max_in_flight partes en memoria
+        part_number = self._next_part
+        self._next_part += 1
+        try:
+            future = self._executor.submit(self._upload_part, part_number, chunk)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda f: self._slots.release())
+        self._futures.append(future)
+
+    def _upload_part(self, part_number, chunk):
+        response = self.s3.upload_part(
+            Bucket=self.bucket_name,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=chunk,
+        )
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+    def close(self):
+        self.closed = True
+
+    def complete(self):
+        if self.finished:
+            return
+        self.closed = True
+        try:
+            if self._upload_id is None:
+                # Objeto chico: un solo PUT, sin overhead de multipart
+                self.s3.put_object(Bucket=self.bucket_name, Key=self.key, Body=bytes(self._buffer))
+            else:
+                if self._buffer:
+                    self._submit_part(bytes(self._buffer))
+                parts = [future.result() for future in self._futures]
+                self.s3.complete_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=self.key,
+                    UploadId=self._upload_id,
+                    MultipartUpload={"Parts": sorted(parts, key=lambda p: p["PartNumber"])},
+                )
+        except Exception:
+            self.abort()
+            raise
+        self._release()
+
+    def abort(self):
+        if self.finished:
+            return
+        if self._upload_id is not None:
+            for future in self._futures:
+                future.cancel()
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+            try:
+                self.s3.abort_multipart_upload(Bucket=self.bucket_name, Key=self.key, UploadId=self._upload_id)
+                print(f"🧯 Multipart upload aborted for s3://{self.bucket_name}/{self.key}")
+            except Exception as e:
+                print(f"❌ Error aborting multipart upload for {self.key}:", e)
+        self._release()
+
+    def _release(self):
+        self.closed = True
+        self.finished = True
+        self._buffer = bytearray()
+        self._futures = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,247 @@
+import heapq
+import json
+import os
+import sqlite3
+import statistics
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+
+DEFAULT_DOCS_PER_SECOND = 2000
+DEFAULT_MEMORY_MB = 512
+TASK_OVERHEAD_SECONDS = 5  # arranque del proceso, imports y conexión
+
+
+class RunHistory:
+    # Historial local (sqlite) de cada extracción (colección, día): duración, documentos y pico de RSS.
+    # Lo escribe el extractor al terminar un día y lo lee el scheduler para estimar el costo de las tareas.
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("ETL_HISTORY_DB", "etl_history.db")
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                " collection TEXT NOT NULL, day TEXT NOT NULL, duration_s REAL NOT NULL,"
+                " docs INTEGER NOT NULL, peak_rss_mb REAL, finished_at TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS runs_collection_day ON runs (collection, day)")
+
+    def _connect(self):
+        # timeout: varios procesos del launcher escriben a la vez
+        return sqlite3.connect(self.path, timeout=30)
+
+    def record(self, collection, day, duration_s, docs, peak_rss_mb=None):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO runs (collection, day, duration_s, docs, peak_rss_mb, finished_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (collection, day, float(duration_s), int(docs), peak_rss_mb, datetime.now(timezone.utc).isoformat()),
+            )
+
+    def runs(self, collection, day=None, limit=20):
+        query = "SELECT duration_s, docs, peak_rss_mb FROM runs WHERE collection = ?"
+        params = [collection]
+        if day is not None:
+            query += " AND day = ?"
+            params.append(day)
+        query += " ORDER BY finished_at DESC LIMIT ?"
+        params.append(limit)
+        with self._connect() as conn:
+            return conn.execute(query, params).fetchall()
+
+    def docs_per_second(self):
+        with self._connect() as conn:
+            duration, docs = conn.execute("SELECT SUM(duration_s), SUM(docs) FROM runs WHERE docs > 0").fetchone()
+        if not duration or not docs:
+            return DEFAULT_DOCS_PER_SECOND
+        return docs / duration
+
+
+def _replace_placeholders(obj, start_ms, end_ms):
+    if isinstance(obj, dict):
+        return {k: _replace_placeholders(v, start_ms, end_ms) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_replace_placeholders(v, start_ms, end_ms) for v in obj]
+    if obj == "__start__":
+        return start_ms
+    if obj == "__end__":
+        return end_ms
+    return obj
+
+
+def _task_days(task):
+    date_str, _, end_date_str = task
+    current = datetime.strptime(date_str, "%Y-%m-%d")
+    end = datetime.strptime(end_date_str or date_str, "%Y-%m-%d")
+    days = []
+    while current <= end:
+        days.append(current.strftime("%Y-%m-%d"))
+        current += timedelta(days=1)
+    return days
+
+
+class CostScheduler:
+    # Ordena las tareas (día, colección, fin) de mayor a menor costo estimado (LPT) y las despacha
+    # respetando a la vez el máximo de procesos y un presupuesto de memoria.
+    # Estimación: historial del mismo día → historial de la colección → conteo previo en Mongo → default.
+    def __init__(self, max_parallel, memory_budget_mb, history=None, mongo_uri=None, count_max_time_ms=2000):
+        self.max_parallel = max(int(max_parallel), 1)
+        self.memory_budget_mb = memory_budget_mb
+        self.history = history or RunHistory()
+        self.mongo_uri = mongo_uri
+        self.count_max_time_ms = count_max_time_ms
+        self._db = None
+        self._configs = {}
+        self._rate = None
+
+    # ---------- estimación ----------
+
+    def _config(self, collection):
+        if collection not in self._configs:
+            try:
+                with open(f"config/{collection}_config.json") as f:
+                    self._configs[collection] = json.load(f)
+            except FileNotFoundError:
+                self._configs[collection] = {}
+        return self._configs[collection]
+
+    def _count(self, collection, day):
+        # Preflight barato: solo se usa cuando la colección no tiene historial
+        if not self.mongo_uri:
+            return None
+        import pymongo
+        from pymongo.errors import PyMongoError
+
+        if self._db is None:
+            self._db = pymongo.MongoClient(self.mongo_uri)["EtominTransactions"]
+        config = self._config(collection)
+        start = datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        start_ms = int(start.timestamp() * 1000)
+        end_ms = int((start + timedelta(days=1)).timestamp() * 1000)
+        try:
+            if config.get("mode", "delta") == "replace":
+                return self._db[collection].estimated_document_count()
+            if "filter" in config:
+                counted, query = self._db[collection], _replace_placeholders(config["filter"], start_ms, end_ms)
+            elif "filter_from_reference" in config:
+                counted = self._db[config["reference_from"]]
+                query = _replace_placeholders(config["filter_from_reference"], start_ms, end_ms)
+            else:
+                return 0
+            return counted.count_documents(query, maxTimeMS=self.count_max_time_ms)
+        except PyMongoError as e:
+            print(f"⚠️ Count preflight failed for {collection} on {day}: {e}")
+            return None
+
+    def _estimate_day(self, collection, day):
+        runs = self.history.runs(collection, day) or self.history.runs(collection)
+        if runs:
+            seconds = statistics.median(r[0] for r in runs)
+            memory = max((r[2] for r in runs if r[2]), default=DEFAULT_MEMORY_MB)
+            return seconds, memory, "history"
+
+        if self._rate is None:
+            self._rate = self.history.docs_per_second()
+        count = self._count(collection, day)
+        if count is None:
+            return TASK_OVERHEAD_SECONDS, DEFAULT_MEMORY_MB, "default"
+        return TASK_OVERHEAD_SECONDS + count / self._rate, DEFAULT_MEMORY_MB, "count"
+
+    def estimate(self, task):
+        _, collection, _ = task
+        seconds, memory, sources = 0.0, 0.0, set()
+        for day in _task_days(task):
+            day_seconds, day_memory, source = self._estimate_day(collection, day)
+            seconds += day_seconds
+            memory = max(memory, day_memory)
+            sources.add(source)
+        return {"task": task, "seconds": seconds, "memory_mb": memory, "source": "+".join(sorted(sources))}
+
+    # ---------- planificación ----------
+
+    def _fits(self, estimate, used_memory, running):
+        # Una tarea más grande que el presupuesto corre sola en lugar de no correr nunca
+        return running == 0 or used_memory + estimate["memory_mb"] <= self.memory_budget_mb
+
+    def plan(self, tasks):
+        estimates = sorted((self.estimate(t) for t in tasks), key=lambda e: e["seconds"], reverse=True)
+        print(f"📐 Planning {len(estimates)} tasks: {self.max_parallel} processes, {self.memory_budget_mb:.0f} MB memory budget")
+        for e in estimates[:10]:
+            date_str, collection, end_date_str = e["task"]
+            label = f"{date_str}→{end_date_str}" if end_date_str else date_str
+            print(f"   {collection:<20} {label:<23} ~{e['seconds']:8.1f}s {e['memory_mb']:7.0f} MB ({e['source']})")
+        print(f"🗓️ Planned makespan: {self.simulate(estimates):.1f}s (serial: {sum(e['seconds'] for e in estimates):.1f}s)")
+        return estimates
+
+    def simulate(self, estimates):
+        # Misma política que run(), con las duraciones estimadas
+        pending = list(estimates)
+        running = []  # heap de (fin, seq, estimate)
+        now, used, seq = 0.0, 0.0, 0
+        while pending or running:
+            started = True
+            while started and pending and len(running) < self.max_parallel:
+                started = False
+                for i, e in enumerate(pending):
+                    if self._fits(e, used, len(running)):
+                        heapq.heappush(running, (now + e["seconds"], seq, e))
+                        seq += 1
+                        used += e["memory_mb"]
+                        del pending[i]
+                        started = True
+                        break
+            end, _, e = heapq.heappop(running)
+            now = end
+            used -= e["memory_mb"]
+        return now
+
+    # ---------- ejecución ----------
+
+    def run(self, estimates, run_task):
+        # run_task(task) es bloqueante y corre en un hilo; cada vez que una tarea termina se arranca
+        # la más larga pendiente que entre en memoria
+        pending = list(estimates)
+        changed = threading.Condition()
+        state = {"running": 0, "memory": 0.0}
+
+        def worker(estimate):
+            try:
+                run_task(estimate["task"])
+            finally:
+                with changed:
+                    state["running"] -= 1
+                    state["memory"] -= estimate["memory_mb"]
+                    changed.notify()
+
+        threads = []
+        with changed:
+            while pending:
+                chosen = None
+                if state["running"] < self.max_parallel:
+                    for i, e in enumerate(pending):
+                        if self._fits(e, state["memory"], state["running"]):
+                            chosen = pending.pop(i)
+                            break
+                if chosen is None:
+                    changed.wait()
+                    continue
+                state["running"] += 1
+                state["memory"] += chosen["memory_mb"]
+                t = threading.Thread(target=worker, args=(chosen,), daemon=True)
+                t.start()
+                threads.append(t)
+        for t in threads:
+            t.join()
+
+
+def current_rss_mb():
+    import psutil
+    return psutil.Process().memory_info().rss / (1024 ** 2)
+
+
+def record_run(collection, day, started_at, docs, peak_rss_mb=None):
+    # peak_rss_mb: el de la tarea (RunMetrics.peak_rss_mb); sin muestras se usa el RSS actual
+    try:
+        RunHistory().record(collection, day, time.time() - started_at, docs,
+                            peak_rss_mb if peak_rss_mb is not None else current_rss_mb())
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not record run history: {e}")
@@ -0,0 +1,250 @@
+import fcntl
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+import pyarrow as pa
+
+from arrow_writer import ARROW_CONVERSION_ERRORS
+
+
+# Tipos del registro y su tipo Arrow. Los conflictos se resuelven ensanchando:
+#   null → cualquiera;  bool → int → float;  cualquier otra mezcla → string
+ARROW_TYPES = {
+    "null": pa.null(),
+    "bool": pa.bool_(),
+    "int": pa.int64(),
+    "float": pa.float64(),
+    "string": pa.string(),
+    "timestamp": pa.timestamp("ms"),
+    "json": pa.string(),  # listas (y dicts dentro de listas) serializadas como JSON
+    "binary": pa.binary(),
+}
+NUMERIC_RANK = {"bool": 0, "int": 1, "float": 2}
+INT64_MIN, INT64_MAX = -(2 ** 63), 2 ** 63 - 1
+MAX_DRIFT_HISTORY = 200
+
+
+class SchemaDrift(Exception):
+    pass
+
+
+def value_kind(value):
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int" if INT64_MIN <= value <= INT64_MAX else "string"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, datetime):
+        return "timestamp"
+    if isinstance(value, (list, dict)):
+        return "json"
+    if isinstance(value, bytes):
+        return "binary"
+    return "string"  # ObjectId, Decimal128, etc.
+
+
+def widen(a, b):
+    if a == b or b == "null":
+        return a
+    if a == "null":
+        return b
+    if a in NUMERIC_RANK and b in NUMERIC_RANK:
+        return a if NUMERIC_RANK[a] > NUMERIC_RANK[b] else b
+    return "string"
+
+
+def _as_string(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _as_float(value):
+    if value is None or isinstance(value, float):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def _as_json(value):
+    return None if value is None else json.dumps(value, default=str)
+
+
+CONVERTERS = {
+    "string": _as_string,
+    "float": _as_float,
+    "int": lambda v: None if v is None else int(v),
+    "json": _as_json,
+}
+
+
+class SchemaRegistry:
+    # Esquema aplanado (columnas "a.b.c" como json_normalize) de una colección, en config/<collection>_schema.json.
+    # Cada batch se construye con los tipos del registro: mismas columnas y tipos en todas las partes, sin inferencia por batch.
+    # Un tipo nuevo que no cabe en el registrado se ensancha (int → float → string) y se reporta como drift;
+    # types.force_string / force_number de la config fijan el tipo de esas columnas (string / float) y no se ensanchan.
+    # on_drift="fail" aborta la corrida en lugar de escribir una parte con un tipo distinto al de las anteriores.
+    def __init__(self, collection, type_config=None, path=None, on_drift="warn"):
+        if on_drift not in ("warn", "fail"):
+            raise ValueError(f"❌ Invalid schema.on_drift: {on_drift} (use 'warn' or 'fail')")
+        type_config = type_config or {}
+        self.collection = collection
+        self.path = path or f"config/{collection}_schema.json"
+        self.on_drift = on_drift
+        self.pinned = {col: "string" for col in type_config.get("force_string", [])}
+        self.pinned.update({col: "float" for col in type_config.get("force_number", [])})
+        self.columns = {}
+        self.history = []
+        self.drift = []  # cambios de esta corrida, se agregan a history al guardar
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    @classmethod
+    def from_config(cls, collection, config):
+        schema_config = config.get("schema")
+        if not schema_config:
+            return None
+        schema_config = schema_config if isinstance(schema_config, dict) else {}
+        return cls(collection, config.get("types", {}), path=schema_config.get("path"), on_drift=schema_config.get("on_drift", "warn"))
+
+    def _load(self):
+        data = self._read()
+        self.columns = dict(data.get("columns", {}))
+        self.history = data.get("drift", [])
+        for col, kind in self.pinned.items():
+            if self.columns.get(col) != kind:
+                self.columns[col] = kind
+                self._dirty = True
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    # ---------- aprendizaje ----------
+
+    def _observe(self, names, columns, context):
+        with self._lock:
+            updates, changes = {}, []
+            for name in names:
+                seen = "null"
+                for kind in {value_kind(v) for v in columns[name]}:
+                    seen = widen(seen, kind)
+                current = self.columns.get(name)
+                if current is None:
+                    updates[name] = self.pinned.get(name, seen)
+                    if seen != "null":
+                        changes.append({"column": name, "change": "added", "to": updates[name]})
+                    continue
+                if name in self.pinned:
+                    continue
+                widened = widen(current, seen)
+                if widened != current:
+                    updates[name] = widened
+                    # null → tipo no es drift: la columna solo no tenía valores todavía
+                    if current != "null":
+                        changes.append({"column": name, "change": "widened", "from": current, "to": widened})
+
+            widened = [c for c in changes if c["change"] == "widened"]
+            if widened and self.on_drift == "fail":
+                # El registro no se toca: la próxima corrida vuelve a fallar hasta que se revise el esquema
+                raise SchemaDrift(f"❌ Schema drift in {self.collection} ({context}): "
+                                  f"{[(c['column'], c['from'], c['to']) for c in widened]}")
+            if updates:
+                self.columns.update(updates)
+                self._dirty = True
+            if changes:
+                at = datetime.now(timezone.utc).isoformat()
+                for change in changes:
+                    change.update({"at": at, "context": context})
+                self.drift.extend(changes)
+                for c in widened:
+                    print(f"⚠️ Schema drift in {self.collection}.{c['column']}: {c['from']} → {c['to']} ({context})")
+                added = [c["column"] for c in changes if c["change"] == "added"]
+                if added:
+                    print(f"🆕 New columns in {self.collection} ({context}): {added[:20]}")
+            return dict(self.columns)
+
+    # ---------- construcción ----------
+
+    def _array(self, kind, values):
+        arrow_type = ARROW_TYPES[kind]
+        if kind == "null":
+            return pa.nulls(len(values))
+        if kind in ("string", "json", "float"):
+            # Conversión explícita: pa.array no acepta int/dict en una columna string
+            convert = CONVERTERS[kind]
+            return pa.array([convert(v) for v in values], type=arrow_type)
+        try:
+            return pa.array(values, type=arrow_type)
+        except ARROW_CONVERSION_ERRORS:
+            convert = CONVERTERS.get(kind)
+            if convert is None:
+                raise
+            return pa.array([convert(v) for v in values], type=arrow_type)
+
+    def record_batch(self, rows, context=""):
+        # rows: documentos ya aplanados; devuelve un RecordBatch con todas las columnas del registro
+        names, columns = [], {}
+        for row in rows:
+            for k in row:
+                if k not in columns:
+                    names.append(k)
+                    columns[k] = None
+        for name in names:
+            columns[name] = [row.get(name) for row in rows]
+
+        schema = self._observe(names, columns, context)
+        arrays, fields = [], []
+        for name, kind in schema.items():
+            values = columns.get(name)
+            arrays.append(self._array(kind, values) if values is not None else pa.nulls(len(rows), type=ARROW_TYPES[kind]))
+            fields.append(pa.field(name, ARROW_TYPES[kind]))
+        return pa.RecordBatch.from_arrays(arrays, schema=pa.schema(fields))
+
+    # ---------- persistencia ----------
+
+    def save(self):
+        # Se mezcla con lo que haya en disco (otros procesos del scan paralelo pueden haber guardado antes)
+        with self._lock:
+            if not self._dirty and not self.drift:
+                return
+            with open(f"{self.path}.lock", "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                data = self._read()
+                columns = dict(data.get("columns", {}))
+                for name, kind in self.columns.items():
+                    columns[name] = kind if name in self.pinned else widen(columns.get(name, "null"), kind)
+                history = (data.get("drift", []) + self.drift)[-MAX_DRIFT_HISTORY:]
+                data = {
+                    "collection": self.collection,
+                    "updated_at": datetime.now(timezone.utc).isoformat(),
+                    "columns": columns,
+                    "drift": history,
+                }
+                tmp = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump(data, f, indent=2)
+                os.replace(tmp, self.path)
+            self.columns = columns
+            self.history = history
+            if self.drift:
+                print(f"📐 Schema registry {self.path}: {len(self.drift)} changes recorded")
+            self.drift = []
+            self._dirty = False
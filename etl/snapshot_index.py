@@ -0,0 +1,96 @@
+import hashlib
+import json
+import time
+import bson
+import numpy as np
+from bson import ObjectId
+
+
+RECORD = 20  # 12 bytes de _id + 8 bytes de hash del contenido
+
+
+def _id_bytes(doc_id):
+    if isinstance(doc_id, ObjectId):
+        return doc_id.binary
+    return hashlib.blake2b(bson.encode({"_id": doc_id}), digest_size=12).digest()
+
+
+def _sorted_records(packed):
+    if not packed:
+        return b""
+    words = np.frombuffer(bytes(packed), dtype=">u4").reshape(-1, RECORD // 4)
+    order = np.lexsort((words[:, 2], words[:, 1], words[:, 0]))
+    return words[order].tobytes()
+
+
+class SnapshotIndex:
+    # Huella por documento (_id → hash de los bytes BSON ya proyectados) de una colección en modo replace.
+    # Se guarda como sidecar en S3, fuera del prefijo de la colección para que _delete_collection_data no lo borre.
+    def __init__(self, records, config_fingerprint, created_at=None, full_at=None):
+        self.records = records
+        self.config_fingerprint = config_fingerprint
+        self.created_at = created_at or int(time.time())
+        self.full_at = full_at or self.created_at
+
+    @staticmethod
+    def key(collection):
+        return f"_snapshots/{collection}/index.bin"
+
+    @staticmethod
+    def fingerprint(*parts):
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    @classmethod
+    def build(cls, raw_docs, config_fingerprint):
+        # raw_docs: RawBSONDocument, se hashean los bytes tal cual llegan (sin decodificar)
+        packed = bytearray()
+        for doc in raw_docs:
+            packed += _id_bytes(doc["_id"])
+            packed += hashlib.blake2b(doc.raw, digest_size=8).digest()
+        return cls(_sorted_records(packed), config_fingerprint)
+
+    @property
+    def count(self):
+        return len(self.records) // RECORD
+
+    def _as_dict(self):
+        view = memoryview(self.records)
+        return {bytes(view[i:i + 12]): bytes(view[i + 12:i + RECORD]) for i in range(0, len(view), RECORD)}
+
+    def diff(self, previous):
+        # (nuevos, cambiados, borrados) respecto al índice anterior
+        if previous.records == self.records:
+            return 0, 0, 0
+        old = previous._as_dict()
+        added = changed = 0
+        for doc_id, digest in self._as_dict().items():
+            before = old.pop(doc_id, None)
+            if before is None:
+                added += 1
+            elif before != digest:
+                changed += 1
+        return added, changed, len(old)
+
+    # ---------- S3 ----------
+
+    @classmethod
+    def load(cls, s3, bucket_name, collection):
+        try:
+            body = s3.get_object(Bucket=bucket_name, Key=cls.key(collection))["Body"].read()
+        except s3.exceptions.NoSuchKey:
+            return None
+        header, _, records = body.partition(b"\n")
+        meta = json.loads(header)
+        if meta.get("version") != 1:
+            return None
+        return cls(records, meta["config"], meta["created_at"], meta["full_at"])
+
+    def save(self, s3, bucket_name, collection):
+        header = json.dumps({
+            "version": 1,
+            "config": self.config_fingerprint,
+            "count": self.count,
+            "created_at": self.created_at,
+            "full_at": self.full_at,
+        }).encode("utf-8")
+        s3.put_object(Bucket=bucket_name, Key=self.key(collection), Body=header + b"\n" + self.records)
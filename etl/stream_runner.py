@@ -0,0 +1,124 @@
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from datetime import datetime, timezone
+
+
+# Ingesta continua por change streams (requiere replica set o cluster; en local: mongod --replSet rs0 + rs.initiate()).
+# Un proceso por colección; si uno cae se reinicia después de --restart-delay segundos retomando desde su token en S3.
+# Un stream que no se puede retomar (drop, rename, invalidate, token fuera del oplog) no se reinicia.
+#
+#   python3 etl/stream_runner.py --collections sale transactionresponse refund chargeback
+
+# Código de salida de un proceso que no se debe reiniciar (stream invalidado, token fuera del oplog, config inválida)
+EXIT_TERMINATED = 3
+
+
+def load_collections(config_path="config/collections.json"):
+    with open(config_path) as f:
+        return json.load(f).get("collections", [])
+
+
+def _stream_collection(collection, start_at):
+    from change_stream import StreamTerminated
+
+    try:
+        _run_stream(collection, start_at)
+    except (StreamTerminated, ValueError) as e:
+        print(e)
+        sys.exit(EXIT_TERMINATED)
+
+
+def _run_stream(collection, start_at):
+    from change_stream import ChangeStreamIngestor
+    from mongo_etl import MongoETLExtractor
+
+    ingestor = None
+
+    def stop(signum, frame):
+        if ingestor is not None:
+            ingestor.stop_event.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    extractor = MongoETLExtractor(
+        os.environ["MONGO_URI"],
+        os.environ.get("S3_BUCKET", "etl-riesgo-penalizaciones-data"),
+        collection,
+        datetime.now(timezone.utc).strftime("%Y-%m-%d"),
+        os.environ.get("OUTPUT_FORMAT", "parquet"),
+    )
+    if extractor.config.get("mode", "delta") != "delta":
+        raise ValueError(f"❌ '{collection}' is a replace collection, change streams only apply to delta collections")
+    ingestor = ChangeStreamIngestor(extractor)
+    try:
+        ingestor.run(start_at)
+    finally:
+        extractor._cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingesta continua de colecciones delta por change streams")
+    parser.add_argument("--collections", nargs="+", required=True, choices=load_collections())
+    parser.add_argument("--start-at", help="Sin token guardado, empieza en esta hora UTC (YYYY-MM-DDTHH:MM:SS) en lugar de ahora; debe seguir en el oplog")
+    parser.add_argument("--restart-delay", type=float, default=30, help="Segundos antes de reiniciar una colección cuyo proceso terminó con error")
+    args = parser.parse_args()
+
+    if not os.environ.get("MONGO_URI"):
+        raise ValueError("⚠️ MONGO_URI environment variable not set")
+    start_at = datetime.fromisoformat(args.start_at).replace(tzinfo=timezone.utc) if args.start_at else None
+
+    ctx = multiprocessing.get_context("spawn")  # MongoClient no es fork-safe
+    processes = {}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()  # SIGTERM: cada proceso sube su micro-batch y guarda el token
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    def launch(collection):
+        process = ctx.Process(target=_stream_collection, args=(collection, start_at), name=f"stream-{collection}")
+        process.start()
+        processes[collection] = process
+
+    for collection in args.collections:
+        launch(collection)
+
+    restart_at = {}
+    terminated = []
+    while not stopping and processes:
+        time.sleep(1)
+        for collection, process in list(processes.items()):
+            if process.is_alive() or stopping:
+                continue
+            if process.exitcode == EXIT_TERMINATED:
+                print(f"❌ Stream of {collection} cannot resume, not restarting it (see the error above)")
+                del processes[collection]
+                terminated.append(collection)
+            elif collection not in restart_at:
+                print(f"⚠️ Stream of {collection} exited with code {process.exitcode}, restarting in {args.restart_delay:.0f}s")
+                restart_at[collection] = time.monotonic() + args.restart_delay
+            elif time.monotonic() >= restart_at[collection]:
+                del restart_at[collection]
+                launch(collection)
+
+    for process in processes.values():
+        process.join()
+    print("🛑 All streams stopped")
+    if terminated:
+        sys.exit(f"❌ Streams that need a daily extraction before restarting: {', '.join(terminated)}")
+
+
+if __name__ == "__main__":
+    main()
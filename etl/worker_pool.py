@@ -0,0 +1,266 @@
+import collections
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+
+def _run_task(task, client, s3):
+    from mongo_etl import MongoETLExtractor
+
+    date_str, collection, end_date_str = task
+    extractor = MongoETLExtractor(
+        mongo_uri=os.environ["MONGO_URI"],
+        bucket_name=os.environ.get("S3_BUCKET", "etl-riesgo-penalizaciones-data"),
+        collection=collection,
+        date_str=date_str,
+        output_format=os.environ.get("OUTPUT_FORMAT", "parquet"),
+        client=client,
+        s3_client=s3,
+    )
+    if end_date_str:
+        extractor.extract_range(date_str, end_date_str)
+    else:
+        extractor.extract_and_upload()
+
+
+class _TaskPeak:
+    # Pico de RSS del proceso mientras corre una sola tarea (muestreo en un hilo). El RSS al terminar no sirve:
+    # la memoria liberada baja la lectura y la que retiene el allocator arrastra la de tareas anteriores.
+    def __init__(self, process, interval=0.5):
+        self.process = process
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def _sample(self):
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._sampler = threading.Thread(target=self._run, name="task-rss", daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._sampler.join()
+        self._sample()
+
+    @property
+    def peak_mb(self):
+        return self.peak / (1024 ** 2)
+
+
+def _worker_main(worker_id, tasks, results, max_tasks, max_rss_mb):
+    # Proceso de larga vida: imports, MongoClient (pool de conexiones) y cliente S3 se crean una sola vez
+    import boto3
+    import psutil
+    import pymongo
+
+    # El cliente se comparte entre colecciones: la compresión de red (read.compressors) se toma de MONGO_COMPRESSORS
+    compressors = os.environ.get("MONGO_COMPRESSORS")
+    client = pymongo.MongoClient(os.environ["MONGO_URI"], **({"compressors": compressors} if compressors else {}))
+    client.server_info()
+    s3 = boto3.client("s3")
+    process = psutil.Process()
+    print(f"👷 Worker {worker_id} ready (pid {os.getpid()})")
+
+    done = 0
+    try:
+        while True:
+            item = tasks.get()
+            if item is None:
+                break
+            task_id, task = item
+            results.put(("start", worker_id, task_id, None))
+            error = None
+            try:
+                with _TaskPeak(process) as task_peak:
+                    _run_task(task, client, s3)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            results.put(("done", worker_id, task_id, error))
+
+            # Reciclado: el proceso se reemplaza para devolver la memoria al sistema. Se compara el pico de esta tarea
+            done += 1
+            if done >= max_tasks or (max_rss_mb and task_peak.peak_mb > max_rss_mb):
+                print(f"♻️ Worker {worker_id} retiring after {done} tasks (task peak RSS {task_peak.peak_mb:.0f} MB)")
+                break
+    finally:
+        client.close()
+    results.put(("retire", worker_id, None, None))
+
+
+class WarmWorkerPool:
+    # Pool de procesos que toman tareas (día, colección, fin). Cada worker tiene su propia cola y el pool le asigna
+    # una tarea a la vez, así siempre se sabe qué tarea tiene cada uno: si muere antes de empezarla vuelve a la cola,
+    # si muere con la tarea empezada la tarea falla.
+    # run_task() es bloqueante y thread-safe, así el CostScheduler lo usa igual que un subprocess por tarea.
+    # Un worker se recicla después de max_tasks tareas o si el pico de RSS de su última tarea pasa de max_rss_mb.
+    def __init__(self, processes, max_tasks=20, max_rss_mb=2048):
+        self.processes = max(int(processes), 1)
+        self.max_tasks = max(int(max_tasks), 1)
+        self.max_rss_mb = max_rss_mb
+        self._ctx = multiprocessing.get_context("spawn")  # MongoClient no es fork-safe
+        self._results = self._ctx.Queue()
+        self._workers = {}
+        self._tasks = {}  # worker_id → cola de tareas del worker
+        self._pending = collections.deque()  # (task_id, task) sin asignar
+        self._idle = collections.deque()  # worker_ids sin tarea asignada
+        self._assigned = {}  # worker_id → [task_id, task, empezada]
+        self._waiting = {}  # task_id → [Event, error]
+        self._ids = itertools.count()
+        self._worker_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._failed_starts = 0
+        self._broken = None
+        self._monitor = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self):
+        for _ in range(self.processes):
+            self._spawn()
+        self._monitor = threading.Thread(target=self._watch, name="warm-pool-monitor", daemon=True)
+        self._monitor.start()
+
+    def _spawn(self):
+        worker_id = next(self._worker_ids)
+        tasks = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, tasks, self._results, self.max_tasks, self.max_rss_mb),
+            name=f"etl-worker-{worker_id}",
+        )
+        process.start()
+        with self._lock:
+            self._workers[worker_id] = process
+            self._tasks[worker_id] = tasks
+            self._idle.append(worker_id)
+        self._dispatch()
+
+    def _dispatch(self):
+        with self._lock:
+            while self._pending and self._idle and not self._closed:
+                worker_id = self._idle.popleft()
+                if worker_id not in self._workers:
+                    continue
+                task_id, task = self._pending.popleft()
+                self._assigned[worker_id] = [task_id, task, False]
+                self._tasks[worker_id].put((task_id, task))
+
+    def run_task(self, task):
+        task_id = next(self._ids)
+        slot = [threading.Event(), None]
+        with self._lock:
+            if self._broken:
+                raise RuntimeError(self._broken)
+            self._waiting[task_id] = slot
+            self._pending.append((task_id, task))
+        self._dispatch()
+        slot[0].wait()
+        if slot[1]:
+            raise RuntimeError(slot[1])
+
+    def _finish(self, task_id, error):
+        with self._lock:
+            slot = self._waiting.pop(task_id, None)
+        if slot is not None:
+            slot[1] = error
+            slot[0].set()
+
+    def _remove(self, worker_id):
+        # Saca al worker del pool; su tarea asignada sin empezar vuelve al frente de la cola.
+        # Devuelve el proceso y la tarea que sí había empezado (o None)
+        with self._lock:
+            process = self._workers.pop(worker_id, None)
+            self._tasks.pop(worker_id, None)
+            assigned = self._assigned.pop(worker_id, None)
+            if assigned is not None and not assigned[2]:
+                self._pending.appendleft((assigned[0], assigned[1]))
+                assigned = None
+        return process, assigned
+
+    def _watch(self):
+        while not self._closed:
+            try:
+                kind, worker_id, task_id, error = self._results.get(timeout=1)
+            except queue.Empty:
+                self._reap()
+                continue
+            if kind == "start":
+                with self._lock:
+                    self._failed_starts = 0
+                    if worker_id in self._assigned:
+                        self._assigned[worker_id][2] = True
+            elif kind == "done":
+                with self._lock:
+                    self._assigned.pop(worker_id, None)
+                    if worker_id in self._workers:
+                        self._idle.append(worker_id)
+                self._finish(task_id, error)
+                self._dispatch()
+            elif kind == "retire":
+                # Puede tener asignada una tarea que ya no va a leer: _remove la devuelve a la cola
+                process, _ = self._remove(worker_id)
+                if process is not None:
+                    process.join()
+                if not self._closed:
+                    self._spawn()
+
+    def _reap(self):
+        # Un worker que muere sin avisar (OOM kill, segfault) falla la tarea que había empezado y se reemplaza;
+        # si todavía no la había empezado, la tarea pasa a otro worker
+        for worker_id, process in list(self._workers.items()):
+            if process.is_alive():
+                continue
+            _, started = self._remove(worker_id)
+            print(f"💥 Worker {worker_id} died (exit code {process.exitcode})")
+            if started is not None:
+                self._finish(started[0], f"worker {worker_id} died with exit code {process.exitcode}")
+            else:
+                self._failed_starts += 1
+            if self._failed_starts >= self.processes * 3:
+                # Los workers mueren antes de tomar tareas (ej. Mongo inaccesible): se cortan las tareas pendientes
+                self._fail_all(f"workers keep dying before taking a task (last exit code {process.exitcode})")
+                return
+            if not self._closed:
+                self._spawn()
+
+    def _fail_all(self, reason):
+        print(f"❌ {reason}")
+        with self._lock:
+            self._broken = reason
+            self._pending.clear()
+            waiting = list(self._waiting)
+        for task_id in waiting:
+            self._finish(task_id, reason)
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers.values())
+            inboxes = list(self._tasks.values())
+        for tasks in inboxes:
+            tasks.put(None)
+        deadline = time.time() + 30
+        for process in workers:
+            process.join(timeout=max(deadline - time.time(), 0))
+            if process.is_alive():
+                process.terminate()
+        if self._monitor is not None:
+            self._monitor.join()
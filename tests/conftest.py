@@ -0,0 +1,82 @@
+import json
+import os
+import sys
+
+import pytest
+
+
+# Las pruebas corren contra stand-ins locales: mongomock para Mongo y moto para S3 (requirements-test.txt).
+# Los módulos de etl/ se importan planos, igual que cuando se ejecutan los scripts.
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "etl"))
+
+BUCKET = "etl-test"
+DAY = "2025-01-15"
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # config/, historial, métricas y caché de referencias en un directorio temporal por prueba
+    (tmp_path / "config").mkdir()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("ETL_METRICS_FILE", str(tmp_path / "metrics.jsonl"))
+    monkeypatch.setenv("ETL_HISTORY_DB", str(tmp_path / "history.db"))
+    monkeypatch.setenv("REFERENCE_CACHE_DIR", str(tmp_path / "reference_cache"))
+    monkeypatch.setenv("ETL_RESUME", "0")
+    monkeypatch.delenv("ETL_CHECKPOINTS", raising=False)
+    return tmp_path
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    moto = pytest.importorskip("moto")
+    import boto3
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_SESSION_TOKEN"):
+        monkeypatch.setenv(name, "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+@pytest.fixture
+def mongo():
+    mongomock = pytest.importorskip("mongomock")
+    return mongomock.MongoClient()
+
+
+def write_config(collection, overrides=None, drop=("parallel_scan", "change_detection")):
+    # Config real de la colección con overrides; sin scan paralelo (mongomock no se comparte entre procesos)
+    with open(os.path.join(REPO_ROOT, "config", f"{collection}_config.json")) as f:
+        config = json.load(f)
+    for key in drop:
+        config.pop(key, None)
+    config.update(overrides or {})
+    with open(os.path.join("config", f"{collection}_config.json"), "w") as f:
+        json.dump(config, f)
+    return config
+
+
+def load_docs(mongo, collection, count, seed=42):
+    import bench_data
+    data = bench_data.generate(collection, count, DAY, seed)
+    for name, docs in data.items():
+        mongo["EtominTransactions"][name].insert_many(docs)
+    return data
+
+
+def list_keys(s3, prefix=""):
+    keys = []
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=BUCKET, Prefix=prefix):
+        keys.extend(obj["Key"] for obj in page.get("Contents", []))
+    return sorted(keys)
+
+
+@pytest.fixture
+def make_extractor(workdir, s3, mongo):
+    def make(collection, overrides=None, output_format="parquet", date_str=DAY):
+        from mongo_etl import MongoETLExtractor
+        write_config(collection, overrides)
+        return MongoETLExtractor("mongodb://test", BUCKET, collection, date_str, output_format, client=mongo, s3_client=s3)
+    return make
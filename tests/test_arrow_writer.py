@@ -0,0 +1,71 @@
+import io
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from bson import ObjectId
+
+from arrow_writer import ArrowParquetWriter
+from conftest import BUCKET, DAY, list_keys, load_docs
+
+PREFIX = "sale/day=15-01-2025/data"
+
+
+def _read(s3, key):
+    return pq.ParquetFile(io.BytesIO(s3.get_object(Bucket=BUCKET, Key=key)["Body"].read()))
+
+
+def _is_text(arrow_type):
+    return pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)
+
+
+def _docs(count, start=0, **extra):
+    return [{"_id": ObjectId(), "n": start + i, "when": datetime(2025, 1, 15, 10, i % 60, tzinfo=timezone.utc), **extra}
+            for i in range(count)]
+
+
+def test_each_batch_becomes_a_row_group_of_one_file(s3):
+    writer = ArrowParquetWriter(s3, BUCKET, PREFIX)
+    for i in range(3):
+        writer.write_documents(_docs(10, start=i * 10))
+    assert writer.close() == [f"{PREFIX}_part1.parquet"]
+
+    parquet = _read(s3, f"{PREFIX}_part1.parquet")
+    assert parquet.metadata.num_row_groups == 3
+    assert parquet.read().column("n").to_pylist() == list(range(30))
+    assert writer.files[0]["rows"] == 30
+
+
+def test_an_incompatible_batch_rolls_to_the_next_part(s3):
+    writer = ArrowParquetWriter(s3, BUCKET, PREFIX)
+    writer.write_documents(_docs(5, amount=10))
+    writer.write_documents(_docs(5, amount="diez"))
+    writer.write_documents(_docs(5, amount="once"))
+    assert writer.close() == [f"{PREFIX}_part1.parquet", f"{PREFIX}_part2.parquet"]
+
+    first, second = (_read(s3, k).read() for k in writer.uploaded_keys)
+    assert pa.types.is_integer(first.schema.field("amount").type)
+    assert pa.types.is_string(second.schema.field("amount").type) and second.num_rows == 10
+    assert [f["rows"] for f in writer.files] == [5, 10]
+
+
+def test_abort_leaves_no_object(s3):
+    writer = ArrowParquetWriter(s3, BUCKET, PREFIX)
+    writer.write_documents(_docs(10))
+    writer.abort()
+    assert list_keys(s3, "sale/") == []
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
+
+
+def test_arrow_and_pandas_writers_store_the_same_column_types(make_extractor, mongo, s3):
+    load_docs(mongo, "sale", 50)
+    mongo["EtominTransactions"]["sale"].update_many({}, {"$set": {"settledAt": datetime(2025, 1, 15, 12, 30)}})
+    types = {}
+    for writer in ("pandas", "arrow"):
+        make_extractor("sale", {"batch_size": 100, "parquet_writer": writer})._extract_day(DAY)
+        (key,) = list_keys(s3, "sale/day=15-01-2025/")
+        table = _read(s3, key).read()
+        types[writer] = {name: _is_text(table.schema.field(name).type) for name in ("_id", "settledAt")}
+        assert table.column("settledAt")[0].as_py() == "2025-01-15T12:30:00"
+        s3.delete_object(Bucket=BUCKET, Key=key)
+    assert types["pandas"] == types["arrow"] == {"_id": True, "settledAt": True}
@@ -0,0 +1,59 @@
+import bson
+from bson.raw_bson import RawBSONDocument
+
+from batching import ByteBudgetBatcher, FixedBatcher
+from s3_sink import MB
+
+
+def test_raw_documents_are_measured_exactly():
+    raw = RawBSONDocument(bson.encode({"_id": 1, "payload": "x" * 1000}))
+    assert ByteBudgetBatcher().doc_size(raw) == len(raw.raw)
+    assert FixedBatcher(10).doc_size(raw) == len(raw.raw)
+
+
+def test_decoded_documents_are_estimated_from_the_first_one(monkeypatch):
+    import batching
+    batcher = ByteBudgetBatcher()
+    small, big = {"v": "x" * 100}, {"v": "x" * 10000}
+    first = batcher.doc_size(small)
+    assert first == len(bson.encode(small))
+    # Después del primero no se vuelve a codificar ningún documento
+    monkeypatch.setattr(batching.bson, "encode", lambda doc: (_ for _ in ()).throw(AssertionError("encoded again")))
+    assert [batcher.doc_size(big) for _ in range(100)] == [first] * 100
+
+
+def test_defaults_keep_a_few_megabytes_per_batch():
+    batcher = ByteBudgetBatcher.from_config({})
+    assert batcher.target_part_bytes <= 8 * MB and batcher.max_batch_bytes <= 16 * MB
+
+
+def test_byte_budget_is_opt_in(make_extractor):
+    assert isinstance(make_extractor("sale").batcher, FixedBatcher)
+    assert make_extractor("sale").batcher.batch_size == 1000
+    assert isinstance(make_extractor("sale", {"batching": {}}).batcher, ByteBudgetBatcher)
+    assert isinstance(make_extractor("sale", {"batching": {}, "batch_size": 10}).batcher, FixedBatcher)
+
+
+def test_a_batch_closes_at_the_target_part_size():
+    batcher = ByteBudgetBatcher(target_part_bytes=10 * MB, max_batch_bytes=100 * MB, min_docs=10, initial_ratio=0.5)
+    assert not batcher.is_full(1000, 19 * MB)
+    assert batcher.is_full(1000, 20 * MB)
+    # Por debajo de min_docs no se cierra por tamaño estimado, solo por los topes duros
+    assert not batcher.is_full(5, 50 * MB)
+    assert batcher.is_full(5, 100 * MB)
+    assert ByteBudgetBatcher(max_docs=100).is_full(100, 0)
+
+
+def test_the_ratio_follows_the_observed_parts():
+    batcher = ByteBudgetBatcher(target_part_bytes=10 * MB, max_batch_bytes=100 * MB, initial_ratio=0.5, smoothing=0.5, min_docs=1)
+    batcher.observe(40 * MB, 4 * MB)
+    assert batcher.ratio == 0.3
+    batcher.observe(0, 1)
+    assert batcher.ratio == 0.3
+    assert not batcher.is_full(10, 30 * MB)
+    assert batcher.is_full(10, 34 * MB)
+
+
+def test_from_config_reads_megabytes():
+    batcher = ByteBudgetBatcher.from_config({"target_part_mb": 16, "max_batch_mb": 48, "min_docs": 5, "max_docs": 50})
+    assert (batcher.target_part_bytes, batcher.max_batch_bytes, batcher.min_docs, batcher.max_docs) == (16 * MB, 48 * MB, 5, 50)
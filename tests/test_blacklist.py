@@ -0,0 +1,66 @@
+import copy
+
+import pytest
+
+from blacklist import CompiledBlacklist
+
+PATHS = ["card.number", "items.secret", "items.0.sku", "meta.$raw"]
+
+
+def _doc():
+    return {
+        "_id": 1,
+        "card": {"number": "4111", "brand": "visa"},
+        "items": [{"sku": "a", "secret": 1}, {"sku": "b", "secret": 2, "tags": [{"secret": 3, "k": "v"}]}],
+        "meta": {"$raw": "x", "source": "pos"},
+    }
+
+
+def _legacy_strip(doc, paths):
+    # _sanitize_document antes de compilar el blacklist: no entraba a los arreglos
+    for field in paths:
+        keys = field.split(".")
+        d = doc
+        for k in keys[:-1]:
+            d = d.get(k, {})
+            if not isinstance(d, dict):
+                d = {}
+                break
+        if isinstance(d, dict):
+            d.pop(keys[-1], None)
+    return doc
+
+
+def test_paths_are_split_between_projection_and_residual():
+    blacklist = CompiledBlacklist(PATHS + ["card.number.last4"])
+    assert blacklist.projection == {"card.number": 0, "items.secret": 0}
+    assert blacklist.residual == ["meta.$raw", "items.0.sku"]
+
+
+def test_pushdown_and_python_strip_give_the_same_document():
+    mongomock = pytest.importorskip("mongomock")
+    collection = mongomock.MongoClient().db.items
+    collection.insert_one(_doc())
+
+    pushed = CompiledBlacklist(PATHS)
+    in_python = CompiledBlacklist(PATHS, pushdown=False)
+    assert in_python.projection is None
+
+    assert pushed.strip(collection.find_one({}, pushed.projection)) == in_python.strip(collection.find_one({}))
+
+
+def test_arrays_of_subdocuments_are_stripped_unlike_the_old_sanitizer():
+    stripped = CompiledBlacklist(PATHS, pushdown=False).strip(_doc())
+    legacy = _legacy_strip(_doc(), PATHS)
+
+    # Fuera de los arreglos el resultado es el de antes
+    assert stripped["card"] == legacy["card"] == {"brand": "visa"}
+    assert stripped["meta"] == legacy["meta"] == {"source": "pos"}
+    # Dentro de los arreglos el sanitizer viejo dejaba los campos; ahora se eliminan como en la proyección de Mongo
+    assert legacy["items"] == _doc()["items"]
+    assert stripped["items"] == [{}, {"sku": "b", "tags": [{"secret": 3, "k": "v"}]}]
+
+
+def test_strip_leaves_documents_without_the_paths_untouched():
+    doc = {"_id": 2, "items": "not-an-array", "card": None}
+    assert CompiledBlacklist(PATHS, pushdown=False).strip(copy.deepcopy(doc)) == doc
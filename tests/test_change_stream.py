@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from change_stream import ChangeStreamIngestor, StreamState, StreamTerminated
+from conftest import BUCKET, DAY, list_keys, load_docs
+
+DAY_PREFIX = "sale/day=15-01-2025/"
+
+
+class FakeStream:
+    def __init__(self, changes):
+        self.changes = list(changes)
+        self.resume_token = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def try_next(self):
+        if not self.changes:
+            return None
+        change = self.changes.pop(0)
+        self.resume_token = change["_id"]
+        return change
+
+
+class WatchRecorder:
+    def watch(self, pipeline, **options):
+        self.options = options
+        return FakeStream([])
+
+
+def _changes(docs, first=1):
+    return [{"_id": {"_data": f"{first + i:04d}"}, "operationType": "update", "fullDocument": doc} for i, doc in enumerate(docs)]
+
+
+def _day_docs(extractor, docs):
+    start_ms, end_ms = extractor._day_window(DAY)[1:]
+    return [d for d in docs if start_ms <= d["updatedAt"] < end_ms]
+
+
+def test_flush_saves_the_token_and_a_new_process_resumes_from_it(make_extractor, mongo, s3, monkeypatch):
+    data = load_docs(mongo, "sale", 50)
+    extractor = make_extractor("sale", {"batch_size": 1000})
+    ingestor = ChangeStreamIngestor(extractor)
+    for change in _changes(_day_docs(extractor, data["sale"])[:5]):
+        ingestor._add(change)
+    ingestor._flush({"_data": "0005"})
+
+    state = StreamState(s3, BUCKET, "sale").load()
+    assert state.token == {"_data": "0005"}
+    assert state.data["seq"] == 1 and state.data["pending"] is None and state.data["docs"] == 5
+    assert [k.rsplit("/", 1)[1] for k in list_keys(s3, DAY_PREFIX)] == ["stream_0000000001_part1.parquet"]
+
+    resumed = ChangeStreamIngestor(make_extractor("sale", {"batch_size": 1000}))
+    watched = WatchRecorder()
+    monkeypatch.setattr(resumed.extractor.read_profile, "collection", lambda db, name: watched)
+    resumed.stop_event.set()
+    resumed.run()
+    assert watched.options["resume_after"] == {"_data": "0005"}
+
+
+def test_an_interrupted_batch_is_removed_and_replayed(make_extractor, s3):
+    extractor = make_extractor("sale")
+    state = StreamState(s3, BUCKET, "sale")
+    state.token = {"_data": "0005"}
+    state.data.update({"seq": 1, "pending": {"seq": 2, "days": [DAY]}})
+    state.save()
+    s3.put_object(Bucket=BUCKET, Key=f"{DAY_PREFIX}stream_0000000002_part1.parquet", Body=b"partial")
+
+    ingestor = ChangeStreamIngestor(extractor)
+    ingestor.state.load()
+    ingestor._recover_pending()
+
+    assert list_keys(s3, DAY_PREFIX) == []
+    state = StreamState(s3, BUCKET, "sale").load()
+    assert state.data["pending"] is None and state.token == {"_data": "0005"}
+
+
+def test_invalidate_stops_the_stream(make_extractor, mongo, s3, monkeypatch):
+    data = load_docs(mongo, "sale", 50)
+    extractor = make_extractor("sale", {"batch_size": 1000})
+    ingestor = ChangeStreamIngestor(extractor)
+    changes = _changes(_day_docs(extractor, data["sale"])[:3])
+    changes.append({"_id": {"_data": "0004"}, "operationType": "invalidate"})
+    monkeypatch.setattr(ingestor, "_watch", lambda start_at=None: FakeStream(changes))
+
+    with pytest.raises(StreamTerminated, match="invalidate"):
+        ingestor.run()
+
+    # Lo leído antes del invalidate queda subido
+    assert StreamState(s3, BUCKET, "sale").load().data["docs"] == 3
+
+
+def test_the_daily_extraction_supersedes_older_stream_parts(make_extractor, mongo, s3):
+    load_docs(mongo, "sale", 100)
+    s3.put_object(Bucket=BUCKET, Key=f"{DAY_PREFIX}stream_0000000001_part1.parquet", Body=b"old")
+    extractor = make_extractor("sale", {"batch_size": 50})
+
+    extractor._extract_day(DAY)
+
+    keys = list_keys(s3, DAY_PREFIX)
+    assert keys and not any("/stream_" in k for k in keys)
+
+
+def test_stream_parts_uploaded_after_the_daily_run_started_are_kept(make_extractor, s3):
+    key = f"{DAY_PREFIX}stream_0000000002_part1.parquet"
+    s3.put_object(Bucket=BUCKET, Key=key, Body=b"new")
+    make_extractor("sale")._supersede_stream_parts(DAY, datetime.now(timezone.utc) - timedelta(minutes=5))
+    assert list_keys(s3, DAY_PREFIX) == [key]
+
+
+def test_a_terminated_stream_exits_with_the_no_restart_code(monkeypatch):
+    import stream_runner
+
+    def terminated(collection, start_at):
+        raise StreamTerminated("❌ Change stream of sale ended by 'invalidate'")
+
+    monkeypatch.setattr(stream_runner, "_run_stream", terminated)
+    with pytest.raises(SystemExit) as exit_info:
+        stream_runner._stream_collection("sale", None)
+    assert exit_info.value.code == stream_runner.EXIT_TERMINATED
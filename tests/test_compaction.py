@@ -0,0 +1,113 @@
+import io
+
+import pyarrow.parquet as pq
+import pytest
+
+import compaction
+from compaction import DayCompactor
+from conftest import BUCKET, DAY, list_keys, load_docs
+from run_manifest import DayManifest
+
+DAY_PREFIX = "sale/day=15-01-2025/"
+STATE_KEY = "_manifests/sale/day=15-01-2025/compaction.json"
+
+
+def _extracted_day(make_extractor, mongo):
+    load_docs(mongo, "sale", 300)
+    extractor = make_extractor("sale", {"batch_size": 20})
+    count = extractor._extract_day(DAY)
+    return count, list_keys(extractor.s3, DAY_PREFIX)
+
+
+def _rows(s3, keys):
+    return sorted(i for k in keys for i in pq.read_table(io.BytesIO(s3.get_object(Bucket=BUCKET, Key=k)["Body"].read())).column("_id").to_pylist())
+
+
+def test_compaction_swaps_the_manifest_and_removes_the_old_parts(make_extractor, mongo, s3):
+    count, old_keys = _extracted_day(make_extractor, mongo)
+    before = _rows(s3, old_keys)
+
+    result = DayCompactor(s3, BUCKET, "sale").compact_day(DAY)
+
+    keys = list_keys(s3, DAY_PREFIX)
+    assert result["status"] == "compacted" and result["files"] == len(old_keys)
+    assert all("/data_c" in k for k in keys)
+    assert DayManifest(s3, BUCKET, "sale", DAY).load().part_keys() == keys
+    assert _rows(s3, keys) == before and len(before) == count
+    assert list_keys(s3, STATE_KEY) == []
+
+
+def test_new_files_stay_out_of_the_day_prefix_until_they_are_promoted(make_extractor, mongo, s3, monkeypatch):
+    _, old_keys = _extracted_day(make_extractor, mongo)
+    promote = DayCompactor._promote
+    seen = {}
+
+    def inspect(self, prefix, files):
+        visible = [k for k in list_keys(s3, DAY_PREFIX) if "/" not in k[len(DAY_PREFIX):]]
+        seen["visible"], seen["staged"] = visible, [f["key"] for f in files]
+        return promote(self, prefix, files)
+
+    monkeypatch.setattr(DayCompactor, "_promote", inspect)
+    DayCompactor(s3, BUCKET, "sale").compact_day(DAY)
+
+    assert seen["visible"] == old_keys
+    assert all(k.startswith(f"{DAY_PREFIX}_compaction/") for k in seen["staged"])
+    assert not list_keys(s3, f"{DAY_PREFIX}_compaction/")
+
+
+@pytest.mark.parametrize("state", ["writing", "promoting"])
+def test_an_interrupted_compaction_is_rolled_back_on_the_next_run(make_extractor, mongo, s3, state):
+    _, old_keys = _extracted_day(make_extractor, mongo)
+    leftovers = [f"{DAY_PREFIX}_compaction/c20250101000000/data_c20250101000000_part1.parquet",
+                 f"{DAY_PREFIX}data_c20250101000000_part1.parquet"]
+    for key in leftovers[:1 if state == "writing" else 2]:
+        s3.put_object(Bucket=BUCKET, Key=key, Body=b"half written")
+    s3.put_object(Bucket=BUCKET, Key=STATE_KEY,
+                  Body=('{"day": "2025-01-15", "state": "%s", "generation": "20250101000000", "old": [], "new": []}' % state).encode())
+
+    DayCompactor(s3, BUCKET, "sale", dry_run=True).compact_day(DAY)
+    assert leftovers[0] in list_keys(s3, DAY_PREFIX)  # --dry-run no toca nada
+
+    DayCompactor(s3, BUCKET, "sale").compact_day(DAY)
+
+    keys = list_keys(s3, DAY_PREFIX)
+    assert not set(leftovers) & set(keys) and not set(old_keys) & set(keys)
+    assert DayManifest(s3, BUCKET, "sale", DAY).load().part_keys() == keys
+
+
+def test_stream_parts_are_left_for_the_daily_run_to_supersede(make_extractor, mongo, s3):
+    _, old_keys = _extracted_day(make_extractor, mongo)
+    stream_key = f"{DAY_PREFIX}stream_0000000001_part1.parquet"
+    s3.copy_object(Bucket=BUCKET, Key=stream_key, CopySource={"Bucket": BUCKET, "Key": old_keys[0]})
+
+    result = DayCompactor(s3, BUCKET, "sale").compact_day(DAY)
+
+    assert result["files"] == len(old_keys)
+    assert stream_key in list_keys(s3, DAY_PREFIX)
+
+
+def test_an_interrupted_delete_is_finished_on_the_next_run(make_extractor, mongo, s3):
+    _, old_keys = _extracted_day(make_extractor, mongo)
+    s3.put_object(Bucket=BUCKET, Key=STATE_KEY,
+                  Body=('{"day": "2025-01-15", "state": "committed", "generation": "1", "old": ["%s"], "new": []}' % old_keys[0]).encode())
+
+    DayCompactor(s3, BUCKET, "sale", min_files=1000).compact_day(DAY)
+
+    assert list_keys(s3, DAY_PREFIX) == old_keys[1:]
+    assert list_keys(s3, STATE_KEY) == []
+
+
+def test_a_failed_write_keeps_the_old_parts(make_extractor, mongo, s3, monkeypatch):
+    _, old_keys = _extracted_day(make_extractor, mongo)
+    manifest_keys = DayManifest(s3, BUCKET, "sale", DAY).load().part_keys()
+
+    def mismatch(keys, rows_in, files):
+        raise RuntimeError("row mismatch")
+
+    monkeypatch.setattr(compaction, "_check_rows", mismatch)
+    with pytest.raises(RuntimeError, match="row mismatch"):
+        DayCompactor(s3, BUCKET, "sale").compact_day(DAY)
+
+    assert list_keys(s3, DAY_PREFIX) == old_keys
+    assert DayManifest(s3, BUCKET, "sale", DAY).load().part_keys() == manifest_keys
+    assert list_keys(s3, STATE_KEY) == []
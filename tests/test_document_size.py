@@ -0,0 +1,27 @@
+import io
+
+import pyarrow.parquet as pq
+
+from conftest import BUCKET, DAY, list_keys, load_docs
+
+
+def test_oversized_documents_are_skipped_without_raw_bson(make_extractor, mongo, s3):
+    data = load_docs(mongo, "sale", 100)
+    extractor = make_extractor("sale", {"batch_size": 50, "max_document_mb": 0.02})
+    start_ms, end_ms = extractor._day_window(DAY)[1:]
+    in_window = [d["_id"] for d in data["sale"] if start_ms <= d["updatedAt"] < end_ms]
+    big = in_window[0]
+    mongo["EtominTransactions"]["sale"].update_one({"_id": big}, {"$set": {"notes": "x" * 40000}})
+
+    count = extractor._extract_day(DAY)
+
+    ids = []
+    for key in list_keys(s3, "sale/day=15-01-2025/"):
+        ids.extend(pq.read_table(io.BytesIO(s3.get_object(Bucket=BUCKET, Key=key)["Body"].read())).column("_id").to_pylist())
+    assert count == len(in_window) - 1
+    assert sorted(ids) == sorted(str(i) for i in in_window[1:])
+
+
+def test_the_default_limit_does_not_re_encode_decoded_documents(make_extractor):
+    assert not make_extractor("sale")._encode_to_measure
+    assert make_extractor("sale", {"max_document_mb": 4})._encode_to_measure
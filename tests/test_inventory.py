@@ -0,0 +1,57 @@
+from conftest import BUCKET
+from run_manifest import DayManifest
+from inventory import CollectionIndex, day_entry
+from review_dates import find_gaps
+
+
+def _entry(parquet=1, json=0, status="complete"):
+    keys = [f"data_part{i}.parquet" for i in range(parquet)] + [f"data_part{i}.json.gz" for i in range(json)]
+    return day_entry(keys, 100, status)
+
+
+def test_find_gaps_flags_missing_incomplete_and_json_only_days():
+    days = {
+        "2025-01-01": _entry(),
+        "2025-01-02": _entry(parquet=0, json=2),
+        "2025-01-04": _entry(status="in_progress"),
+        "2025-01-05": _entry(parquet=0),
+        "2025-01-06": _entry(status="unknown"),
+    }
+    assert find_gaps(days) == {
+        "missing": ["2025-01-03", "2025-01-05"],
+        "without_parquet": ["2025-01-02"],
+        "incomplete": ["2025-01-04"],
+    }
+
+
+def test_find_gaps_uses_the_requested_range():
+    days = {"2025-01-02": _entry()}
+    assert find_gaps(days, "2025-01-01", "2025-01-03")["missing"] == ["2025-01-01", "2025-01-03"]
+    assert find_gaps({}, "2025-01-01", "2025-01-02")["missing"] == ["2025-01-01", "2025-01-02"]
+    assert find_gaps({}) == {"missing": [], "without_parquet": [], "incomplete": []}
+
+
+def test_rebuild_lists_each_day_prefix(s3):
+    for key in ("sale/day=01-01-2025/data_part1.parquet", "sale/day=01-01-2025/data_part1.json",
+                "sale/day=03-01-2025/stream_0000000001_part1.parquet"):
+        s3.put_object(Bucket=BUCKET, Key=key, Body=b"1234")
+
+    days = CollectionIndex(s3, BUCKET, "sale").rebuild(workers=2)["days"]
+
+    assert sorted(days) == ["2025-01-01", "2025-01-03"]
+    assert (days["2025-01-01"]["parquet"], days["2025-01-01"]["json"], days["2025-01-01"]["bytes"]) == (1, 1, 8)
+    assert days["2025-01-03"]["status"] == "unknown" and days["2025-01-03"]["source"] == "listing"
+    assert find_gaps(days)["missing"] == ["2025-01-02"]
+
+
+def test_rebuild_only_counts_what_the_manifest_references(s3):
+    prefix = "sale/day=01-01-2025/"
+    referenced = f"{prefix}data_part1.parquet"
+    for key in (referenced, f"{prefix}data_c20250101000000_part1.parquet", f"{prefix}stream_0000000001_part1.parquet",
+                f"{prefix}_compaction/c20250101000000/data_c20250101000000_part1.parquet"):
+        s3.put_object(Bucket=BUCKET, Key=key, Body=b"1234")
+    DayManifest(s3, BUCKET, "sale", "2025-01-01").record_part([referenced], 1, 4, batch_index=0, last_id="a")
+
+    entry = CollectionIndex(s3, BUCKET, "sale").rebuild()["days"]["2025-01-01"]
+
+    assert (entry["files"], entry["bytes"]) == (2, 8)
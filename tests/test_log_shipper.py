@@ -0,0 +1,114 @@
+import json
+import os
+
+from log_shipper import EVENT_OVERHEAD, MAX_BATCH_BYTES, MAX_BATCH_EVENTS, MAX_EVENT_BYTES, CloudWatchLogShipper
+
+
+class FakeLogs:
+    def __init__(self):
+        self.batches = []
+
+    def create_log_stream(self, **kwargs):
+        pass
+
+    def put_log_events(self, logEvents, **kwargs):
+        self.batches.append(list(logEvents))
+        return {"nextSequenceToken": str(len(self.batches))}
+
+
+def _shipper(logs=None, **kwargs):
+    return CloudWatchLogShipper(logs or FakeLogs(), "etl", "test", flush_interval=0.05, **kwargs)
+
+
+def _batch_bytes(batch):
+    return sum(len(e["message"].encode("utf-8")) + EVENT_OVERHEAD for e in batch)
+
+
+def test_batches_stay_within_the_put_log_events_limits():
+    logs = FakeLogs()
+    shipper = _shipper(logs, max_buffer=100000)
+    for i in range(MAX_BATCH_EVENTS + 500):
+        shipper.log(f"event {i}", timestamp=1000 + i)
+    for i in range(10):
+        shipper.log("x" * 200000, timestamp=2000000 + i)
+    shipper.log("y" * (MAX_EVENT_BYTES + 100), timestamp=3000000)
+
+    shipper.start()
+    shipper.close()
+
+    assert sum(len(b) for b in logs.batches) == MAX_BATCH_EVENTS + 511
+    assert all(len(b) <= MAX_BATCH_EVENTS and _batch_bytes(b) <= MAX_BATCH_BYTES for b in logs.batches)
+    assert len(logs.batches[-1][-1]["message"]) == MAX_EVENT_BYTES
+
+
+def test_a_full_queue_spills_to_a_per_process_file(tmp_path):
+    shipper = _shipper(max_buffer=10, spill_path=str(tmp_path / "spill.jsonl"))
+    for i in range(15):
+        shipper.log(f"event {i}", timestamp=i)
+
+    assert shipper.spill_path == f"{tmp_path / 'spill.jsonl'}.{os.getpid()}"
+    with open(shipper.spill_path) as f:
+        assert [json.loads(line)["message"] for line in f] == [f"event {i}" for i in range(10, 15)]
+    assert shipper.spilled == 5 and shipper.dropped == 0
+
+
+def test_reload_only_fills_the_free_space_of_the_queue(tmp_path):
+    shipper = _shipper(max_buffer=10, spill_path=str(tmp_path / "spill.jsonl"))
+    for i in range(15):
+        shipper.log(f"event {i}", timestamp=i)
+    for _ in range(3):
+        shipper._buffer.popleft()
+
+    assert shipper._reload_spill()
+
+    assert len(shipper._buffer) == 10
+    with open(shipper.spill_path) as f:
+        assert [json.loads(line)["message"] for line in f] == [f"event {i}" for i in range(13, 15)]
+
+
+def test_spilled_events_are_shipped_once_the_queue_drains(tmp_path):
+    logs = FakeLogs()
+    shipper = _shipper(logs, max_buffer=10, spill_path=str(tmp_path / "spill.jsonl"))
+    for i in range(35):
+        shipper.log(f"event {i}", timestamp=i)
+
+    shipper.start()
+    shipper.close()
+
+    assert sorted(e["timestamp"] for b in logs.batches for e in b) == list(range(35))
+    assert not os.path.exists(shipper.spill_path)
+
+
+def test_without_a_spill_path_overflow_is_dropped_and_counted():
+    shipper = _shipper(max_buffer=3)
+    for i in range(5):
+        shipper.log(f"event {i}", timestamp=i)
+    assert len(shipper._buffer) == 3 and shipper.dropped == 2
+
+
+class RejectingLogs(FakeLogs):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def put_log_events(self, logEvents, **kwargs):
+        from botocore.exceptions import ClientError
+        self.calls += 1
+        raise ClientError({"Error": {"Code": "InvalidParameterException", "Message": "rejected"}}, "PutLogEvents")
+
+
+def test_a_rejected_batch_is_set_aside_after_a_bounded_number_of_attempts(tmp_path, capsys):
+    logs = RejectingLogs()
+    shipper = _shipper(logs, spill_path=str(tmp_path / "spill.jsonl"), max_spill_attempts=3)
+    for i in range(5):
+        shipper.log(f"event {i}", timestamp=i)
+
+    for _ in range(10):
+        shipper._drain()
+
+    assert logs.calls == 3
+    assert not os.path.exists(shipper.spill_path)
+    with open(shipper.failed_path) as f:
+        assert [json.loads(line)["message"] for line in f] == [f"event {i}" for i in range(5)]
+    assert shipper.quarantined == 5
+    assert capsys.readouterr().out.count("moving them to") == 1
@@ -0,0 +1,43 @@
+import json
+
+from conftest import DAY, list_keys, load_docs
+from metrics import STAGES, RunMetrics
+
+
+def _lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_a_day_writes_one_line_per_part_and_a_run_summary(workdir, make_extractor, mongo, s3):
+    load_docs(mongo, "sale", 200)
+    extractor = make_extractor("sale", {"batch_size": 50})
+    count = extractor._extract_day(DAY)
+
+    records = _lines(workdir / "metrics.jsonl")
+    parts = [r for r in records if r["event"] == "part"]
+    (run,) = [r for r in records if r["event"] == "run"]
+
+    assert sorted(p["key"] for p in parts) == list_keys(s3, "sale/day=15-01-2025/")
+    assert sum(p["rows"] for p in parts) == count
+    assert all(r["collection"] == "sale" and r["run"] == DAY and "ts" in r and "pid" in r for r in records)
+    assert run["status"] == "ok" and run["docs"] == count
+    assert set(run["stages_s"]) == set(STAGES) and run["stages_s"]["upload"] > 0
+    assert run["parts"] == len(parts) and run["part_bytes"]["total"] == sum(p["bytes"] for p in parts)
+    assert run["rss_mb"]["max"] >= run["rss_mb"]["last"] > 0
+
+
+def test_a_failed_run_is_reported_and_an_empty_path_disables_output(workdir):
+    path = workdir / "failed.jsonl"
+    metrics = RunMetrics("sale", DAY, path=str(path), rss_interval=0).start()
+    with metrics.stage("fetch", 10):
+        pass
+    summary = metrics.finish(0, status="failed")
+    (line,) = _lines(path)
+    assert line["status"] == "failed" == summary["status"]
+    assert line["stages_bytes"]["fetch"] == 10 and line["part_bytes"] is None
+
+    silent = RunMetrics("sale", DAY, path="", rss_interval=0).start()
+    silent.part("k", 1, 1)
+    silent.finish(1)
+    assert list(workdir.glob("*.jsonl")) == [path]  # solo existe el archivo de la corrida fallida
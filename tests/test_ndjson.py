@@ -0,0 +1,65 @@
+import base64
+import io
+import json
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from conftest import BUCKET, DAY, list_keys, load_docs
+from ndjson import CODECS, NDJSONWriter, codec_for_key, decompress
+
+DAY_PREFIX = "sale/day=15-01-2025/"
+
+
+def _body(s3, key):
+    return s3.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+
+
+def test_parquet_keeps_binary_columns_while_json_gets_base64(make_extractor, mongo, s3):
+    load_docs(mongo, "sale", 50)
+    mongo["EtominTransactions"]["sale"].update_many({}, {"$set": {"signature": b"\x00\xffsig"}})
+    make_extractor("sale", {"batch_size": 100}, output_format="both")._extract_day(DAY)
+
+    keys = list_keys(s3, DAY_PREFIX)
+    table = pq.read_table(io.BytesIO(_body(s3, next(k for k in keys if k.endswith(".parquet")))))
+    assert pa.types.is_binary(table.schema.field("signature").type)
+    assert set(table.column("signature").to_pylist()) == {b"\x00\xffsig"}
+
+    line = json.loads(_body(s3, next(k for k in keys if k.endswith(".json"))).splitlines()[0])
+    assert base64.b64decode(line["signature"]) == b"\x00\xffsig"
+
+
+@pytest.mark.parametrize("codec", [None, "gzip", "zstd"])
+def test_parts_round_trip_through_decompress(make_extractor, mongo, s3, codec):
+    if codec == "zstd":
+        pytest.importorskip("zstandard")
+    load_docs(mongo, "sale", 120)
+    overrides = {"batch_size": 50, "json": {"compression": codec}} if codec else {"batch_size": 50}
+    count = make_extractor("sale", overrides, output_format="json")._extract_day(DAY)
+
+    keys = list_keys(s3, DAY_PREFIX)
+    assert keys and all(k.endswith(".json" + CODECS[codec]) and codec_for_key(k) == codec for k in keys)
+    lines = []
+    for key in keys:
+        lines.extend(decompress(_body(s3, key), codec_for_key(key)).decode("utf-8").split("\n"))
+    docs = [json.loads(line) for line in lines]
+    assert len(docs) == count == len({d["_id"] for d in docs})
+
+
+@pytest.mark.parametrize("codec", ["gzip", "zstd"])
+def test_writer_output_spanning_several_chunks_decompresses_to_the_same_lines(codec):
+    if codec == "zstd":
+        pytest.importorskip("zstandard")
+    out = io.BytesIO()
+    docs = [{"i": i, "text": "ñ" * (i % 50)} for i in range(2000)]
+    writer = NDJSONWriter(out, codec, chunk_bytes=4096).write_all(docs)
+    writer.close()
+
+    lines = decompress(out.getvalue(), codec).decode("utf-8").split("\n")
+    assert [json.loads(line) for line in lines] == docs and writer.rows == len(docs)
+
+
+def test_an_unknown_codec_is_rejected(make_extractor):
+    with pytest.raises(ValueError, match="json.compression"):
+        make_extractor("sale", {"json": {"compression": "brotli"}}, output_format="json")
@@ -0,0 +1,111 @@
+import io
+
+import pyarrow.parquet as pq
+
+import mongo_etl
+from conftest import BUCKET, DAY, list_keys, load_docs
+from metrics import RunMetrics
+
+DAY_PREFIX = "sale/day=15-01-2025/"
+MANIFEST_PREFIX = "_manifests/sale/day=15-01-2025/"
+
+
+class InProcessPool:
+    # Stand-in de multiprocessing: mongomock no se comparte entre procesos
+    def __init__(self, processes=None):
+        self.processes = processes
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def starmap(self, fn, items):
+        return [fn(*item) for item in items]
+
+
+class InProcessContext:
+    Pool = InProcessPool
+
+
+def _run(make_extractor, monkeypatch, workers, captured=None):
+    overrides = {"batch_size": 20}
+    if workers:
+        overrides["parallel_scan"] = {"workers": workers, "max_workers": workers}
+
+    def scan_slice(mongo_uri, bucket_name, collection, date_str, output_format, slice_index, start_ms, end_ms):
+        # Lo mismo que _scan_slice, con el extractor de la prueba
+        if captured is not None:
+            captured.append((start_ms, end_ms))
+        extractor = make_extractor(collection, overrides)
+        extractor.part_prefix = f"data_s{slice_index + 1:02d}"
+        extractor.metrics = RunMetrics(collection, extractor.part_prefix).start()
+        manifest = extractor._open_manifest(date_str, extractor.part_prefix)
+        count = extractor._extract_window(date_str, start_ms, end_ms, manifest)
+        extractor.metrics.finish(count)
+        return count, manifest.data["parts"]
+
+    monkeypatch.setattr(mongo_etl, "_scan_slice", scan_slice)
+    monkeypatch.setattr(mongo_etl.multiprocessing, "get_context", lambda method: InProcessContext)
+    extractor = make_extractor("sale", overrides)
+    return extractor, extractor._extract_day(DAY)
+
+
+def _ids(s3):
+    ids = []
+    for key in list_keys(s3, DAY_PREFIX):
+        ids.extend(pq.read_table(io.BytesIO(s3.get_object(Bucket=BUCKET, Key=key)["Body"].read())).column("_id").to_pylist())
+    return sorted(ids)
+
+
+def _expected(extractor, docs):
+    start_ms, end_ms = extractor._day_window(DAY)[1:]
+    return sorted(str(d["_id"]) for d in docs if start_ms <= d["updatedAt"] < end_ms)
+
+
+def test_slices_cover_the_day_without_gaps_or_overlap(make_extractor, mongo, s3, monkeypatch):
+    data = load_docs(mongo, "sale", 300)
+    captured = []
+    extractor, count = _run(make_extractor, monkeypatch, 3, captured)
+
+    start_ms, end_ms = extractor._day_window(DAY)[1:]
+    assert captured[0][0] == start_ms and captured[-1][1] == end_ms
+    assert all(a[1] == b[0] for a, b in zip(captured, captured[1:]))
+    assert _ids(s3) == _expected(extractor, data["sale"]) and count == len(_expected(extractor, data["sale"]))
+
+
+def test_fewer_workers_remove_the_parts_and_manifests_of_dropped_slices(make_extractor, mongo, s3, monkeypatch):
+    data = load_docs(mongo, "sale", 300)
+    _run(make_extractor, monkeypatch, 4)
+    assert any("/data_s04_" in k for k in list_keys(s3, DAY_PREFIX))
+
+    extractor, _ = _run(make_extractor, monkeypatch, 2)
+
+    keys = list_keys(s3, DAY_PREFIX)
+    assert {k.rsplit("/", 1)[1].split("_part")[0] for k in keys} == {"data_s01", "data_s02"}
+    assert _ids(s3) == _expected(extractor, data["sale"])
+    assert list_keys(s3, f"{MANIFEST_PREFIX}data_s") == [f"{MANIFEST_PREFIX}data_s01.json", f"{MANIFEST_PREFIX}data_s02.json"]
+
+
+def test_switching_to_a_single_scan_removes_the_slice_parts(make_extractor, mongo, s3, monkeypatch):
+    data = load_docs(mongo, "sale", 300)
+    _run(make_extractor, monkeypatch, 3)
+
+    extractor, _ = _run(make_extractor, monkeypatch, None)
+
+    assert all("/data_part" in k for k in list_keys(s3, DAY_PREFIX))
+    assert _ids(s3) == _expected(extractor, data["sale"])
+    assert list_keys(s3, f"{MANIFEST_PREFIX}data_s") == []
+
+
+def test_slice_parts_of_an_interrupted_parallel_run_are_removed(make_extractor, mongo, s3, monkeypatch):
+    data = load_docs(mongo, "sale", 300)
+    _run(make_extractor, monkeypatch, 3)
+    # Corrida paralela cortada: el manifest del día quedó reiniciado y las partes solo figuran en data_sXX.json
+    manifest = make_extractor("sale")._open_manifest(DAY)
+    manifest.start("interrupted")
+
+    extractor, _ = _run(make_extractor, monkeypatch, None)
+
+    assert _ids(s3) == _expected(extractor, data["sale"])
@@ -0,0 +1,106 @@
+import io
+
+import pyarrow.parquet as pq
+
+from conftest import BUCKET, DAY, list_keys, load_docs
+from query_planner import ChainedCursor, PlanSummary, QueryPlanner
+
+
+class ListCursor:
+    def __init__(self, items):
+        self._items = iter(items)
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._items)
+
+    def close(self):
+        self.closed = True
+
+
+def test_chained_cursor_reads_branches_in_order_with_next():
+    cursors = [ListCursor([1, 2]), ListCursor([]), ListCursor([3])]
+    chained = ChainedCursor(lambda c=c: c for c in cursors)
+    assert [next(chained), next(chained), next(chained)] == [1, 2, 3]
+    try:
+        next(chained)
+        raise AssertionError("expected StopIteration")
+    except StopIteration:
+        pass
+    assert all(c.closed for c in cursors)
+
+
+def test_chained_cursor_close_stops_pending_branches():
+    opened = []
+
+    def factory(items):
+        def open_cursor():
+            cursor = ListCursor(items)
+            opened.append(cursor)
+            return cursor
+        return open_cursor
+
+    chained = ChainedCursor([factory([1, 2]), factory([3])])
+    assert next(chained) == 1
+    chained.close()
+    assert opened[0].closed and len(opened) == 1
+    assert list(chained) == []
+
+
+def test_or_branches_exclude_earlier_branches():
+    query = {"$or": [{"a": 1}, {"b": 2}], "c": 3}
+    assert QueryPlanner.or_branches(query) == [
+        {"$and": [{"c": 3}, {"a": 1}]},
+        {"$and": [{"c": 3}, {"b": 2}, {"$nor": [{"a": 1}]}]},
+    ]
+    assert QueryPlanner.or_branches({"$or": [{"a": 1}]}) is None
+
+
+def _fake_explain(self, collection, query):
+    # El $or completo no tiene índice; cada rama sí (el caso que rewrite_or "auto" reescribe)
+    stage = "COLLSCAN" if "$or" in query else "IXSCAN"
+    return PlanSummary({"queryPlanner": {"winningPlan": {"stage": stage, "indexName": "updatedAt_1"}}})
+
+
+def test_rewritten_or_runs_through_the_day_extraction(make_extractor, mongo, s3, monkeypatch):
+    data = load_docs(mongo, "sale", 300)
+    monkeypatch.setattr(QueryPlanner, "explain", _fake_explain)
+    extractor = make_extractor("sale", {"batch_size": 100, "query_plan": {"rewrite_or": "auto"}})
+    start_ms, end_ms = extractor._day_window(DAY)[1:]
+
+    count = extractor._extract_day(DAY)
+
+    expected = {str(d["_id"]) for d in data["sale"]
+                if start_ms <= d["updatedAt"] < end_ms}
+    ids = []
+    for key in list_keys(s3, "sale/day=15-01-2025/"):
+        body = s3.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+        ids.extend(pq.read_table(io.BytesIO(body)).column("_id").to_pylist())
+    assert count == len(expected)
+    assert sorted(ids) == sorted(expected)
+
+
+class CommandRecorder:
+    def __init__(self):
+        self.commands = []
+        self.name = "sale"
+        self.read_preference = None
+        self.database = self
+
+    def command(self, command, read_preference=None):
+        self.commands.append(command)
+        return {"queryPlanner": {"winningPlan": {"stage": "IXSCAN", "indexName": "updatedAt_1"}}}
+
+
+def test_default_preflight_only_plans_the_query():
+    collection = CommandRecorder()
+    QueryPlanner.from_config({}).plan(collection, {"updatedAt": {"$gte": 0}}, "sale")
+    assert collection.commands == [{"explain": {"find": "sale", "filter": {"updatedAt": {"$gte": 0}}}, "verbosity": "queryPlanner"}]
+
+    collection = CommandRecorder()
+    QueryPlanner.from_config({"query_plan": {"verbosity": "executionStats", "sample_limit": 50}}).plan(collection, {}, "sale")
+    assert collection.commands[0]["verbosity"] == "executionStats"
+    assert collection.commands[0]["explain"]["limit"] == 50
@@ -0,0 +1,51 @@
+from conftest import DAY, list_keys, load_docs
+from run_manifest import DayManifest
+from scheduler import RunHistory
+
+DAYS = ["2025-01-14", DAY, "2025-01-16"]
+DAY_PREFIX = "sale/day=15-01-2025/"
+
+
+def _run_range(make_extractor):
+    extractor = make_extractor("sale", {"batch_size": 20})
+    extractor._extract_range_single_pass(DAYS)
+    return extractor
+
+
+def test_rerun_with_fewer_documents_removes_the_extra_parts(make_extractor, mongo, s3):
+    load_docs(mongo, "sale", 200)
+    _run_range(make_extractor)
+    before = list_keys(s3, DAY_PREFIX)
+
+    sales = mongo["EtominTransactions"]["sale"]
+    sales.delete_many({"_id": {"$in": [d["_id"] for d in sales.find({}, {"_id": 1}).limit(150)]}})
+    _run_range(make_extractor)
+
+    after = list_keys(s3, DAY_PREFIX)
+    assert len(after) < len(before)
+    manifest = DayManifest(s3, "etl-test", "sale", DAY).load()
+    assert after == sorted(manifest.part_keys())
+
+
+def test_day_left_without_documents_is_emptied_and_completed(make_extractor, mongo, s3):
+    load_docs(mongo, "sale", 100)
+    _run_range(make_extractor)
+    assert list_keys(s3, DAY_PREFIX)
+
+    mongo["EtominTransactions"]["sale"].delete_many({})
+    _run_range(make_extractor)
+
+    assert list_keys(s3, DAY_PREFIX) == []
+    manifest = DayManifest(s3, "etl-test", "sale", DAY).load()
+    assert manifest.data["status"] == "complete" and manifest.data["doc_count"] == 0
+
+
+def test_each_day_of_the_range_records_its_run(make_extractor, mongo, s3):
+    load_docs(mongo, "sale", 100)
+    extractor = _run_range(make_extractor)
+
+    for day in DAYS:
+        (duration, docs, peak), = RunHistory().runs("sale", day)
+        assert duration >= 0 and peak == extractor.metrics.peak_rss_mb
+    (_, docs, _), = RunHistory().runs("sale", DAY)
+    assert docs == DayManifest(s3, "etl-test", "sale", DAY).load().data["doc_count"] > 0
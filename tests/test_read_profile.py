@@ -0,0 +1,83 @@
+import queue
+
+import pytest
+from pymongo import CursorType
+from pymongo.read_preferences import ReadPreference
+
+import worker_pool
+from read_profile import ReadProfile
+
+
+class RecordingCollection:
+    def __init__(self):
+        self.calls = []
+
+    def find(self, query, projection=None, **kwargs):
+        self.calls.append((query, projection, kwargs))
+        return iter(())
+
+
+def test_profile_parses_compressors_and_cursor_options():
+    profile = ReadProfile({"compressors": "zstd, zlib", "batch_size": 500, "read_preference": "secondaryPreferred",
+                           "allow_disk_use": True, "exhaust": True})
+    assert profile.client_options() == {"compressors": "zstd,zlib"}
+    assert profile.describe() == "compressors=zstd,zlib, batch_size=500, read_preference=secondaryPreferred, allow_disk_use=True, exhaust"
+
+    collection = RecordingCollection()
+    profile.find(collection, {"a": 1}, {"secret": 0})
+    assert collection.calls == [({"a": 1}, {"secret": 0}, {"cursor_type": CursorType.EXHAUST, "allow_disk_use": True, "batch_size": 500})]
+
+
+def test_without_a_read_section_the_driver_defaults_apply(mongo):
+    profile = ReadProfile(None)
+    assert profile.client_options() == {} and profile.describe() == "driver defaults"
+    collection = RecordingCollection()
+    profile.find(collection, {})
+    assert collection.calls == [({}, None, {})]
+    assert profile.collection(mongo["db"], "sale").read_preference == ReadPreference.PRIMARY
+
+
+@pytest.mark.parametrize("config, message", [
+    ({"compressors": ["lz4"]}, "read.compressors"),
+    ({"read_preference": "fastest"}, "read.read_preference"),
+])
+def test_invalid_settings_are_rejected(config, message):
+    with pytest.raises(ValueError, match=message):
+        ReadProfile(config)
+
+
+class FakeClient:
+    created = []
+
+    def __init__(self, uri, **kwargs):
+        self.options = kwargs
+        FakeClient.created.append(self)
+
+    def server_info(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+@pytest.mark.parametrize("env, expected", [("zstd,snappy", {"compressors": "zstd,snappy"}), (None, {})])
+def test_warm_workers_take_compression_from_the_environment(monkeypatch, env, expected):
+    # El cliente del worker es compartido entre colecciones: su compresión sale de MONGO_COMPRESSORS, no del "read" de cada una
+    import boto3
+    import pymongo
+    monkeypatch.setenv("MONGO_URI", "mongodb://example")
+    if env is None:
+        monkeypatch.delenv("MONGO_COMPRESSORS", raising=False)
+    else:
+        monkeypatch.setenv("MONGO_COMPRESSORS", env)
+    monkeypatch.setattr(pymongo, "MongoClient", FakeClient)
+    monkeypatch.setattr(boto3, "client", lambda *args, **kwargs: object())
+    FakeClient.created = []
+
+    tasks, results = queue.Queue(), queue.Queue()
+    tasks.put(None)
+    worker_pool._worker_main(1, tasks, results, max_tasks=1, max_rss_mb=None)
+
+    (client,) = FakeClient.created
+    assert client.options == expected
+    assert results.get_nowait() == ("retire", 1, None, None)
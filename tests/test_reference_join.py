@@ -0,0 +1,63 @@
+import pytest
+
+from conftest import BUCKET, DAY, load_docs
+from inventory import CollectionIndex
+from reference_join import ReferenceJoin
+from run_manifest import DayManifest
+
+
+class ChunkFailed(Exception):
+    pass
+
+
+def _parallel(overrides=None):
+    config = {"batch_size": 50, "reference_cache": False,
+              "reference_join": {"strategy": "parallel", "workers": 3, "chunk_size": 20}}
+    config.update(overrides or {})
+    return config
+
+
+def test_parallel_join_returns_every_referenced_document(make_extractor, mongo):
+    data = load_docs(mongo, "refund", 200)
+    extractor = make_extractor("refund", _parallel())
+    start_ms, end_ms = extractor._day_window(DAY)[1:]
+    sales = {d["_id"] for d in data["sale"] if start_ms <= d["updatedAt"] < end_ms}
+
+    assert extractor._extract_day(DAY) == sum(1 for d in data["refund"] if d["sale"] in sales)
+
+
+def test_failed_chunk_does_not_complete_the_day(make_extractor, mongo, s3, monkeypatch):
+    load_docs(mongo, "refund", 200)
+    extractor = make_extractor("refund", _parallel())
+    find_chunk = ReferenceJoin._find_chunk
+    calls = []
+
+    def flaky(self, chunk):
+        calls.append(len(chunk))
+        if len(calls) == 2:
+            raise ChunkFailed("chunk 2 failed")
+        return find_chunk(self, chunk)
+
+    monkeypatch.setattr(ReferenceJoin, "_find_chunk", flaky)
+
+    with pytest.raises(ChunkFailed):
+        extractor._extract_day(DAY)
+
+    assert DayManifest(s3, BUCKET, "refund", DAY).load().data["status"] == "in_progress"
+    assert DAY not in CollectionIndex(s3, BUCKET, "refund").load()["days"]
+
+
+def test_a_failed_cache_write_leaves_no_temp_file(tmp_path, monkeypatch):
+    import os
+    import reference_cache
+    from bson import ObjectId
+
+    cache = reference_cache.ReferenceIdCache(cache_dir=str(tmp_path), max_bytes=reference_cache.MB, ttl_seconds=60)
+
+    def full_disk(src, dst):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(reference_cache.os, "replace", full_disk)
+    with pytest.raises(OSError):
+        cache.get_or_compute("k", lambda: [ObjectId() for _ in range(10)])
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
@@ -0,0 +1,90 @@
+from datetime import date
+
+import pytest
+
+from conftest import BUCKET, list_keys
+from inventory import CollectionIndex, day_entry
+from retention import RetentionEngine, RetentionPolicy
+from run_manifest import DayManifest
+
+TODAY = date(2025, 1, 10)
+DAYS = ["2025-01-01", "2025-01-02", "2025-01-08", "2025-01-09"]
+
+
+def _prefix(day):
+    yyyy, mm, dd = day.split("-")
+    return f"sale/day={dd}-{mm}-{yyyy}/"
+
+
+def _days(names):
+    return [(d, _prefix(d)) for d in names]
+
+
+def test_expired_days_by_age_and_kept_snapshots():
+    days = _days(DAYS)
+    by_age = RetentionEngine(None, BUCKET, "sale", RetentionPolicy(max_age_days=5))
+    assert [d for d, _ in by_age.expired_days(days, TODAY)] == ["2025-01-01", "2025-01-02"]
+
+    keep_two = RetentionEngine(None, BUCKET, "sale", RetentionPolicy(keep_last_snapshots=2))
+    assert [d for d, _ in keep_two.expired_days(days, TODAY)] == ["2025-01-01", "2025-01-02"]
+
+    # Los últimos N días con datos se conservan aunque sean viejos
+    both = RetentionEngine(None, BUCKET, "sale", RetentionPolicy(max_age_days=0, keep_last_snapshots=3))
+    assert [d for d, _ in both.expired_days(days, TODAY)] == ["2025-01-01"]
+
+    assert RetentionEngine(None, BUCKET, "sale", RetentionPolicy()).expired_days(days, TODAY) == []
+
+
+def test_invalid_policies_are_rejected():
+    for kwargs in ({"formats": ["csv"]}, {"formats": []}, {"max_age_days": -1}, {"keep_last_snapshots": -2}):
+        with pytest.raises(ValueError):
+            RetentionPolicy(**kwargs)
+
+
+def _populate(s3):
+    index = CollectionIndex(s3, BUCKET, "sale")
+    for day in DAYS:
+        keys = [f"{_prefix(day)}data_part1.parquet", f"{_prefix(day)}data_part1.json"]
+        for key in keys:
+            s3.put_object(Bucket=BUCKET, Key=key, Body=b"12345")
+        manifest = DayManifest(s3, BUCKET, "sale", day)
+        manifest.record_part(keys, 1, 10, batch_index=0, last_id="a")
+        index.update(day, day_entry(keys, 10, "complete"))
+
+
+def test_dry_run_reports_without_deleting(s3):
+    _populate(s3)
+    before = list_keys(s3)
+    engine = RetentionEngine(s3, BUCKET, "sale", RetentionPolicy(max_age_days=5), workers=2, delete_workers=2, dry_run=True)
+
+    summary = engine.apply(TODAY)
+
+    assert summary["dry_run"] and summary["objects"] >= 4 and summary["bytes"] >= 20
+    assert list_keys(s3) == before
+    assert sorted(CollectionIndex(s3, BUCKET, "sale").load()["days"]) == DAYS
+
+
+def test_delete_removes_expired_days_their_manifests_and_index_entries(s3):
+    _populate(s3)
+    engine = RetentionEngine(s3, BUCKET, "sale", RetentionPolicy(max_age_days=5), workers=2, delete_workers=2)
+
+    summary = engine.apply(TODAY)
+
+    assert summary["days_purged"] == 2 and summary["errors"] == 0
+    assert list_keys(s3, "sale/") == sorted(f"{_prefix(d)}data_part1.{ext}" for d in DAYS[2:] for ext in ("json", "parquet"))
+    assert not list_keys(s3, "_manifests/sale/day=01-01-2025/")
+    assert list_keys(s3, "_manifests/sale/day=08-01-2025/")
+    assert sorted(CollectionIndex(s3, BUCKET, "sale").load()["days"]) == DAYS[2:]
+
+
+def test_a_single_format_is_trimmed_from_the_manifest_and_index(s3):
+    _populate(s3)
+    engine = RetentionEngine(s3, BUCKET, "sale", RetentionPolicy(max_age_days=5, formats=["json"]), workers=2, delete_workers=2)
+
+    summary = engine.apply(TODAY)
+
+    assert summary["days_trimmed"] == 2 and summary["days_purged"] == 0
+    assert list_keys(s3, _prefix("2025-01-01")) == [f"{_prefix('2025-01-01')}data_part1.parquet"]
+    assert DayManifest(s3, BUCKET, "sale", "2025-01-01").load().part_keys() == [f"{_prefix('2025-01-01')}data_part1.parquet"]
+    entry = CollectionIndex(s3, BUCKET, "sale").load()["days"]["2025-01-01"]
+    assert (entry["parquet"], entry["json"]) == (1, 0)
@@ -0,0 +1,149 @@
+import io
+
+import pyarrow.parquet as pq
+import pytest
+from pymongo.errors import AutoReconnect
+
+from conftest import BUCKET, DAY, list_keys, load_docs
+from inventory import CollectionIndex
+from run_manifest import DayManifest
+
+
+class FailingCursor:
+    # Cursor que se corta con un error de red después de `fail_after` documentos
+    def __init__(self, cursor, fail_after):
+        self.cursor = cursor
+        self.fail_after = fail_after
+        self.read = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.read >= self.fail_after:
+            raise AutoReconnect("connection reset")
+        self.read += 1
+        return next(self.cursor)
+
+    def close(self):
+        self.cursor.close()
+
+
+def _fail_cursor(monkeypatch, extractor, fail_after):
+    build = extractor._build_cursor_with_config
+    monkeypatch.setattr(extractor, "_build_cursor_with_config", lambda start_ms, end_ms: FailingCursor(build(start_ms, end_ms), fail_after))
+
+
+def _expected_ids(extractor, docs):
+    start_ms, end_ms = extractor._day_window(DAY)[1:]
+    return sorted(str(d["_id"]) for d in docs if start_ms <= d["updatedAt"] < end_ms)
+
+
+def _written_ids(s3):
+    ids = []
+    for key in list_keys(s3, "sale/day=15-01-2025/"):
+        ids.extend(pq.read_table(io.BytesIO(s3.get_object(Bucket=BUCKET, Key=key)["Body"].read())).column("_id").to_pylist())
+    return sorted(ids)
+
+
+def test_cursor_error_leaves_the_day_in_progress(make_extractor, mongo, s3, monkeypatch):
+    load_docs(mongo, "sale", 300)
+    extractor = make_extractor("sale", {"batch_size": 50})
+    _fail_cursor(monkeypatch, extractor, 120)
+
+    with pytest.raises(AutoReconnect):
+        extractor._extract_day(DAY)
+
+    manifest = DayManifest(s3, BUCKET, "sale", DAY).load()
+    assert manifest.data["status"] == "in_progress"
+    assert [p["batch_index"] for p in manifest.data["parts"]] == [0, 1]
+    assert DAY not in CollectionIndex(s3, BUCKET, "sale").load()["days"]
+
+
+def test_resume_continues_after_the_last_committed_part(make_extractor, mongo, s3, monkeypatch):
+    data = load_docs(mongo, "sale", 300)
+    extractor = make_extractor("sale", {"batch_size": 50})
+    _fail_cursor(monkeypatch, extractor, 120)
+    with pytest.raises(AutoReconnect):
+        extractor._extract_day(DAY)
+
+    monkeypatch.setenv("ETL_RESUME", "1")
+    resumed = make_extractor("sale", {"batch_size": 50})
+    uploaded = []
+    upload = resumed._upload_batch
+    monkeypatch.setattr(resumed, "_upload_batch", lambda prepared, *args: uploaded.append(prepared["batch_index"]) or upload(prepared, *args))
+
+    count = resumed._extract_day(DAY)
+
+    expected = _expected_ids(resumed, data["sale"])
+    assert count == len(expected)
+    assert uploaded[0] == 2  # las partes 1 y 2 ya estaban confirmadas
+    assert _written_ids(s3) == expected
+    manifest = DayManifest(s3, BUCKET, "sale", DAY).load()
+    assert manifest.data["status"] == "complete"
+    assert manifest.data["doc_count"] == len(expected)
+    entry = CollectionIndex(s3, BUCKET, "sale").load()["days"][DAY]
+    assert entry["status"] == "complete" and entry["parquet"] == len(manifest.part_keys())
+
+
+def test_resume_skips_complete_days(make_extractor, mongo, s3, monkeypatch):
+    load_docs(mongo, "sale", 120)
+    first = make_extractor("sale", {"batch_size": 50})
+    count = first._extract_day(DAY)
+
+    monkeypatch.setenv("ETL_RESUME", "1")
+    again = make_extractor("sale", {"batch_size": 50})
+    monkeypatch.setattr(again, "_build_cursor_with_config", lambda *args: pytest.fail("complete day was extracted again"))
+    assert again._extract_day(DAY) == count
+
+
+def test_resume_point_only_counts_the_contiguous_prefix(s3):
+    manifest = DayManifest(s3, BUCKET, "sale", DAY)
+    for index, last_id in ((0, "a"), (1, "b"), (3, "d")):
+        manifest.record_part([f"k{index}"], 10, 100, batch_index=index, last_id=last_id)
+    assert manifest.resume_point() == (2, 20, "b")
+    manifest.keep_batches_before(2)
+    assert manifest.part_keys() == ["k0", "k1"]
+
+
+def test_resume_after_out_of_order_pipeline_commits(make_extractor, mongo, s3, monkeypatch):
+    import threading
+    data = load_docs(mongo, "sale", 300)
+    config = {"batch_size": 20, "pipeline": {"upload_workers": 3, "queue_size": 2}}
+    extractor = make_extractor("sale", config)
+    later_parts = {2: threading.Event(), 3: threading.Event()}
+    upload = extractor._upload_batch
+
+    def upload_out_of_order(prepared, *args):
+        # La parte 2 (batch 1) termina después de las partes 3 y 4 y falla
+        index = prepared["batch_index"]
+        if index == 1:
+            assert all(event.wait(5) for event in later_parts.values())
+            raise IOError("upload failed")
+        result = upload(prepared, *args)
+        if index in later_parts:
+            later_parts[index].set()
+        return result
+
+    monkeypatch.setattr(extractor, "_upload_batch", upload_out_of_order)
+    with pytest.raises(IOError):
+        extractor._extract_day(DAY)
+
+    manifest = DayManifest(s3, BUCKET, "sale", DAY).load()
+    committed = sorted(p["batch_index"] for p in manifest.data["parts"])
+    assert committed[:3] == [0, 2, 3]
+    first = next(p for p in manifest.data["parts"] if p["batch_index"] == 0)
+    assert manifest.resume_point() == (1, 20, first["last_id"])
+
+    monkeypatch.setenv("ETL_RESUME", "1")
+    resumed = make_extractor("sale", config)
+    uploaded = []
+    upload = resumed._upload_batch
+    monkeypatch.setattr(resumed, "_upload_batch", lambda prepared, *args: uploaded.append(prepared["batch_index"]) or upload(prepared, *args))
+
+    count = resumed._extract_day(DAY)
+
+    expected = _expected_ids(resumed, data["sale"])
+    assert min(uploaded) == 1 and 0 not in uploaded
+    assert count == len(expected)
+    assert _written_ids(s3) == expected
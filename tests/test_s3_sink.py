@@ -0,0 +1,61 @@
+import pytest
+
+from conftest import BUCKET
+from s3_sink import MB, S3MultipartSink
+
+
+def _uploads(s3):
+    return s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads", [])
+
+
+def test_small_objects_are_a_single_put(s3):
+    with S3MultipartSink(s3, BUCKET, "small.bin") as sink:
+        sink.write(b"abc")
+    assert s3.get_object(Bucket=BUCKET, Key="small.bin")["Body"].read() == b"abc"
+    assert _uploads(s3) == []
+
+
+def test_complete_assembles_the_parts_in_order(s3):
+    chunks = [bytes([i]) * (3 * MB) for i in range(4)]
+    with S3MultipartSink(s3, BUCKET, "big.bin", part_size=5 * MB, max_in_flight=2) as sink:
+        for chunk in chunks:
+            sink.write(chunk)
+        assert sink._upload_id is not None
+
+    assert s3.get_object(Bucket=BUCKET, Key="big.bin")["Body"].read() == b"".join(chunks)
+    assert _uploads(s3) == []
+
+
+def test_abort_discards_the_uploaded_parts(s3):
+    sink = S3MultipartSink(s3, BUCKET, "aborted.bin", part_size=5 * MB)
+    sink.write(b"x" * (6 * MB))
+    assert len(_uploads(s3)) == 1
+
+    sink.abort()
+
+    assert _uploads(s3) == []
+    assert "Contents" not in s3.list_objects_v2(Bucket=BUCKET, Prefix="aborted.bin")
+    with pytest.raises(ValueError):
+        sink.write(b"more")
+
+
+def test_an_error_inside_the_block_aborts(s3):
+    with pytest.raises(RuntimeError):
+        with S3MultipartSink(s3, BUCKET, "failed.bin", part_size=5 * MB) as sink:
+            sink.write(b"x" * (6 * MB))
+            raise RuntimeError("writer failed")
+    assert _uploads(s3) == []
+    assert "Contents" not in s3.list_objects_v2(Bucket=BUCKET, Prefix="failed.bin")
+
+
+def test_a_failed_complete_aborts_the_upload(s3, monkeypatch):
+    sink = S3MultipartSink(s3, BUCKET, "broken.bin", part_size=5 * MB)
+    sink.write(b"x" * (6 * MB))
+
+    def broken(**kwargs):
+        raise RuntimeError("complete failed")
+
+    monkeypatch.setattr(s3, "complete_multipart_upload", broken)
+    with pytest.raises(RuntimeError, match="complete failed"):
+        sink.complete()
+    assert _uploads(s3) == [] and sink.finished
@@ -0,0 +1,35 @@
+import resource
+import time
+
+from conftest import DAY, load_docs
+from metrics import RunMetrics
+from scheduler import RunHistory, record_run
+
+
+def _lifetime_peak_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def test_history_records_the_peak_of_the_task_not_of_the_process(workdir):
+    # Un pico de una tarea anterior del mismo proceso sube ru_maxrss para siempre
+    spike = bytearray(400 * 1024 ** 2)
+    spike[::4096] = b"x" * len(spike[::4096])
+    del spike
+
+    metrics = RunMetrics("sale", DAY, rss_interval=0).start()
+    metrics.finish(0)
+    record_run("sale", DAY, time.time(), 0, metrics.peak_rss_mb)
+
+    (_, _, peak), = RunHistory().runs("sale")
+    assert peak == metrics.peak_rss_mb
+    assert peak < _lifetime_peak_mb() - 300
+
+
+def test_day_extraction_records_its_sampled_peak(workdir, make_extractor, mongo):
+    load_docs(mongo, "sale", 100)
+    extractor = make_extractor("sale", {"batch_size": 50})
+    count = extractor._extract_day(DAY)
+
+    (_, docs, peak), = RunHistory().runs("sale", DAY)
+    assert docs == count
+    assert peak == extractor.metrics.peak_rss_mb
@@ -0,0 +1,82 @@
+import json
+
+import pyarrow as pa
+import pytest
+
+from conftest import DAY, load_docs
+from run_manifest import DayManifest
+from schema_registry import SchemaDrift, SchemaRegistry, value_kind, widen
+
+
+@pytest.mark.parametrize("a, b, expected", [
+    ("null", "int", "int"),
+    ("int", "null", "int"),
+    ("bool", "int", "int"),
+    ("int", "float", "float"),
+    ("float", "bool", "float"),
+    ("int", "string", "string"),
+    ("timestamp", "int", "string"),
+    ("json", "string", "string"),
+])
+def test_widening_rules(a, b, expected):
+    assert widen(a, b) == expected
+
+
+def test_integers_beyond_int64_are_strings():
+    assert value_kind(2 ** 63 - 1) == "int"
+    assert value_kind(2 ** 63) == "string"
+
+
+def _registry(tmp_path, **kwargs):
+    return SchemaRegistry("sale", kwargs.pop("types", None), path=str(tmp_path / "sale_schema.json"), **kwargs)
+
+
+def test_a_conflicting_batch_widens_the_column_and_records_drift(tmp_path):
+    registry = _registry(tmp_path)
+    first = registry.record_batch([{"amount": 1}, {"amount": 2}], "batch 1")
+    assert first.schema.field("amount").type == pa.int64()
+
+    second = registry.record_batch([{"amount": 2.5}], "batch 2")
+    assert second.schema.field("amount").type == pa.float64()
+    third = registry.record_batch([{"amount": "n/a"}, {"other": 1}], "batch 3")
+    assert third.schema.field("amount").type == pa.string()
+    assert third.column(0).to_pylist() == ["n/a", None]
+
+    registry.save()
+    saved = json.loads((tmp_path / "sale_schema.json").read_text())
+    assert saved["columns"] == {"amount": "string", "other": "int"}
+    assert [(d["change"], d.get("from"), d["to"]) for d in saved["drift"]] == [
+        ("added", None, "int"), ("widened", "int", "float"), ("widened", "float", "string"), ("added", None, "int")]
+
+
+def test_pinned_columns_are_not_widened(tmp_path):
+    registry = _registry(tmp_path, types={"force_number": ["amount"], "force_string": ["code"]})
+    batch = registry.record_batch([{"amount": "12.5", "code": 7}, {"amount": "n/a", "code": None}], "batch 1")
+    assert batch.schema.field("amount").type == pa.float64() and batch.column("amount").to_pylist() == [12.5, None]
+    assert batch.schema.field("code").type == pa.string() and batch.column("code").to_pylist() == ["7", None]
+    assert registry.drift == []
+
+
+def test_on_drift_fail_stops_without_touching_the_registry(tmp_path):
+    registry = _registry(tmp_path, on_drift="fail")
+    registry.record_batch([{"amount": 1}], "batch 1")
+    registry.save()
+
+    # Columnas nuevas no son drift; un tipo que no cabe sí
+    registry.record_batch([{"amount": 2, "note": "x"}], "batch 2")
+    with pytest.raises(SchemaDrift, match="amount"):
+        registry.record_batch([{"amount": "n/a"}], "batch 3")
+    assert registry.columns["amount"] == "int"
+    assert json.loads((tmp_path / "sale_schema.json").read_text())["columns"] == {"amount": "int"}
+
+
+def test_on_drift_fail_leaves_the_day_unfinished(make_extractor, mongo, s3, workdir):
+    load_docs(mongo, "sale", 50)
+    # Registro aprendido con amount entero; los documentos del día lo traen como texto
+    (workdir / "config" / "sale_schema.json").write_text(json.dumps({"columns": {"amount": "int"}}))
+    mongo["EtominTransactions"]["sale"].update_many({}, {"$set": {"amount": "12.50"}})
+    extractor = make_extractor("sale", {"batch_size": 20, "schema": {"on_drift": "fail"}, "types": {}})
+
+    with pytest.raises(SchemaDrift):
+        extractor._extract_day(DAY)
+    assert DayManifest(s3, "etl-test", "sale", DAY).load().data["status"] != "complete"
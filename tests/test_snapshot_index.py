@@ -0,0 +1,76 @@
+import io
+
+import bson
+import pyarrow.parquet as pq
+import pytest
+from bson.raw_bson import RawBSONDocument
+
+from conftest import BUCKET, DAY, list_keys, load_docs
+from snapshot_index import SnapshotIndex
+
+DETECTION = {"change_detection": {"full_every_days": 7}}
+
+
+class RawCollection:
+    # mongomock no implementa document_class=RawBSONDocument: se codifica cada documento al leerlo
+    def __init__(self, collection):
+        self.collection = collection
+
+
+def _raw_reads(monkeypatch, extractor):
+    profile = extractor.read_profile
+    collection, find = profile.collection, profile.find
+
+    def raw_collection(db, name, codec_options=None):
+        if codec_options is not None and codec_options.document_class is RawBSONDocument:
+            return RawCollection(collection(db, name))
+        return collection(db, name, codec_options)
+
+    def raw_find(target, query, projection=None):
+        if isinstance(target, RawCollection):
+            return (RawBSONDocument(bson.encode(doc)) for doc in find(target.collection, query, projection))
+        return find(target, query, projection)
+
+    monkeypatch.setattr(profile, "collection", raw_collection)
+    monkeypatch.setattr(profile, "find", raw_find)
+    return extractor
+
+
+def _extractor(make_extractor, monkeypatch):
+    return _raw_reads(monkeypatch, make_extractor("terminal", DETECTION))
+
+
+def _objects(s3):
+    return {o["Key"]: o["ETag"] for o in s3.list_objects_v2(Bucket=BUCKET, Prefix="terminal/").get("Contents", [])}
+
+
+def test_unchanged_collection_is_not_rewritten(make_extractor, mongo, s3, monkeypatch):
+    load_docs(mongo, "terminal", 60)
+    first = _extractor(make_extractor, monkeypatch)
+    assert first._extract_day(DAY) > 0
+    assert list_keys(s3, SnapshotIndex.key("terminal"))
+    before = _objects(s3)
+
+    again = _extractor(make_extractor, monkeypatch)
+    monkeypatch.setattr(again, "_delete_collection_data", lambda date_str: pytest.fail("unchanged collection was deleted"))
+    assert again._extract_day(DAY) == 0
+    assert _objects(s3) == before
+
+
+def test_a_changed_document_rewrites_the_collection(make_extractor, mongo, s3, monkeypatch):
+    load_docs(mongo, "terminal", 60)
+    _extractor(make_extractor, monkeypatch)._extract_day(DAY)
+    terminals = mongo["EtominTransactions"]["terminal"]
+    changed = terminals.find_one({}, {"_id": 1})["_id"]
+    terminals.update_one({"_id": changed}, {"$set": {"label": "renamed"}})
+
+    count = _extractor(make_extractor, monkeypatch)._extract_day(DAY)
+
+    assert count == terminals.count_documents({})
+    labels = {}
+    for key in list_keys(s3, "terminal/"):
+        table = pq.read_table(io.BytesIO(s3.get_object(Bucket=BUCKET, Key=key)["Body"].read()))
+        labels.update(zip(table.column("_id").to_pylist(), table.column("label").to_pylist()))
+    assert labels[str(changed)] == "renamed" and len(labels) == count
+    # El índice nuevo ya refleja el cambio: la siguiente corrida vuelve a saltar
+    assert _extractor(make_extractor, monkeypatch)._extract_day(DAY) == 0
@@ -0,0 +1,128 @@
+import importlib
+import queue
+import sys
+import threading
+import time
+
+import psutil
+
+from worker_pool import WarmWorkerPool, _TaskPeak
+
+
+def test_task_peak_keeps_memory_freed_before_the_task_ends():
+    with _TaskPeak(psutil.Process(), interval=0.01) as task_peak:
+        before = psutil.Process().memory_info().rss
+        spike = bytearray(200 * 1024 ** 2)
+        spike[::4096] = b"x" * len(spike[::4096])
+        task_peak._sample()
+        del spike
+    assert task_peak.peak_mb > before / (1024 ** 2) + 150
+    assert task_peak.peak_mb > psutil.Process().memory_info().rss / (1024 ** 2) + 150
+
+
+def test_importing_the_launcher_has_no_side_effects(monkeypatch):
+    # Los workers spawn importan bulk_launcher como __mp_main__: no debe parsear argumentos ni leer la config
+    monkeypatch.setattr(sys, "argv", ["bulk_launcher.py"])
+    sys.modules.pop("bulk_launcher", None)
+    launcher = importlib.import_module("bulk_launcher")
+    assert callable(launcher.main)
+
+
+class _FakeProcess:
+    def __init__(self, target, args, name):
+        self.args = args
+        self.alive = True
+        self.exitcode = None
+
+    def start(self):
+        pass
+
+    def is_alive(self):
+        return self.alive
+
+    def join(self, timeout=None):
+        pass
+
+    def die(self, exitcode=-9):
+        self.alive, self.exitcode = False, exitcode
+
+
+class _FakeContext:
+    Queue = queue.Queue
+    Process = _FakeProcess
+
+
+def _pool_with_fake_workers(processes):
+    pool = WarmWorkerPool(processes)
+    pool._ctx = _FakeContext
+    pool._results = queue.Queue()
+    for _ in range(processes):
+        pool._spawn()
+    return pool
+
+
+def _submit(pool, task):
+    outcome = {}
+
+    def run():
+        try:
+            pool.run_task(task)
+            outcome["error"] = None
+        except RuntimeError as e:
+            outcome["error"] = str(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, outcome
+
+
+def _wait_assigned(pool, count):
+    deadline = time.time() + 5
+    while len(pool._assigned) < count and time.time() < deadline:
+        time.sleep(0.01)
+    return pool._assigned
+
+
+def test_a_task_taken_by_a_worker_that_dies_before_starting_goes_to_another_worker():
+    pool = _pool_with_fake_workers(1)
+    thread, outcome = _submit(pool, ("2025-01-15", "sale", None))
+    (worker_id, (task_id, task, started)), = _wait_assigned(pool, 1).items()
+    assert not started
+
+    pool._workers[worker_id].die()
+    pool._reap()
+
+    (new_worker, (requeued_id, requeued, _)), = pool._assigned.items()
+    assert new_worker != worker_id and (requeued_id, requeued) == (task_id, task)
+    assert pool._tasks[new_worker].get_nowait() == (task_id, task)
+
+    pool._finish(task_id, None)
+    thread.join(timeout=5)
+    assert outcome == {"error": None}
+
+
+def test_a_started_task_fails_when_its_worker_dies():
+    pool = _pool_with_fake_workers(1)
+    thread, outcome = _submit(pool, ("2025-01-15", "sale", None))
+    (worker_id, assigned), = _wait_assigned(pool, 1).items()
+    assigned[2] = True  # el worker ya mandó "start"
+
+    pool._workers[worker_id].die(-9)
+    pool._reap()
+
+    thread.join(timeout=5)
+    assert "died with exit code -9" in outcome["error"]
+    assert not pool._assigned and not pool._pending
+
+
+def test_a_retiring_worker_hands_back_a_task_it_never_read():
+    pool = _pool_with_fake_workers(1)
+    (worker_id,) = pool._workers
+    _submit(pool, ("2025-01-15", "sale", None))
+    _wait_assigned(pool, 1)
+
+    process, started = pool._remove(worker_id)
+    assert process is not None and started is None
+    assert len(pool._pending) == 1
+    pool._spawn()
+    assert len(pool._assigned) == 1 and worker_id not in pool._assigned